@@ -0,0 +1,166 @@
+'''
+Measure how fast const_fix's subsystems run against a synthetic codebase
+from synthcode.py, and how many experiments per hour the whole pipeline
+manages when fakecc.py stands in for the real build.
+
+    python benchmark.py [--modules N] [--funcs N] [--e2e-modules N] [--keep]
+
+Each subsystem number is the best of several repeats, so runs are
+comparable before and after a change.
+'''
+import argparse, os, shutil, sys, tempfile, time
+from contextlib import contextmanager
+
+import callgraph, const_fix, prototype, safechange, synthcode, timing
+
+repeats = 3
+_here = os.path.dirname(os.path.abspath(__file__))
+
+@contextmanager
+def _quiet():
+    '''Swallow the progress chatter that the code under test prints.'''
+    saved = sys.stdout
+    sys.stdout = open(os.devnull, 'w')
+    try:
+        yield
+    finally:
+        sys.stdout.close()
+        sys.stdout = saved
+
+def _best_of(work):
+    best = None
+    for i in range(repeats):
+        started = time.time()
+        with _quiet():
+            work()
+        elapsed = time.time() - started
+        if best is None or elapsed < best:
+            best = elapsed
+    return max(best, 1e-9)
+
+def _report(label, count, unit, secs):
+    print('%-30s %12.0f %s/sec  (%d in %.3fs)' % (label, count / secs, unit, count, secs))
+
+def _impls(root, funcs):
+    '''Find the impl prototype of every synthetic function.'''
+    impls = []
+    for func in funcs:
+        fpath = os.path.join(root, 'src', 'msyn_%s.c' % func.module)
+        for proto in prototype.find_prototypes_in_file(func.name, fpath) or []:
+            if proto.start_of_body:
+                impls.append(proto)
+    return impls
+
+def bench_split_params(root, funcs):
+    impls = _impls(root, funcs)
+    def work():
+        for proto in impls:
+            prototype._split_params(proto.txt, proto.match.start(3), proto.match.end(3))
+    _report('_split_params', len(impls), 'param lists', _best_of(work))
+
+def bench_find_end_of_body(root, funcs):
+    impls = _impls(root, funcs)
+    def work():
+        for proto in impls:
+            prototype._find_end_of_body(proto.txt, proto.start_of_body)
+    secs = _best_of(work)
+    _report('_find_end_of_body', len(impls), 'bodies', secs)
+    chars = sum([proto.end_of_body - proto.start_of_body for proto in impls])
+    _report('_find_end_of_body', chars / 1024.0, 'KB', secs)
+
+def bench_find_prototypes_in_codebase(root, funcs, sample=25):
+    names = [func.name for func in funcs[::max(1, len(funcs) // sample)]]
+    def work():
+        for name in names:
+            prototype.find_prototypes_in_codebase(name + '()', root)
+    _report('find_prototypes_in_codebase', len(names), 'functions', _best_of(work))
+
+def bench_analyze(html):
+    pages = [os.path.join(html, f) for f in os.listdir(html) if f.endswith('.html')]
+    def work():
+        by_caller, by_callee, params_by_caller = {}, {}, {}
+        for page in pages:
+            callgraph._analyze(page, by_caller, by_callee, params_by_caller)
+    _report('_analyze', len(pages), 'pages', _best_of(work))
+
+def bench_rewrite_prototypes(root, funcs, sample=25):
+    '''Toggle const on one param of each sampled function, rewrite, restore.'''
+    maps = []
+    with _quiet():
+        for func in funcs[::max(1, len(funcs) // sample)]:
+            prototypes = prototype.find_prototypes_in_codebase(func.name + '()', root)
+            impl = prototypes.find_best()
+            for idx, param in enumerate(impl.params):
+                if param.is_const_candidate() and not param.is_const():
+                    maps.append((prototypes, idx))
+                    break
+    files = sum([len(prototypes) for prototypes, idx in maps])
+    def work():
+        for prototypes, idx in maps:
+            for fpath in prototypes:
+                for proto in prototypes[fpath]:
+                    proto.params[idx].set_const(True)
+                    proto.dirty = True
+            const_fix.rewrite_prototypes(prototypes)
+            safechange.restore_files(prototypes.dirty_fpaths())
+            for fpath in prototypes:
+                for proto in prototypes[fpath]:
+                    proto.params[idx].set_const(False)
+                    proto.dirty = False
+    _report('rewrite_prototypes', files, 'files', _best_of(work))
+
+def configure_const_fix(root, html, logs):
+    '''Point const_fix at fakecc.py instead of make and scons.'''
+    fake = '%s %s' % (sys.executable, os.path.join(_here, 'fakecc.py'))
+    const_fix.compile_cmd = '%s compile %s' % (fake, root)
+    const_fix.compile_tests_cmd = '%s compile-tests %s' % (fake, root)
+    const_fix.make_clean_cmd = '%s clean %s' % (fake, root)
+    const_fix.clean_tests_cmd = 'true'
+    const_fix.test_cmd = '%s test %s' % (fake, root)
+    const_fix.compile_log = os.path.join(logs, 'make.log')
+    const_fix.test_log = os.path.join(logs, 'test.log')
+    callgraph.doxy_output_folder = html
+
+def bench_end_to_end(scratch, modules, funcs_per_module):
+    root = os.path.join(scratch, 'e2e')
+    html = os.path.join(scratch, 'e2e-html')
+    synthcode.generate(root, modules, funcs_per_module, html_folder=html, seed=2)
+    configure_const_fix(root, html, scratch)
+    started = time.time()
+    with _quiet():
+        const_fix.fix_prototypes(root)
+    elapsed = time.time() - started
+    experiments = len([e for e in timing._events if e[0] == 'experiment'])
+    builds = len([e for e in timing._events if e[0] == 'compile'])
+    print('%-30s %12.0f experiments/hour  (%d experiments, %d builds in %.1fs)' % (
+        'end to end', experiments * 3600.0 / elapsed, experiments, builds, elapsed))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark const_fix against a synthetic codebase.')
+    parser.add_argument('--modules', type=int, default=20, help='source files in the subsystem tree')
+    parser.add_argument('--funcs', type=int, default=50, help='functions per source file')
+    parser.add_argument('--e2e-modules', type=int, default=4, help='source files in the end-to-end tree; 0 to skip')
+    parser.add_argument('--e2e-funcs', type=int, default=10, help='functions per source file in the end-to-end tree')
+    parser.add_argument('--keep', action='store_true', help="don't delete the synthetic trees afterward")
+    args = parser.parse_args(argv)
+    scratch = tempfile.mkdtemp(prefix='const_fix-bench-')
+    try:
+        root = os.path.join(scratch, 'tree')
+        html = os.path.join(scratch, 'html')
+        funcs = synthcode.generate(root, args.modules, args.funcs, html_folder=html)
+        print('Synthetic tree: %d functions in %d files (%s).\n' % (len(funcs), args.modules, scratch))
+        bench_split_params(root, funcs)
+        bench_find_end_of_body(root, funcs)
+        bench_find_prototypes_in_codebase(root, funcs)
+        bench_analyze(html)
+        bench_rewrite_prototypes(root, funcs)
+        if args.e2e_modules:
+            bench_end_to_end(scratch, args.e2e_modules, args.e2e_funcs)
+    finally:
+        if args.keep:
+            print('\nKept %s.' % scratch)
+        else:
+            shutil.rmtree(scratch)
+
+if __name__ == '__main__':
+    main()
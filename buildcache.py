@@ -0,0 +1,258 @@
+import os, hashlib, shutil, stat, subprocess, tempfile
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+artifact_exts = ('.o', '.obj', '.lo')
+strip_cmd = ['objcopy', '--strip-debug']
+
+# fpath --> (mtime, size, digest). Most objects don't change between
+# snapshots, so we only pay to strip and hash the ones that were rebuilt.
+_digest_cache = {}
+_can_strip = True
+
+def _hash_bytes(data):
+    return hashlib.sha1(data).hexdigest()
+
+def _hash_file(fpath):
+    with open(fpath, 'rb') as f:
+        return _hash_bytes(f.read())
+
+def _stripped_digest(fpath):
+    '''
+    Hash an object file with its debug sections removed. Adding const changes
+    the DWARF type info even when the machine code is identical, so comparing
+    raw bytes would almost never show a match.
+    '''
+    global _can_strip
+    if _can_strip:
+        fd, tmp = tempfile.mkstemp(suffix='.o')
+        os.close(fd)
+        try:
+            with open(os.devnull, 'w') as devnull:
+                exitcode = subprocess.call(strip_cmd + [fpath, tmp], stdout=devnull, stderr=devnull)
+            if exitcode == 0:
+                return _hash_file(tmp)
+        except OSError:
+            # objcopy isn't installed; fall back to raw bytes, which is
+            # conservative: we'll just find fewer matches.
+            _can_strip = False
+        finally:
+            # objcopy deletes its output when it can't parse the input.
+            if os.path.exists(tmp):
+                os.remove(tmp)
+    return _hash_file(fpath)
+
+def _dump(obj, fpath):
+    tmp = fpath + '.tmp'
+    with open(tmp, 'wb') as f:
+        pickle.dump(obj, f, 2)
+    os.rename(tmp, fpath)
+
+def _load(fpath, default):
+    try:
+        with open(fpath, 'rb') as f:
+            return pickle.load(f)
+    except (IOError, OSError, EOFError, pickle.UnpicklingError):
+        return default
+
+def save_digests(fpath, root):
+    '''
+    Keep the digest cache for root's objects across runs, by path relative
+    to root, so it still applies to a copy of the tree. Entries are checked
+    by mtime and size, so stale ones are harmless.
+    '''
+    prefix = os.path.join(root, '')
+    _dump(dict([(obj[len(prefix):], entry) for obj, entry in _digest_cache.items() if obj.startswith(prefix)]), fpath)
+
+def load_digests(fpath, root):
+    for rel, entry in _load(fpath, {}).items():
+        _digest_cache[os.path.join(root, rel)] = entry
+
+def code_digest(fpath):
+    info = os.stat(fpath)
+    cached = _digest_cache.get(fpath)
+    if cached and cached[0] == info.st_mtime and cached[1] == info.st_size:
+        return cached[2]
+    digest = _stripped_digest(fpath)
+    _digest_cache[fpath] = (info.st_mtime, info.st_size, digest)
+    return digest
+
+def snapshot_objects(root):
+    '''
+    Return a dict of object file path --> digest of its code, for every
+    object file in the tree.
+    '''
+    snapshot = {}
+    for folder, dirs, files in os.walk(root):
+        skip = [d for d in dirs if d.startswith('.')]
+        for d in skip:
+            dirs.remove(d)
+        for f in files:
+            if f.endswith(artifact_exts):
+                fpath = os.path.join(folder, f)
+                snapshot[fpath] = code_digest(fpath)
+    return snapshot
+
+def changed_objects(before, after):
+    '''Return the paths whose code differs between two snapshots.'''
+    changed = [fpath for fpath in after if before.get(fpath) != after[fpath]]
+    changed.extend([fpath for fpath in before if fpath not in after])
+    return changed
+
+linked_exts = ('.a', '.so')
+_elf_magic = b'\x7fELF'
+
+def _is_linked_binary(fpath, fname):
+    if fname.endswith(linked_exts):
+        return True
+    if '.' in fname or not os.access(fpath, os.X_OK):
+        return False
+    with open(fpath, 'rb') as f:
+        return f.read(4) == _elf_magic
+
+def iter_artifacts(root):
+    '''Yield every object file, library and linked executable in the tree.'''
+    for folder, dirs, files in os.walk(root):
+        skip = [d for d in dirs if d.startswith('.')]
+        for d in skip:
+            dirs.remove(d)
+        for f in files:
+            fpath = os.path.join(folder, f)
+            if f.endswith(artifact_exts) or _is_linked_binary(fpath, f):
+                yield fpath
+
+class ArtifactStash:
+    '''
+    Keep copies of the build artifacts from the last clean build, so that a
+    failed experiment can put them back (contents and mtimes) instead of
+    rebuilding. Copies are stored by content hash, so only artifacts that
+    were actually rebuilt cost anything to capture. Entries are keyed by
+    path relative to the tree.
+    '''
+    def __init__(self, folder):
+        self.folder = folder
+        self.entries = {}
+        # Where entries are kept between runs.
+        self.index_path = folder + '.index'
+    def _blob(self, digest):
+        return os.path.join(self.folder, digest)
+    def capture(self, root):
+        if not os.path.isdir(self.folder):
+            os.makedirs(self.folder)
+        entries = {}
+        for fpath in iter_artifacts(root):
+            rel = os.path.relpath(fpath, root)
+            info = os.stat(fpath)
+            old = self.entries.get(rel)
+            if old and old[0] == info.st_mtime and old[1] == info.st_size:
+                entries[rel] = old
+                continue
+            digest = _hash_file(fpath)
+            if not os.path.isfile(self._blob(digest)):
+                shutil.copyfile(fpath, self._blob(digest))
+            entries[rel] = (info.st_mtime, info.st_size, digest, stat.S_IMODE(info.st_mode))
+        self.entries = entries
+        keep = set([entry[2] for entry in entries.values()])
+        for digest in os.listdir(self.folder):
+            if digest not in keep:
+                os.remove(self._blob(digest))
+    def save(self):
+        _dump(self.entries, self.index_path)
+    def load(self):
+        '''Pick up the entries from the last capture, possibly by an earlier run.'''
+        self.entries = _load(self.index_path, {})
+    def restore(self, root):
+        '''
+        Put every artifact back the way it was at the last capture. Return
+        False if that isn't possible, in which case the caller must rebuild.
+        '''
+        if not self.entries:
+            return False
+        current = set([os.path.relpath(fpath, root) for fpath in iter_artifacts(root)])
+        for rel in current:
+            if rel not in self.entries:
+                os.remove(os.path.join(root, rel))
+        for rel, (mtime, size, digest, mode) in self.entries.items():
+            fpath = os.path.join(root, rel)
+            if rel in current:
+                info = os.stat(fpath)
+                if info.st_mtime == mtime and info.st_size == size:
+                    continue
+            blob = self._blob(digest)
+            if not os.path.isfile(blob):
+                return False
+            shutil.copyfile(blob, fpath)
+            os.chmod(fpath, mode)
+            os.utime(fpath, (mtime, mtime))
+        return True
+
+source_exts = ('.c', '.h', '.cpp')
+build_config_names = ('Makefile', 'SConstruct', 'sconstruct.buildonly')
+
+def _git(root, args):
+    '''Return git's output, or None if root isn't a git checkout.'''
+    try:
+        with open(os.devnull, 'w') as devnull:
+            p = subprocess.Popen(['git'] + args, cwd=root, stdout=subprocess.PIPE, stderr=devnull)
+            out = p.communicate()[0]
+    except OSError:
+        return None
+    if p.returncode:
+        return None
+    return out
+
+def _is_build_input(fpath):
+    return fpath.endswith(source_exts) or os.path.basename(fpath) in build_config_names
+
+def source_fingerprint(root):
+    '''
+    Hash the content of every source and build file. In a git checkout, that's
+    the committed tree plus a diff of local changes plus any untracked sources,
+    which is much faster than reading every file.
+    '''
+    h = hashlib.sha1()
+    tree = _git(root, ['rev-parse', 'HEAD^{tree}'])
+    if tree is not None:
+        h.update(tree)
+        pathspecs = ['*' + ext for ext in source_exts]
+        for name in build_config_names:
+            pathspecs.extend([name, '*/' + name])
+        h.update(_git(root, ['diff', 'HEAD', '--binary', '--'] + pathspecs) or b'')
+        untracked = _git(root, ['ls-files', '--others', '--exclude-standard']) or b''
+        fpaths = [os.path.join(root, line.decode('utf-8')) for line in untracked.splitlines()]
+    else:
+        fpaths = []
+        for folder, dirs, files in os.walk(root):
+            skip = [d for d in dirs if d.startswith('.')]
+            for d in skip:
+                dirs.remove(d)
+            fpaths.extend([os.path.join(folder, f) for f in files])
+    for fpath in sorted(fpaths):
+        if _is_build_input(fpath) and os.path.isfile(fpath):
+            h.update(os.path.relpath(fpath, root).encode('utf-8'))
+            h.update(_hash_file(fpath).encode('utf-8'))
+    return h.hexdigest()
+
+def artifact_fingerprint(root):
+    '''
+    Hash the name, size and mtime of every build artifact. This is cheap, and
+    it changes if anything rebuilt or deleted an artifact since we looked.
+    Names are relative to root and mtimes are in whole seconds, so a copy of
+    the tree (see workspace.py) has the same fingerprint.
+    '''
+    h = hashlib.sha1()
+    for fpath in sorted(iter_artifacts(root)):
+        info = os.stat(fpath)
+        h.update(('%s %d %d\n' % (os.path.relpath(fpath, root), info.st_mtime, info.st_size)).encode('utf-8'))
+    return h.hexdigest()
+
+def tree_fingerprint(root, toolchain):
+    '''
+    Identify the state of a tree, closely enough that if it matches a state
+    that was proven to compile and pass its tests, it doesn't need proving
+    again.
+    '''
+    return '%s:%s:%s' % (source_fingerprint(root), artifact_fingerprint(root), toolchain)
@@ -0,0 +1,122 @@
+import math, os, signal, subprocess, time, multiprocessing
+
+poll_interval = 0.1
+# How long a cancelled job gets to exit after SIGTERM before we SIGKILL it.
+kill_grace = 5
+# Never use more than this many jobs; 0 means the number of cores.
+max_jobs = 0
+# However busy the host looks, use at least this fraction of the cores.
+min_core_share = 0.5
+
+TIMED_OUT = -1
+CANCELLED = -2
+
+# (jobs, started, finished) for our own jobs that finished recently.
+_recent = []
+# The kernel's 1-minute load average decays with this time constant.
+_load_period = 60.0
+
+def _own_load(now):
+    '''
+    Estimate how much of the 1-minute load average our own builds and tests
+    account for. A make -jN that just finished leaves the load near N for a
+    minute or so; that isn't someone else's work.
+    '''
+    load = 0.0
+    for jobs, started, finished in _recent:
+        rise = 1 - math.exp(-(finished - started) / _load_period)
+        load += jobs * rise * math.exp(-(now - finished) / _load_period)
+    return load
+
+def pick_job_count():
+    '''
+    Use every core that isn't busy with someone else's work. A build host is
+    often shared, and oversubscribing it just makes every build slower.
+    '''
+    cores = multiprocessing.cpu_count()
+    now = time.time()
+    _recent[:] = [r for r in _recent if now - r[2] < 5 * _load_period]
+    try:
+        load = max(0, os.getloadavg()[0] - _own_load(now))
+    except (AttributeError, OSError):
+        load = 0
+    jobs = max(cores - int(load), int(cores * min_core_share))
+    if max_jobs:
+        jobs = min(jobs, max_jobs)
+    return max(1, min(jobs, cores))
+
+class Job:
+    '''
+    A build or test command, run in its own process group so that a timeout
+    or Ctrl-C takes down everything it spawned.
+    '''
+    def __init__(self, cmd, cwd, log=os.devnull, timeout=0, jobs=1):
+        self.cmd = cmd
+        self.jobs = jobs
+        self.cwd = cwd
+        self.log = log
+        self.timeout = timeout
+        self.exitcode = None
+        self.started = time.time()
+        out = open(log, 'w')
+        try:
+            # Give the job its own process group so that cancelling it also
+            # takes down everything make or scons spawned.
+            self.proc = subprocess.Popen(cmd, shell=True, cwd=cwd, stdout=out,
+                stderr=subprocess.STDOUT, preexec_fn=os.setsid)
+        finally:
+            out.close()
+    @property
+    def elapsed(self):
+        return time.time() - self.started
+    def _finish(self, exitcode):
+        self.exitcode = exitcode
+        _recent.append((self.jobs, self.started, time.time()))
+        return exitcode
+    def poll(self):
+        '''Return the job's exit code, or None if it's still running.'''
+        if self.exitcode is not None:
+            return self.exitcode
+        exitcode = self.proc.poll()
+        if exitcode is not None:
+            return self._finish(exitcode)
+        if self.timeout and self.elapsed > self.timeout:
+            print('  Timed out after %g seconds: %s' % (self.timeout, self.cmd))
+            self._kill()
+            return self._finish(TIMED_OUT)
+    def wait(self):
+        try:
+            while self.poll() is None:
+                time.sleep(poll_interval)
+        except KeyboardInterrupt:
+            self.cancel()
+            raise
+        return self.exitcode
+    def _kill(self):
+        try:
+            os.killpg(self.proc.pid, signal.SIGTERM)
+            deadline = time.time() + kill_grace
+            while self.proc.poll() is None and time.time() < deadline:
+                time.sleep(poll_interval)
+            if self.proc.poll() is None:
+                os.killpg(self.proc.pid, signal.SIGKILL)
+                self.proc.wait()
+        except OSError:
+            # Already gone.
+            pass
+    def cancel(self):
+        if self.exitcode is None:
+            self._kill()
+            self._finish(CANCELLED)
+
+def run(cmd, cwd, log=os.devnull, timeout=0):
+    '''
+    Run cmd in cwd and return its exit code. If cmd contains %(jobs)d, it's
+    filled in with a job count that suits the current load.
+    '''
+    jobs = 1
+    if '%(jobs)' in cmd:
+        jobs = pick_job_count()
+        cmd = cmd % {'jobs': jobs}
+    print('  ' + cmd)
+    return Job(cmd, cwd, log, timeout, jobs).wait()
@@ -1,7 +1,10 @@
 import os, re, sys
 
+import builder, timing
+
 doxy_output_folder = '/tmp/html'
 doxy_log = '/tmp/doxy-stdout'
+doxy_cmd = 'doxygen docs/Doxyfile'
 
 proto_pat = re.compile(r'<td class="memname">(.*?)</td>(.*?)</div>\s*</div>', re.DOTALL)
 references_pat = re.compile('<p>References(.*?)</p>', re.DOTALL)
@@ -36,21 +39,26 @@ def _remove_name_with_typedef(func, names):
     '''
     if names:
         #print('trying to remove %s from %s' % (func, names))
-        cls, method = _split_method_name(func)
-        #print('split = %s, %s' % (cls, method))
-        if cls:
-            possible_names = [cls.upper(), cls.lower()]
-            if cls.endswith('_t'):
-                alt = cls[:-2]
-            else:
-                alt = cls + '_t'
-            possible_names.append(alt.upper())
-            possible_names.append(alt.lower())
-            possible_names = [n + '::' + method for n in possible_names]
-            for item in names:
-                if item in possible_names:
-                    names.remove(item)
-                    return True
+        possible_names = _typedef_variants(func)
+        for item in names:
+            if item in possible_names:
+                names.remove(item)
+                return True
+
+def _typedef_variants(func):
+    '''Return the other names a method might go by if its class is typedef'ed.'''
+    cls, method = _split_method_name(func)
+    #print('split = %s, %s' % (cls, method))
+    if not cls:
+        return []
+    possible_names = [cls.upper(), cls.lower()]
+    if cls.endswith('_t'):
+        alt = cls[:-2]
+    else:
+        alt = cls + '_t'
+    possible_names.append(alt.upper())
+    possible_names.append(alt.lower())
+    return [n + '::' + method for n in possible_names]
                 
 def _normalize_param(param):
     param = param.replace('&#160;', '').replace('&amp;', '&').strip()
@@ -125,14 +133,9 @@ def _analyze(fname, by_caller, by_callee, params_by_caller):
                 #print('  %s: calls %d, called by %d' % (funcname, called_count, caller_count))
     return True 
         
+@timing.timed('doxygen')
 def _call_doxygen(folder):
-    oldcwd = os.getcwd()
-    try:
-        os.chdir(folder)
-        exitcode = os.system('doxygen docs/Doxyfile >%s 2>&1' % doxy_log)
-        return exitcode
-    finally:
-        os.chdir(oldcwd)
+    return builder.run(doxy_cmd, folder, doxy_log)
         
 def _get_doxy_date(folder):
     try:
@@ -152,40 +155,50 @@ def _get_vcs_date(folder):
         pass
     return 0
 
+def refresh_doxygen_output(root):
+    '''Re-run doxygen if the tree has been fetched since its output was made.'''
+    doxy_lastmod = _get_doxy_date(doxy_output_folder)
+    vcs_lastmod = _get_vcs_date(root)
+    if doxy_lastmod < vcs_lastmod:
+        print('  doxy_lastmod = %s; vcs_lastmod = %s' % (doxy_lastmod, vcs_lastmod))
+        print('  Re-running doxygen. Tail %s to monitor...' % doxy_log)
+        error = _call_doxygen(root)
+        if error:
+            sys.stderr.write('Doxygen failed with error code %d.\n' % error)
+            sys.exit(1)
+    else:
+        print('  Doxygen output is up-to-date.')
+
 class Callgraph:
     def __init__(self, root):
         self.root = os.path.normpath(os.path.abspath(root))
         self.load()
     def load(self):
-        doxy_lastmod = _get_doxy_date(doxy_output_folder)
-        vcs_lastmod = _get_vcs_date(self.root)
-        if doxy_lastmod < vcs_lastmod:
-            print('  doxy_lastmod = %s; vcs_lastmod = %s' % (doxy_lastmod, vcs_lastmod))
-            print('  Re-running doxygen. Tail %s to monitor...' % doxy_log)
-            error = _call_doxygen(self.root)
-            if error:
-                sys.stderr.write('Doxygen failed with error code %d.\n', error)
-                sys.exit(1)
-        else:
-            print('  Doxygen output is up-to-date.')
+        refresh_doxygen_output(self.root)
         self._build_call_graphs()
+    @timing.timed('html analysis')
     def _build_call_graphs(self):
         self.by_caller = {}
         self.by_callee = {}
         self.params_by_caller = {}
         files = [f for f in os.listdir(doxy_output_folder) if f.endswith('.html')]
-        sys.stdout.write('  Analyzing')
+        print('  Analyzing %d pages...' % len(files))
         for item in files:
-            sys.stdout.write('.')
-            sys.stdout.flush()
             _analyze(os.path.join(doxy_output_folder, item), self.by_caller, self.by_callee, self.params_by_caller)
-        print('\n  Sorting...')
+        print('  Sorting...')
         for caller in self.by_caller:
             self.by_caller[caller].sort()
         for callee in self.by_callee:
             self.by_callee[callee].sort()
         print('  Breaking recursion...')
         self._break_simple_recursion()
+        self._remember_callers()
+    def _remember_callers(self):
+        '''
+        Keep a copy of who calls whom as loaded. remove() prunes by_callee as
+        functions are finished, but test selection needs the whole graph.
+        '''
+        self.all_callers = dict([(callee, list(callers)) for callee, callers in self.by_callee.items()])
     def get_params(self, func):
         if func in self.params_by_caller:
             return self.params_by_caller[func]
@@ -194,6 +207,22 @@ class Callgraph:
         for func in self.by_callee:
             if not self.by_callee[func]:
                 orphans.append(func)
+    def get_transitive_callers(self, func):
+        '''
+        Walk the call graph as loaded upward from func, and return every
+        function that calls it, directly or indirectly, whether or not it
+        has been removed since. func itself is not included.
+        '''
+        found = set()
+        pending = [func]
+        while pending:
+            item = pending.pop()
+            if item in self.all_callers:
+                for caller in self.all_callers[item]:
+                    if caller not in found and caller != func:
+                        found.add(caller)
+                        pending.append(caller)
+        return found
     def get_leaves(self):
         leaves = []
         for func in self.by_caller:
@@ -0,0 +1,384 @@
+'''
+The call graph in a memory-mapped file, for codebases where the dicts in
+callgraph.Callgraph would take gigabytes.
+
+Every name doxygen mentions is stored once, in sorted order, so a name's
+position is its id and lookups are a binary search. Calls and callers are
+CSR arrays: offsets[i] and offsets[i + 1] bound the ids that node i calls
+(or is called by). Param lists are kept as text and only decoded when
+asked for. Nothing is read until it's needed, so the OS pages in just the
+parts a run touches.
+
+What a run changes lives in RAM and is small: a bitmap of removed
+functions, a bitmap of removed calls, and how many calls each function
+still makes, so get_leaves never has to look at edges.
+
+    python cgstore.py ROOT    # build ROOT/.const_fix/callgraph.bin from doxygen's output
+
+const_fix.py --disk-callgraph builds the file if it's missing or older
+than doxygen's output, then uses it in place of Callgraph.
+'''
+import argparse, array, mmap, os, struct, sys, tempfile
+
+import callgraph, timing
+
+try:
+    xrange
+except NameError:
+    xrange = range
+
+magic = b'CGS1'
+store_name = 'callgraph.bin'
+# magic, nodes, calls, callers, bytes of names, bytes of params
+_header = struct.Struct('<4s5Q')
+_param_sep = b'\0'
+_chunk = 65536
+
+def _to_bytes(txt):
+    if isinstance(txt, bytes):
+        return txt
+    return txt.encode('utf-8')
+
+def _to_text(data):
+    if isinstance(data, str):
+        return data
+    return data.decode('utf-8')
+
+def _write_ints(f, code, values):
+    '''Write values as little-endian ints of struct type code, padded to 8 bytes.'''
+    count = 0
+    for i in xrange(0, len(values), _chunk):
+        part = values[i:i + _chunk]
+        f.write(struct.pack('<%d%s' % (len(part), code), *part))
+        count += len(part)
+    _pad(f, count * struct.calcsize(code))
+
+def _pad(f, size):
+    if size % 8:
+        f.write(b'\0' * (8 - size % 8))
+
+def _padded(size):
+    return (size + 7) // 8 * 8
+
+def _csr(pairs, n):
+    '''Turn sorted (node << 32 | target) keys into offsets and targets.'''
+    offsets = [0] * (n + 1)
+    targets = []
+    for key in pairs:
+        offsets[(key >> 32) + 1] += 1
+        targets.append(key & 0xffffffff)
+    for i in xrange(n):
+        offsets[i + 1] += offsets[i]
+    return offsets, targets
+
+@timing.timed('html analysis')
+def build(fpath, html_folder=None):
+    '''
+    Analyze doxygen's output one page at a time and write the graph to
+    fpath. Only the names and edges are held in RAM while building; params
+    go straight to a temporary file.
+    '''
+    if html_folder is None:
+        html_folder = callgraph.doxy_output_folder
+    ids = {}
+    names = []
+    documented = bytearray()
+    calls = array.array('I')
+    callers = array.array('I')
+    # provisional id --> (offset, length) in params_tmp
+    param_spans = {}
+    params_tmp = tempfile.TemporaryFile()
+    def intern(name):
+        i = ids.get(name)
+        if i is None:
+            i = ids[name] = len(names)
+            names.append(name)
+            documented.append(0)
+        return i
+    files = [f for f in os.listdir(html_folder) if f.endswith('.html')]
+    print('  Analyzing %d pages...' % len(files))
+    for item in files:
+        by_caller, by_callee, params_by_caller = {}, {}, {}
+        callgraph._analyze(os.path.join(html_folder, item), by_caller, by_callee, params_by_caller)
+        for func, called in by_caller.items():
+            i = intern(func)
+            documented[i] = 1
+            for callee in called:
+                calls.extend((i, intern(callee)))
+        for func, calling in by_callee.items():
+            i = intern(func)
+            for caller in calling:
+                callers.extend((i, intern(caller)))
+        for func, params in params_by_caller.items():
+            txt = _param_sep.join([_to_bytes(p) for p in params])
+            param_spans[intern(func)] = (params_tmp.tell(), len(txt))
+            params_tmp.write(txt)
+    print('  Sorting...')
+    n = len(names)
+    order = sorted(xrange(n), key=names.__getitem__)
+    new_id = array.array('I', [0]) * n
+    for rank, i in enumerate(order):
+        new_id[i] = rank
+    # Functions that call themselves directly would never become leaves.
+    recursive = set([calls[j] for j in xrange(0, len(calls), 2) if calls[j] == calls[j + 1]])
+    print('  Found %d recursive functions.' % len(recursive))
+    call_pairs = sorted(set([new_id[calls[j]] << 32 | new_id[calls[j + 1]]
+        for j in xrange(0, len(calls), 2) if calls[j] != calls[j + 1]]))
+    del calls
+    caller_pairs = sorted(set([new_id[callers[j]] << 32 | new_id[callers[j + 1]]
+        for j in xrange(0, len(callers), 2) if callers[j] != callers[j + 1]]))
+    del callers
+    call_offsets, call_targets = _csr(call_pairs, n)
+    del call_pairs
+    caller_offsets, caller_targets = _csr(caller_pairs, n)
+    del caller_pairs
+    encoded = [_to_bytes(names[i]) for i in order]
+    name_offsets = [0]
+    for name in encoded:
+        name_offsets.append(name_offsets[-1] + len(name))
+    param_offsets = [0]
+    for i in order:
+        param_offsets.append(param_offsets[-1] + param_spans.get(i, (0, 0))[1])
+    tmp = fpath + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(_header.pack(magic, n, len(call_targets), len(caller_targets), name_offsets[-1], param_offsets[-1]))
+        f.write(bytes(bytearray([documented[i] for i in order])))
+        _pad(f, n)
+        _write_ints(f, 'Q', name_offsets)
+        for name in encoded:
+            f.write(name)
+        _pad(f, name_offsets[-1])
+        _write_ints(f, 'Q', param_offsets)
+        for i in order:
+            if i in param_spans:
+                offset, length = param_spans[i]
+                params_tmp.seek(offset)
+                f.write(params_tmp.read(length))
+        _pad(f, param_offsets[-1])
+        _write_ints(f, 'Q', call_offsets)
+        _write_ints(f, 'I', call_targets)
+        _write_ints(f, 'Q', caller_offsets)
+        _write_ints(f, 'I', caller_targets)
+    params_tmp.close()
+    os.rename(tmp, fpath)
+    return n
+
+def _bit(bits, i):
+    return bits[i >> 3] & (1 << (i & 7))
+
+def _set_bit(bits, i):
+    bits[i >> 3] |= 1 << (i & 7)
+
+class _View(object):
+    '''A read-only dict-like view of live functions, like Callgraph.by_caller.'''
+    def __init__(self, cg):
+        self.cg = cg
+    def __len__(self):
+        return self.cg._live
+    def __iter__(self):
+        cg = self.cg
+        for i in xrange(cg.node_count):
+            if cg._is_live(i):
+                yield cg._name(i)
+    def __contains__(self, func):
+        return self.cg._find_live(func) is not None
+    def __getitem__(self, func):
+        i = self.cg._find_live(func)
+        if i is None:
+            raise KeyError(func)
+        return self._list(i)
+    def get(self, func, default=None):
+        i = self.cg._find_live(func)
+        if i is None:
+            return default
+        return self._list(i)
+    def keys(self):
+        return list(self)
+    def items(self):
+        cg = self.cg
+        return [(cg._name(i), self._list(i)) for i in xrange(cg.node_count) if cg._is_live(i)]
+
+class _CallsView(_View):
+    '''func --> what it calls that hasn't been removed yet.'''
+    def _list(self, i):
+        cg = self.cg
+        begin, end = cg._span(cg._call_offsets, i)
+        return [cg._name(cg._u32(cg._calls, j)) for j in xrange(begin, end) if not _bit(cg._removed_calls, j)]
+
+class _CallersView(_View):
+    '''func --> what calls it, as loaded.'''
+    def _list(self, i):
+        return [self.cg._name(j) for j in self.cg._callers_of(i)]
+
+class DiskCallgraph(object):
+    '''
+    A call graph backed by a file from build(), with the same interface
+    as callgraph.Callgraph.
+    '''
+    def __init__(self, root, fpath):
+        self.root = os.path.normpath(os.path.abspath(root))
+        self._file = open(fpath, 'rb')
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        found, n, call_count, caller_count, name_bytes, param_bytes = _header.unpack_from(self._mm, 0)
+        if found != magic:
+            raise ValueError('%s is not a call graph store.' % fpath)
+        self.node_count = n
+        at = _header.size
+        self._flags = at
+        at += _padded(n)
+        self._name_offsets = at
+        at += 8 * (n + 1)
+        self._names = at
+        at += _padded(name_bytes)
+        self._param_offsets = at
+        at += 8 * (n + 1)
+        self._params = at
+        at += _padded(param_bytes)
+        self._call_offsets = at
+        at += 8 * (n + 1)
+        self._calls = at
+        at += _padded(4 * call_count)
+        self._caller_offsets = at
+        at += 8 * (n + 1)
+        self._callers = at
+        self._removed = bytearray((n + 7) // 8)
+        self._removed_calls = bytearray((call_count + 7) // 8)
+        # How many calls each function makes to functions not yet removed.
+        self._pending = array.array('I', [0]) * n
+        self._live = 0
+        for i in xrange(n):
+            begin, end = self._span(self._call_offsets, i)
+            self._pending[i] = end - begin
+            if self._is_function(i):
+                self._live += 1
+        self.by_caller = _CallsView(self)
+        self.by_callee = _CallersView(self)
+    def _u64(self, section, i):
+        return struct.unpack_from('<Q', self._mm, section + 8 * i)[0]
+    def _u32(self, section, i):
+        return struct.unpack_from('<I', self._mm, section + 4 * i)[0]
+    def _span(self, offsets, i):
+        return struct.unpack_from('<2Q', self._mm, offsets + 8 * i)
+    def _name(self, i):
+        begin, end = self._span(self._name_offsets, i)
+        return _to_text(self._mm[self._names + begin:self._names + end])
+    def _find(self, func):
+        '''Return func's id, or None if doxygen never mentioned it.'''
+        key = _to_bytes(func)
+        lo, hi = 0, self.node_count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            begin, end = self._span(self._name_offsets, mid)
+            name = self._mm[self._names + begin:self._names + end]
+            if name < key:
+                lo = mid + 1
+            elif name > key:
+                hi = mid
+            else:
+                return mid
+    def _is_function(self, i):
+        '''Whether doxygen documented i, as opposed to only linking to it.'''
+        return self._mm[self._flags + i:self._flags + i + 1] == b'\1'
+    def _is_live(self, i):
+        return self._is_function(i) and not _bit(self._removed, i)
+    def _find_live(self, func):
+        i = self._find(func)
+        if i is not None and self._is_live(i):
+            return i
+    def _callers_of(self, i):
+        begin, end = self._span(self._caller_offsets, i)
+        return [self._u32(self._callers, j) for j in xrange(begin, end)]
+    def _remove_call(self, caller, callee):
+        begin, end = self._span(self._call_offsets, caller)
+        for j in xrange(begin, end):
+            if self._u32(self._calls, j) == callee and not _bit(self._removed_calls, j):
+                _set_bit(self._removed_calls, j)
+                self._pending[caller] -= 1
+                return True
+        return False
+    def get_params(self, func):
+        i = self._find_live(func)
+        if i is None:
+            return None
+        begin, end = self._span(self._param_offsets, i)
+        if begin == end:
+            return []
+        return [_to_text(p) for p in self._mm[self._params + begin:self._params + end].split(_param_sep)]
+    def get_orphans(self):
+        return [self._name(i) for i in xrange(self.node_count) if self._is_live(i) and not self._callers_of(i)]
+    def get_transitive_callers(self, func):
+        '''
+        Walk the call graph as loaded upward from func, and return every
+        function that calls it, directly or indirectly, whether or not it
+        has been removed since. func itself is not included.
+        '''
+        start = self._find(func)
+        if start is None:
+            return set()
+        seen = set([start])
+        pending = [start]
+        while pending:
+            for caller in self._callers_of(pending.pop()):
+                if caller not in seen:
+                    seen.add(caller)
+                    pending.append(caller)
+        seen.discard(start)
+        return set([self._name(i) for i in seen])
+    def get_leaves(self):
+        return [self._name(i) for i in xrange(self.node_count) if not self._pending[i] and self._is_live(i)]
+    def remove(self, func):
+        i = self._find_live(func)
+        if i is None:
+            print('Unable to delete %s.' % func)
+            return
+        for caller in self._callers_of(i):
+            if not self._is_live(caller) or self._remove_call(caller, i):
+                continue
+            caller_name = self._name(caller)
+            if caller_name == 'main()':
+                continue
+            # See callgraph._remove_name_with_typedef.
+            variants = [self._find(name) for name in callgraph._typedef_variants(func)]
+            if [1 for v in variants if v is not None and self._remove_call(caller, v)]:
+                continue
+            if 'MSNL' in func or 'MSNL' in caller_name:
+                continue
+            x = self.by_caller[caller_name]
+            if x:
+                print("Couldn't remove %s from the called list for %s." % (func, caller_name))
+                print('Here is what the called list for %s looked like: %s' % (caller_name, x))
+        _set_bit(self._removed, i)
+        self._live -= 1
+    def is_empty(self):
+        return not self._live
+    def close(self):
+        self._mm.close()
+        self._file.close()
+
+def load(root, fpath):
+    '''
+    Return a DiskCallgraph for root, first (re)building fpath if doxygen's
+    output is newer.
+    '''
+    callgraph.refresh_doxygen_output(root)
+    if not os.path.isfile(fpath) or os.path.getmtime(fpath) < callgraph._get_doxy_date(callgraph.doxy_output_folder):
+        build(fpath)
+    return DiskCallgraph(root, fpath)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write doxygen's call graph to a file that runs can memory-map.")
+    parser.add_argument('folder', help='root of the codebase')
+    parser.add_argument('--html', default=callgraph.doxy_output_folder, help="doxygen's HTML output")
+    args = parser.parse_args(argv)
+    import const_fix
+    root = os.path.normpath(os.path.abspath(args.folder))
+    folder = os.path.join(root, const_fix.state_folder)
+    if not os.path.isdir(folder):
+        os.makedirs(folder)
+    fpath = os.path.join(folder, store_name)
+    count = build(fpath, args.html)
+    print('Wrote %d names to %s.' % (count, fpath))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,46 +1,108 @@
 # -*- coding: utf-8 -*-
-import os, sys, re, traceback
+import argparse, hashlib, os, sys, re, threading, time, traceback
+try:
+    import Queue
+except ImportError:
+    import queue as Queue
 
-import callgraph
+import buildcache, builder, callgraph, cgstore, events, interproc, metrics, mutation, outcomecache, resultstore, runstore, scheduler, spanedit, testimpact, timing, workspace
 from prototype import *
 from safechange import *
 
 outcomes_log = 'const-outcomes.txt'
+outcomes_db = 'const-outcomes.db'
+trace_file = 'const-trace.json'
+# Prometheus text file for node_exporter's textfile collector; None = don't write one.
+metrics_file = 'const-metrics.prom'
+experiments_log = 'const-experiments.txt'
+# Every accepted change, as a unified diff; None = don't keep one.
+accepted_patch_log = 'const-accepted.patch'
+# Commands may use %(jobs)d; builder fills it in based on cores and load.
 compile_log = '/tmp/make.log'
-compile_cmd = 'make -j8 >%s 2>&1' % compile_log
-compile_tests_cmd = 'scons -f sconstruct.buildonly -j8 >%s 2>&1' % compile_log
-make_clean_cmd = 'make clean >/dev/null 2>&1'
-clean_tests_cmd = 'scons -c >/dev/null 2>&1'
+compile_cmd = 'make -j%(jobs)d'
+compile_tests_cmd = 'scons -f sconstruct.buildonly -j%(jobs)d'
+make_clean_cmd = 'make clean'
+clean_tests_cmd = 'scons -c'
 test_log = '/tmp/test.log'
-test_cmd = 'scons -j8 >%s 2>&1' % test_log
+test_cmd = 'scons -j%(jobs)d'
+# Seconds before a build or test run is killed and counted as a failure; 0 = never.
+compile_timeout = 0
+test_timeout = 0
+# Every Nth test run ignores impact selection and runs the whole suite, as a
+# safety net. 1 means always run the whole suite; 0 means never.
+full_test_interval = 20
+_test_run_count = 0
+_test_index = None
+# Digests of every object file as of the last build that was proven clean,
+# and copies of the artifacts from that build.
+_baseline_objects = None
+_artifact_stash = None
+state_folder = '.const_fix'
+_experiment_cache = None
+_toolchain = ''
+_const_facts = None
+_run_store = None
+# Seconds spent compiling and testing in the most recent prove_safe_change.
+last_timings = [None, None]
+# fpath --> (old text, new text) for each file the last rewrite touched.
+_last_rewrite = {}
+# Order leaves by expected payoff per second of build and test time, rather
+# than call graph order.
+schedule = True
+_scheduler = None
+# Stop starting new functions after this many seconds; 0 = run to the end.
+time_budget = 0
+# (i, n) to work only on shard i of n (1 <= i <= n); None = every function.
+shard = None
+# A PrototypeIndex kept current by a long-lived process (see constd.py), so
+# fix_func doesn't scan the whole codebase per function; None = scan.
+_prototype_index = None
+# Keep the call graph in a memory-mapped file instead of dicts (see cgstore.py).
+disk_callgraph = False
+# URL of a result store shared with other runs (see resultstore.py); None = local only.
+result_store_url = None
 
 const_error_pat_template = r'In function [^(]+ %s\s*\(.*?error: (' + \
     'passing ‘const[^\n]+discards qualifiers|' + \
     'assignment of member ‘[^‘]+’ in read-only object|' + \
     'invalid conversion from ‘const[^‘]+’ to ‘(?!const))'
 
-def run(cmd):
-    print('  ' + cmd)
-    return os.system(cmd)
+def run(cmd, cwd, log=os.devnull, timeout=0):
+    return builder.run(cmd, cwd, log, timeout)
 
-def improve_param_names(root, prototypes):
+def _with_targets(cmd, targets):
+    if not targets:
+        return cmd
+    return cmd + ' ' + ' '.join(targets)
+
+def select_test_targets(root, cg, func):
     '''
-    Moab's codebase has an antipattern where parameters are only named in the impl of a
-    function, not its declaration. This makes it necessary to look up the impl to know
-    how to call a function properly.
-    
-    Try to rectify this problem by scanning all prototypes for a given function, and
-    giving each parameter the most meaningful name we can find.
-    
-    Return True if changes were made and the code compiled successfully afterward.
+    Figure out which test targets reference func or any of its transitive
+    callers, since those are the only ones a change to func can affect.
+    Return None if the whole suite should run instead.
     '''
-    if len(prototypes) < 2:
-        return False
-    
-    best = None        
-    # Figure out which version of this parameter, across all prototypes,
-    # has the longest name. We're going to assume that the longest name
-    # is the best one. Not 100% true, I know, but a good approximation.
+    global _test_run_count, _test_index
+    _test_run_count += 1
+    if cg is None or not func:
+        return None
+    if full_test_interval and _test_run_count % full_test_interval == 0:
+        print('  Running full test suite as a periodic safety net.')
+        return None
+    if _test_index is None:
+        _test_index = testimpact.TestIndex(os.path.join(root, 'test'))
+    if not func.endswith('()'):
+        func += '()'
+    funcs = [func] + list(cg.get_transitive_callers(func))
+    return _test_index.impacted_targets(funcs)
+
+def _choose_best_names(prototypes):
+    '''
+    Figure out which version of each parameter, across all non-test
+    prototypes, has the longest name. We're going to assume that the longest
+    name is the best one. Not 100% true, I know, but a good approximation.
+    Return a list of names by param index, or None.
+    '''
+    best = None
     for fpath in prototypes.non_test_fpaths():
         prototypes_in_this_file = prototypes[fpath]
         if not best:
@@ -56,61 +118,234 @@ def improve_param_names(root, prototypes):
                     # unfortunate. Same for partitions and policies. Therefore,
                     # propose better names if no existing ones are useful.
                     if len(current) < 2 and len(best[i]) < 2:
-                        current = param.propose_name()
+                        current = param.propose_name() or current
                     if best[i]:
                         if len(best[i]) < len(current):
                             best[i] = current
                     else:
                         best[i] = current
                 i += 1
-    
-    # On off chance that we have a func that's only in the test folder...
-    if not best:
-        return False
+    return best
+
+def _drop_clashing_names(prototypes, best):
+    '''
+    A body that already uses a proposed name (a local, a global, another
+    param) would silently rebind it when the param is renamed. Leave such
+    params alone everywhere. Return None if nothing is safe to rename.
+    '''
+    for fpath in prototypes.non_test_fpaths():
+        for proto in prototypes[fpath]:
+            if not proto.start_of_body:
+                continue
+            used = set(mutation.tokenize(proto.txt, proto.start_of_body, proto.end_of_body))
+            for i, param in enumerate(proto.params):
+                if best[i] and best[i] != param.name and best[i] in used:
+                    best[i] = ''
+    named = [name for name in best if name]
+    if len(set(named)) < len(named):
+        # Two params would end up with the same name.
+        return None
+    return best
 
-    # Now see which prototypes need to be updated to reflect the best names.
+def _mark_renames(prototypes, best):
+    '''
+    Set new_name wherever a prototype's param name isn't the best one. A
+    definition's unnamed param stays unnamed; its body can't be using it.
+    Return how many prototypes changed.
+    '''
     change_count = 0
     for fpath in prototypes.non_test_fpaths():
         for proto in prototypes[fpath]:
             proto.dirty = False
             i = 0
             for param in proto.params:
-                if param.name != best[i]:
+                param.new_name = None
+                if proto.start_of_body and not param.name:
+                    pass
+                elif best[i] and param.name != best[i]:
                     param.new_name = best[i]
                     proto.dirty = True
                 i += 1
             if proto.dirty:
                 change_count += 1
-    
-    if change_count:
-        print("  Rewriting prototypes to include better param names.")
-        # Make the changes and see if they are okay. One possible reason why these
-        # changes could fail is that a parameter isn't used, so adding a name for
-        # it causes a warning.
-        rewrite_prototypes(prototypes)
-        if prove_safe_change(root, prototypes, param_name_rollback()):
-            for proto in prototypes.non_test_prototypes():
-                for param in proto.params:
-                    if param.new_name:
-                        param.name = param.new_name
-                    param.decl = str(param)
-            return True
-        
-    return False
+    return change_count
 
-def tests_pass(root):
-    print('Testing...')
-    oldcwd = os.getcwd()
-    try:
-        os.chdir(os.path.join(root, 'test'))
-        exitcode = run(test_cmd)
-        if exitcode:
-            print('  Tests failed. See %s for details.' % test_log)
-        else:
-            print('  Tests pass.')
-        return exitcode == 0
-    finally:
-        os.chdir(oldcwd)
+class _Batch(PrototypeMap):
+    '''Prototypes of many functions, merged by file so they're rewritten and built together.'''
+    def __init__(self, label):
+        PrototypeMap.__init__(self)
+        # What the accepted-patch log calls the change.
+        self.label = label
+    @property
+    def function_name(self):
+        # No one function owns the change, so every test is relevant.
+        return None
+
+def _merge_renames(index, funcs):
+    '''
+    Mark the best param names for each of funcs, and merge the prototypes that
+    change into one batch. A function whose prototypes overlap one already
+    in the batch (say, a call mistaken for a prototype inside another
+    function's body) is deferred to a later batch. Return the batch, the
+    functions in it, and the deferred functions.
+    '''
+    batch = _Batch('param names')
+    spans = {}
+    changed = []
+    deferred = []
+    for func in funcs:
+        prototypes = index[func]
+        if len(prototypes) < 2 or _mismatched_prototypes(prototypes):
+            # Overloads, most likely; there's no telling which names go together.
+            continue
+        best = _choose_best_names(prototypes)
+        if best:
+            best = _drop_clashing_names(prototypes, best)
+        if not best or not _mark_renames(prototypes, best):
+            continue
+        dirty = [(fpath, proto) for fpath in prototypes for proto in prototypes[fpath] if proto.dirty]
+        mine = [(fpath, proto.match.start(), proto.end_of_body or proto.match.end()) for fpath, proto in dirty]
+        if [1 for fpath, begin, end in mine for b, e in spans.get(fpath, []) if begin < e and b < end]:
+            deferred.append(func)
+            continue
+        for fpath, begin, end in mine:
+            spans.setdefault(fpath, []).append((begin, end))
+        for fpath, proto in dirty:
+            batch.setdefault(fpath, []).append(proto)
+        changed.append(func)
+    for fpath in batch:
+        batch[fpath].sort(key=lambda proto: proto.match.start())
+    return batch, changed, deferred
+
+def _try_renames(root, index, batch, changed, cg):
+    '''
+    Apply a batch of renames from _merge_renames in one rewrite and prove
+    them with one build. If that fails, bisect until the renames that break
+    the build are isolated. Return the functions whose renames were kept and
+    those that were rejected.
+    '''
+    print('\nTrying better param names for %d %s at once...' % (len(changed), _pluralize('function', len(changed))))
+    rewrite_prototypes(batch)
+    if prove_safe_change(root, batch, param_name_rollback(), cg):
+        index.refresh(list(batch.keys()))
+        return changed, []
+    if len(changed) == 1:
+        return [], changed
+    kept = []
+    rejected = []
+    mid = len(changed) // 2
+    for half in (changed[:mid], changed[mid:]):
+        # Functions in one batch never overlap, so nothing is deferred here.
+        batch, funcs, deferred = _merge_renames(index, half)
+        if funcs:
+            k, r = _try_renames(root, index, batch, funcs, cg)
+            kept.extend(k)
+            rejected.extend(r)
+    return kept, rejected
+
+def improve_all_param_names(root, cg):
+    '''
+    Moab's codebase has an antipattern where parameters are only named in the
+    impl of a function, not its declaration. This makes it necessary to look
+    up the impl to know how to call a function properly.
+
+    Give each parameter of every function in the call graph the most
+    meaningful name found among its prototypes, all at once: one scan of the
+    codebase, one rewrite, one build. Only if that build fails (typically
+    because a newly named param is unused and warnings are errors) do we
+    bisect to find the renames at fault.
+    '''
+    funcs = sorted(cg.by_caller.keys())
+    print('Indexing prototypes of %d functions...' % len(funcs))
+    index = PrototypeIndex(root, funcs)
+    kept = []
+    rejected = []
+    pending = funcs
+    while pending:
+        batch, changed, pending = _merge_renames(index, pending)
+        if not changed:
+            break
+        k, r = _try_renames(root, index, batch, changed, cg)
+        kept.extend(k)
+        rejected.extend(r)
+    print('\nImproved param names in %d %s.' % (len(kept), _pluralize('function', len(kept))))
+    if rejected:
+        print('Renames broke the build for: %s' % ', '.join(rejected))
+    return kept, rejected
+
+def _mark_obnoxious_const(prototypes):
+    '''
+    Drop top-level const from the by-value params of every prototype that
+    isn't a definition. Return (param, type before) for each param changed.
+    '''
+    changes = []
+    for fpath in prototypes:
+        for proto in prototypes[fpath]:
+            if proto.start_of_body:
+                continue
+            for param in proto.params:
+                if not param.is_const_candidate() and param.has_top_level_const():
+                    changes.append((param, param.ctype))
+                    param.set_const(False)
+                    proto.dirty = True
+    return changes
+
+def remove_all_obnoxious_const(root, cg):
+    '''
+    Const on a by-value param says nothing to callers: it isn't part of the
+    function's type, so declarations can drop it without changing what they
+    declare. (Definitions keep it; there it stops the body from assigning
+    to the param.)
+
+    Remove it from the declarations of every function in the call graph at
+    once: one scan of the codebase, one rewrite, one build to confirm. If
+    the build fails anyway, everything is rolled back. Return the functions
+    whose declarations changed.
+    '''
+    funcs = sorted([func for func in cg.by_caller if _classify_func(cg.get_params(func)) != CONST_IRRELEVANT])
+    print('Indexing prototypes of %d functions...' % len(funcs))
+    index = PrototypeIndex(root, funcs)
+    batch = _Batch('obnoxious const')
+    changed = []
+    changes = []
+    for func in funcs:
+        prototypes = index[func]
+        mine = _mark_obnoxious_const(prototypes)
+        if not mine:
+            continue
+        for fpath in prototypes.dirty_fpaths():
+            batch.setdefault(fpath, []).extend([proto for proto in prototypes[fpath] if proto.dirty])
+        changed.append(func)
+        changes.extend(mine)
+    if not changed:
+        print('\nNo declarations have obnoxious const.')
+        return []
+    for fpath in batch:
+        batch[fpath].sort(key=lambda proto: proto.match.start())
+    print('\nRemoving obnoxious const from %d %s in %d %s at once...' % (len(changes), _pluralize('param', len(changes)),
+        len(changed), _pluralize('function', len(changed))))
+    rewrite_prototypes(batch)
+    if not prove_safe_change(root, batch, ctype_rollback(changes), cg):
+        print('Removing obnoxious const broke the build; nothing was changed.')
+        return []
+    for func in changed:
+        print('  %s' % func)
+    print('\nRemoved obnoxious const from %d %s.' % (len(changed), _pluralize('function', len(changed))))
+    return changed
+
+@timing.timed('test')
+def tests_pass(root, targets=None, func=None):
+    '''
+    Run the tests. If targets is None, run the whole suite; otherwise,
+    run only the listed scons targets.
+    '''
+    if targets is not None and not targets:
+        events.emit(events.TestsSkipped(func, 'no affected tests'))
+        return True
+    events.emit(events.TestsStarted(func, targets))
+    exitcode = run(_with_targets(test_cmd, targets), os.path.join(root, 'test'), test_log, test_timeout)
+    events.emit(events.TestsFinished(func, exitcode == 0, test_log))
+    return exitcode == 0
         
 def get_compile_log_tail():
     with open(compile_log, 'r') as f:
@@ -119,148 +354,253 @@ def get_compile_log_tail():
         txt = txt[-2000:]
     return txt
 
-def compile_is_clean(root, changed_func=None):
-    print('Compiling...')
-    oldcwd = os.getcwd()
-    try:
-        os.chdir(root)
-        exitcode = run(compile_cmd)
-        test_clean = False
-        if exitcode:
-            dont_bother_with_clean = False
-            if changed_func:
-                tail = get_compile_log_tail()
-                pat = re.compile(const_error_pat_template % changed_func, re.DOTALL | re.MULTILINE)
-                if pat.search(tail):
-                    dont_bother_with_clean = True
-            if dont_bother_with_clean:
-                print('  Compile failed due to const error.')
-                return False
-            else:
-                print('  Incremental compile failed. Trying to clean.')
-                run(make_clean_cmd)
-                test_clean = True
-                exitcode = run(compile_cmd)
-        if not exitcode:
-            os.chdir(os.path.join(root, 'test'))
-            if not test_clean:
-                run(compile_tests_cmd)
-                if exitcode:
-                    print('  Incremental compile of tests failed.')
-                    test_clean = True
-            if test_clean:
-                print('  Trying to clean and then compile tests.')
-                run(clean_tests_cmd)
-                exitcode = run(compile_tests_cmd)
-        if exitcode:
-            print('  Clean compile failed. See %s for details.' % compile_log)
+@timing.timed('compile')
+def compile_is_clean(root, changed_func=None, test_targets=None):
+    events.emit(events.CompileStarted(changed_func))
+    test_root = os.path.join(root, 'test')
+    exitcode = run(compile_cmd, root, compile_log, compile_timeout)
+    test_clean = False
+    if exitcode:
+        dont_bother_with_clean = False
+        if changed_func:
+            tail = get_compile_log_tail()
+            pat = re.compile(const_error_pat_template % changed_func, re.DOTALL | re.MULTILINE)
+            if pat.search(tail):
+                dont_bother_with_clean = True
+        if dont_bother_with_clean:
+            events.emit(events.CompileFinished(changed_func, False, True, compile_log))
+            return False
         else:
-            print('  Compile succeeded.')
-        return exitcode == 0
-    finally:
-        os.chdir(oldcwd) 
+            events.emit(events.CompileRetried(changed_func, 'sources'))
+            run(make_clean_cmd, root)
+            test_clean = True
+            exitcode = run(compile_cmd, root, compile_log, compile_timeout)
+    if not exitcode:
+        if test_targets is not None and not test_targets:
+            pass
+        elif not test_clean:
+            run(_with_targets(compile_tests_cmd, test_targets), test_root, compile_log, compile_timeout)
+            if exitcode:
+                test_clean = True
+        if test_clean:
+            events.emit(events.CompileRetried(changed_func, 'tests'))
+            run(clean_tests_cmd, test_root)
+            exitcode = run(_with_targets(compile_tests_cmd, test_targets), test_root, compile_log, compile_timeout)
+    events.emit(events.CompileFinished(changed_func, exitcode == 0, False, compile_log))
+    return exitcode == 0
 
+@timing.timed('rewrite')
 def rewrite_prototypes(prototypes):
+    '''
+    Write every dirty prototype's params back to its file, renaming params in
+    the body too if they got new names. Each file gets one list of span
+    edits, applied in one pass and written atomically.
+    '''
+    _last_rewrite.clear()
+    changes = []
     for fpath in prototypes.dirty_fpaths():
-        backup_file(fpath)
         with open(fpath, 'r') as f:
             txt = f.read()
-        i = 0
-        new_txt = ''
-        new_names = []
+        edits = spanedit.EditList(txt)
         for proto in prototypes[fpath]:
+            if not proto.dirty:
+                continue
+            renames = {}
             for param in proto.params:
-                if proto.start_of_body and param.new_name and param.new_name != param.name:
-                    new_names.append((re.compile(r'(\W)(?<![.>])%s(\W)' % param.name), r'\1%s\2' % param.new_name))
-                new_txt += txt[i:param.begin]
-                new_txt += str(param)
-                i = param.begin + len(param.decl)
-        if new_names:
-            new_txt += txt[i:proto.start_of_body]
-            body = txt[proto.start_of_body:proto.end_of_body]
-            for pair in new_names:
-                body = pair[0].sub(pair[1], body)
-            new_txt += body
-            i = proto.end_of_body
-        new_txt += txt[i:]
-        with open(fpath, 'w') as f:
-            f.write(new_txt)
+                if proto.start_of_body and param.name and param.new_name and param.new_name != param.name:
+                    renames[param.name] = param.new_name
+                edits.replace(param.begin, param.begin + len(param.decl), str(param))
+            if renames:
+                body = txt[proto.start_of_body:proto.end_of_body]
+                edits.replace(proto.start_of_body, proto.end_of_body, spanedit.rename_identifiers(body, renames))
+        changes.append((fpath, txt, edits.apply(), edits.inverse))
+    journal_edits(changes)
+    for fpath, txt, new_txt, inverse in changes:
+        spanedit.write_atomically(fpath, new_txt)
+        _last_rewrite[fpath] = (txt, new_txt)
+
+def log_accepted_patch(root, label):
+    '''Append the last rewrite to the accepted-patch log, as a unified diff.'''
+    if not accepted_patch_log or not _last_rewrite:
+        return
+    with open(os.path.join(root, accepted_patch_log), 'a') as f:
+        f.write('# %s\n' % label)
+        for fpath in sorted(_last_rewrite):
+            old, new = _last_rewrite[fpath]
+            f.write(spanedit.unified_diff(old, new, os.path.relpath(fpath, root)))
             
 def _pluralize(noun, count):
     if count == 1:
         return noun
     return noun + 's'
 
-def prove_safe_change(root, prototypes, undo_func):
-    if not compile_is_clean(root, prototypes.function_name) or not tests_pass(root):
-        print("  Change doesn't work. Backing it out.")
-        for fpath in prototypes.dirty_fpaths():
-            restore_file(fpath)
-        undo_func(prototypes)
-        if not compile_is_clean(root, prototypes.function_name) or not tests_pass(root):
-            print('Unable to get back to a clean state; exiting prematurely.')
-            sys.exit(1)
+def _open_artifact_stash(root):
+    global _artifact_stash
+    if _artifact_stash is None:
+        _artifact_stash = buildcache.ArtifactStash(os.path.join(root, state_folder, 'artifacts'))
+
+def remember_clean_build(root):
+    global _baseline_objects
+    _baseline_objects = buildcache.snapshot_objects(root)
+    _open_artifact_stash(root)
+    _artifact_stash.capture(root)
+    if _run_store:
+        # Saved with the fingerprint, so a run that finds the tree unchanged
+        # can pick them up instead of hashing the whole build again.
+        _artifact_stash.save()
+        buildcache.save_digests(os.path.join(root, state_folder, 'digests'), root)
+        _run_store.set_meta('clean_fingerprint', buildcache.tree_fingerprint(root, _toolchain))
+
+def resume_clean_build(root):
+    '''
+    The tree is exactly as it was when last proven clean. Reload what that
+    run knew about its build; snapshotting the objects then only costs a
+    stat per file.
+    '''
+    global _baseline_objects
+    buildcache.load_digests(os.path.join(root, state_folder, 'digests'), root)
+    _open_artifact_stash(root)
+    _artifact_stash.load()
+    _baseline_objects = buildcache.snapshot_objects(root)
+
+def forget_clean_build():
+    '''
+    Call this when sources change without a build to prove them, so we don't
+    mistake the old objects for a clean baseline of the new sources.
+    '''
+    global _baseline_objects
+    _baseline_objects = None
+    if _artifact_stash:
+        _artifact_stash.entries = {}
+
+def object_code_unchanged(root):
+    '''
+    Adding const very often leaves the generated code alone. If every object
+    in the tree matches the last clean build (ignoring debug info), the
+    binaries are identical, so there is nothing for the tests to find.
+    '''
+    if _baseline_objects is None:
+        return False
+    current = buildcache.snapshot_objects(root)
+    return not buildcache.changed_objects(_baseline_objects, current)
+
+def prove_safe_change(root, prototypes, undo_func, cg=None):
+    func = prototypes.function_name
+    targets = select_test_targets(root, cg, func)
+    started = time.time()
+    ok = compile_is_clean(root, func, targets)
+    last_timings[0] = time.time() - started
+    last_timings[1] = None
+    if ok:
+        if object_code_unchanged(root):
+            events.emit(events.TestsSkipped(func, 'object code unchanged'))
+        else:
+            started = time.time()
+            ok = tests_pass(root, targets, func)
+            last_timings[1] = time.time() - started
+    if not ok:
+        events.emit(events.RollbackStarted(func))
+        with timing.phase('rollback'):
+            fpaths = list(prototypes.dirty_fpaths())
+            mtimes = restore_files(fpaths)
+            verified = len(mtimes) == len(fpaths)
+            undo_func(prototypes)
+            if verified and _artifact_stash and _artifact_stash.restore(root):
+                # Only now do the sources' old mtimes match what's built.
+                backdate(mtimes)
+                events.emit(events.RollbackFinished(func, 'restored'))
+            elif object_code_unchanged(root):
+                events.emit(events.RollbackFinished(func, 'unchanged'))
+            elif not compile_is_clean(root, func, targets) or not tests_pass(root, targets, func):
+                events.emit(events.RollbackFinished(func, 'failed'))
+                sys.exit(1)
+            else:
+                remember_clean_build(root)
+                events.emit(events.RollbackFinished(func, 'rebuilt'))
         return False
     else:
-        print("  It works. Keeping change.")
+        events.emit(events.ChangeKept(func or prototypes.label))
+        forget_edits()
+        log_accepted_patch(root, func or prototypes.label)
+        remember_clean_build(root)
         return True
         
+def _mismatched_prototypes(prototypes):
+    '''Return the prototypes whose param types differ from the best one's.'''
+    impl = prototypes.find_best()
+    return [proto for fpath in prototypes for proto in prototypes[fpath] if proto is not impl and not proto.matches(impl)]
+
+def _find_prototypes(func, root):
+    if _prototype_index is None:
+        return find_prototypes_in_codebase(func, root)
+    return _prototype_index.find(func)
+
 def fix_func(func, root, cg, tags):
     if func.lower().endswith("printf"):
         tags += "SKIPPED"
         return tags
     # Locate every place where this function's prototype appears.
     # In some cases, the prototype might be followed by a body; in most cases, not.
-    prototypes = find_prototypes_in_codebase(func, root)
+    prototypes = _find_prototypes(func, root)
     
     # Find the version of the prototype that's associated with the main implementation
     # of the function (not the one in test scaffolding). Use it as the standard against
     # which other prototypes are compared.
-    ok = True
     impl = prototypes.find_best()
-    for fpath in prototypes:
-        for proto in prototypes[fpath]:
-            if proto is not impl:
-                if not proto.matches(impl):
-                    print("  Prototypes don't match:\n    %s\n      vs\n    %s" % (impl.get_ideal(), proto.get_ideal()))
-                    ok = False
-    if not ok:
+    mismatched = _mismatched_prototypes(prototypes)
+    for proto in mismatched:
+        print("  Prototypes don't match:\n    %s\n      vs\n    %s" % (impl.get_ideal(), proto.get_ideal()))
+    if mismatched:
         tags += "INCONSISTENT_PROTOTYPES "
         return tags
     
-    # We may be able to improve the code by copying param names into places that
-    # don't have them.
-    if False and improve_param_names(root, prototypes):
-        tags += "PARAM_NAMES_IMPROVED "
-        # Rather than trying to update every offset and every param name for every
-        # prototype, in RAM, it's safer to just reload from disk after we make
-        # changes.
-        prototypes = find_prototypes_in_codebase(func, root)
-        # Re-fetch impl,
-        impl = prototypes.find_best()
+    # Param names are improved for all functions at once, by a separate run
+    # (--param-names); one build per function is far too slow.
             
     if not impl.start_of_body:
         print('  Unable to find an implementation of %s. Skipping.' % impl.name)
         tags += 'NO_IMPL '
         return tags
     
+    facts = _const_facts or interproc.ConstFacts(cg)
     if impl.is_const_candidate():
+        cant_be_const, batchable = facts.classify(func, impl)
+        # If we crashed partway through this function last time, pick up at
+        # the first param we hadn't tried yet.
+        already_tried = {}
+        if _run_store:
+            already_tried = _run_store.param_outcomes(func)
+        batchable = [param_idx for param_idx in batchable if param_idx not in already_tried]
         change_count = 0
+        if len(batchable) > 1:
+            # These params only flow into callee params that are already const,
+            # so they will very likely all work; try them in a single build.
+            for param_idx in batchable:
+                impl.params[param_idx].set_const(True)
+            events.emit(events.ExperimentStarted(func, batchable, impl.get_ideal()))
+            if _try_const_change(func, root, cg, prototypes, impl, [(param_idx, False) for param_idx in batchable]):
+                change_count += len(batchable)
+                prototypes = _find_prototypes(func, root)
+                impl = prototypes.find_best()
+                cant_be_const, batchable = facts.classify(func, impl)
         param_idx = 0
         while param_idx < len(impl.params):
             param = impl.params[param_idx]
             original_state = None
             if param.is_const_candidate():
                 if not param.is_const():
-                    if impl.prove_param_cant_be_const(param_idx):
-                        print("Proved that param %d can't be const." % (param_idx + 1))
-                        pass
+                    if param_idx in already_tried:
+                        print('Param %d was already tried in an earlier run (%s).' % (param_idx + 1, already_tried[param_idx]))
+                        metrics.inc('builds_avoided_total', reason='earlier_run')
+                    elif param_idx in cant_be_const:
+                        print("Proved that param %d can't be const (%s)." % (param_idx + 1, cant_be_const[param_idx]))
+                        metrics.inc('builds_avoided_total', reason='static_analysis')
                     else:
                         original_state = False
                         param.set_const(True)
             elif param.is_const():
                 # Currently we'll skip remediation of obnoxious const to speed up analysis
-                # and limit diffs.
+                # and limit diffs. --obnoxious-const removes it from declarations in bulk.
                 param.set_const(False)
                 if True:
                     tags += 'OBNOXIOUS_CONST: %s ' % param
@@ -269,19 +609,17 @@ def fix_func(func, root, cg, tags):
                 else:
                     original_state = True
             if original_state is not None:
-                print('Trying %s...' % impl.get_ideal())
-                for fpath in prototypes:
-                    for proto in prototypes[fpath]:
-                        proto.params[param_idx].data_type = param.data_type
-                        proto.dirty = True
-                rewrite_prototypes(prototypes)
-                if prove_safe_change(root, prototypes, const_rollback(param, param_idx, original_state)):
+                events.emit(events.ExperimentStarted(func, [param_idx], impl.get_ideal()))
+                with timing.attributed(param=param_idx):
+                    kept = _try_const_change(func, root, cg, prototypes, impl, [(param_idx, original_state)])
+                if kept:
                     # Rather than trying to update every offset and every param name for every
                     # prototype, in RAM, it's safer to just reload from disk after we make
                     # changes.
-                    prototypes = find_prototypes_in_codebase(func, root)
+                    prototypes = _find_prototypes(func, root)
                     # Re-fetch impl,
                     impl = prototypes.find_best()
+                    cant_be_const, batchable = facts.classify(func, impl)
                     change_count += 1
             param_idx += 1
         print('%d %s made.' % (change_count, _pluralize('change', change_count)))
@@ -290,7 +628,77 @@ def fix_func(func, root, cg, tags):
             tags += ' --> ' + impl.get_ideal()
     else:
         tags += 'CANT_MODIFY'
+    facts.finalize(func, impl.params)
     return tags
+
+@timing.timed('experiment')
+def _try_const_change(func, root, cg, prototypes, impl, changes):
+    '''
+    changes is a list of (param index, original constness) for params whose
+    constness has already been toggled in impl. Copy the new types into every
+    prototype, rewrite them, and keep the result only if it is proven safe
+    (or was proven safe by a previous run). Return True if the change was kept.
+    '''
+    key = outcomecache.experiment_key(func, '+'.join([str(idx) for idx, state in changes]), impl, prototypes, _toolchain)
+    params = [idx for idx, state in changes]
+    signature = impl.get_ideal()
+    known = None
+    if _experiment_cache:
+        known = _experiment_cache.lookup(key)
+    metrics.inc('experiments_attempted_total')
+    if known:
+        metrics.inc('builds_avoided_total', reason='cache')
+    if known == outcomecache.REJECTED:
+        print('  Already known not to work; skipping build.')
+        metrics.inc('experiments_rejected_total')
+        for param_idx, original_state in changes:
+            impl.params[param_idx].set_const(original_state)
+        _record_params(func, changes, known)
+        events.emit(events.ExperimentFinished(func, params, signature, False, True, None, None))
+        return False
+    for param_idx, original_state in changes:
+        ctype = impl.params[param_idx].ctype
+        for fpath in prototypes:
+            for proto in prototypes[fpath]:
+                proto.params[param_idx].ctype = ctype
+                proto.dirty = True
+    rewrite_prototypes(prototypes)
+    if known == outcomecache.ACCEPTED:
+        print('  Already known to work; skipping build.')
+        metrics.inc('experiments_accepted_total')
+        forget_edits()
+        log_accepted_patch(root, func)
+        forget_clean_build()
+        _record_params(func, changes, known)
+        events.emit(events.ExperimentFinished(func, params, signature, True, True, None, None))
+        return True
+    rollback = batch_rollback([const_rollback(impl.params[idx], idx, state) for idx, state in changes])
+    ok = prove_safe_change(root, prototypes, rollback, cg)
+    if _scheduler:
+        _scheduler.observe(func, last_timings[0], last_timings[1])
+    metrics.observe('compile_seconds_average', last_timings[0])
+    if last_timings[1] is not None:
+        metrics.observe('test_seconds_average', last_timings[1])
+    if ok:
+        metrics.inc('experiments_accepted_total')
+        # One build settled every param in the batch.
+        metrics.inc('builds_avoided_total', len(changes) - 1, reason='batch')
+    else:
+        metrics.inc('experiments_rejected_total')
+    metrics.maybe_write()
+    outcome = ok and outcomecache.ACCEPTED or outcomecache.REJECTED
+    if _experiment_cache:
+        _experiment_cache.record(key, outcome)
+    # A failed batch doesn't settle any one param; each is retried on its own.
+    if ok or len(changes) == 1:
+        _record_params(func, changes, outcome, last_timings[0], last_timings[1])
+    events.emit(events.ExperimentFinished(func, params, signature, ok, False, last_timings[0], last_timings[1]))
+    return ok
+
+def _record_params(func, changes, outcome, compile_secs=None, test_secs=None):
+    if _run_store:
+        for param_idx, original_state in changes:
+            _run_store.record_param(func, param_idx, outcome, compile_secs, test_secs)
                 
 CONST_IRRELEVANT = 0
 CONST_MATTERS = 1
@@ -308,6 +716,10 @@ def _classify_func(params):
     return cls
 
 def verify_clean(root):
+    if _run_store and _run_store.get_meta('clean_fingerprint') == buildcache.tree_fingerprint(root, _toolchain):
+        print('Codebase is exactly as it was when last proven clean; skipping verification.')
+        resume_clean_build(root)
+        return
     ok = True
     print('Verifying that codebase is clean before we start...')
     if not compile_is_clean(root):
@@ -317,6 +729,7 @@ def verify_clean(root):
     if not ok:
         sys.stderr.write('Prototype fixup in %s aborted.\n' % root)
         sys.exit(1)
+    remember_clean_build(root)
         
 def verify_makefile(root):
     if not os.path.isfile(os.path.join(root, 'Makefile')):
@@ -340,15 +753,37 @@ def cut_noise(cg, previously_analyzed):
             cuttable.append(func)
     if cuttable:
         print('Eliminating functions where const issues are irrelevant...')
-        with open(outcomes_log, 'a') as f:
-            lbl = classify_labels[CONST_IRRELEVANT]
-            for func in cuttable:
-                f.write('%s\t%s\n' % (func, lbl))
-                cg.remove(func)
-                num_removed += 1
+        lbl = classify_labels[CONST_IRRELEVANT]
+        for func in cuttable:
+            if in_shard(func):
+                _run_store.record_function(func, lbl)
+            cg.remove(func)
+            num_removed += 1
+        _run_store.flush()
         print('Reduced function count from %d to %d.' % (len(cg.by_caller) + len(cuttable), len(cg.by_caller)))
     return num_removed
     
+def in_shard(func):
+    '''
+    Does func belong to this run's shard? Functions are assigned by a hash
+    of their name, so every machine agrees without talking to the others,
+    and the assignment doesn't change from one run to the next.
+    '''
+    if not shard:
+        return True
+    i, n = shard
+    return int(hashlib.md5(func.encode('utf-8')).hexdigest(), 16) % n == i - 1
+
+def parse_shard(txt):
+    '''Turn "i/n" into (i, n).'''
+    try:
+        i, n = [int(x) for x in txt.split('/')]
+    except ValueError:
+        raise argparse.ArgumentTypeError('Expected i/n, like 2/4.')
+    if not 1 <= i <= n:
+        raise argparse.ArgumentTypeError('Shard %d/%d is out of range.' % (i, n))
+    return i, n
+
 def prune(cg):
     num_pruned = 0
     to_prune = []
@@ -356,7 +791,8 @@ def prune(cg):
         params = cg.get_params(func)
         cls = _classify_func(params)
         if cls != CONST_MATTERS:
-            tabulate(func, classify_labels[cls])
+            if in_shard(func):
+                tabulate(func, classify_labels[cls])
             to_prune.append(func)
     print('pruning %d items: %s' % (len(to_prune), to_prune))
     for item in to_prune:
@@ -370,41 +806,152 @@ def tabulate(func, tags):
     if not hasattr(tags, 'upper'):
         tags = str(tags)[1:-1].replace(',', '')
         tags = tags.strip()
-    with open(outcomes_log, 'a') as f:
-        f.write('%s\t%s\n' % (func, tags))
+    _run_store.record_function(func, tags)
         
 def load_previous_results():
-    previously_analyzed = []
-    if os.path.isfile(outcomes_log):
-        with open(outcomes_log, 'r') as f:
-            lines = f.readlines()
-        previously_analyzed = [x[:x.find('\t')] for x in lines if x.find('\t') > -1]
+    if _run_store.is_empty():
+        count = _run_store.import_outcomes_log(outcomes_log)
+        if count:
+            print('Imported %d %s from %s.' % (count, _pluralize('result', count), outcomes_log))
+    previously_analyzed = _run_store.finished_functions()
     print('Found %d previously analyzed %s.' % (len(previously_analyzed), _pluralize('function', len(previously_analyzed))))
     return previously_analyzed
 
-def fix_prototypes(root, start_count=0, end_count=0):
-    print('')    
-    root = os.path.normpath(os.path.abspath(root))
-    
-    global outcomes_log
+def start_run(root, verify=True):
+    '''
+    Open the run's state, prove the codebase clean (unless verify is False,
+    for a process that never builds), and load the call graph.
+    '''
+    global outcomes_log, _experiment_cache, _toolchain, _run_store
     outcomes_log = os.path.join(root, outcomes_log)
+    _run_store = runstore.RunStore(os.path.join(root, outcomes_db))
+    _experiment_cache = outcomecache.ExperimentCache(os.path.join(root, experiments_log))
+    if result_store_url:
+        _experiment_cache = resultstore.TieredStore(_experiment_cache, resultstore.HttpResultStore(result_store_url))
+    _toolchain = outcomecache.toolchain_fingerprint(root, [compile_cmd, compile_tests_cmd, test_cmd])
+    if not os.path.isdir(os.path.join(root, state_folder)):
+        os.makedirs(os.path.join(root, state_folder))
+    failed = open_journal(os.path.join(root, state_folder, 'undo.journal'), root)
+    if failed:
+        sys.stderr.write('Could not undo an interrupted run\'s edits to %s; fix by hand.\n' % ', '.join(failed))
+        sys.exit(1)
     
-    verify_makefile(root)
-    verify_clean(root)
+    if verify:
+        verify_makefile(root)
+        verify_clean(root)
     
     print('Loading call graph...')
-    cg = callgraph.Callgraph(root)
+    if disk_callgraph:
+        return cgstore.load(root, os.path.join(root, state_folder, cgstore.store_name))
+    return callgraph.Callgraph(root)
+
+def fix_param_names(root):
+    print('')
+    root = os.path.normpath(os.path.abspath(root))
+    cg = start_run(root)
+    try:
+        improve_all_param_names(root, cg)
+    finally:
+        _run_store.flush()
+
+def fix_obnoxious_const(root):
+    print('')
+    root = os.path.normpath(os.path.abspath(root))
+    cg = start_run(root)
+    try:
+        remove_all_obnoxious_const(root, cg)
+    finally:
+        _run_store.flush()
+
+def fix_prototypes(root, start_count=0, end_count=0):
+    print('')    
+    root = os.path.normpath(os.path.abspath(root))
+    cg = start_run(root)
+    global _const_facts
+    _const_facts = interproc.ConstFacts(cg)
     func_count = len(cg.by_callee.keys())
     
     previously_analyzed = load_previous_results()
     func_count -= cut_noise(cg, previously_analyzed)
+    global _scheduler
+    if schedule:
+        print('Indexing includes to estimate the cost of each experiment...')
+        _scheduler = scheduler.Scheduler(root, cg, _run_store)
+    if metrics_file:
+        metrics.set_gauge('functions_remaining', len(cg.by_caller))
+        metrics.start(os.path.join(root, metrics_file))
         
+    events.emit(events.RunStarted(root, func_count))
+    started = time.time()
+    try:
+        finished = _run_passes(root, cg, func_count, start_count, end_count)
+        events.emit(events.RunFinished(finished, time.time() - started))
+    finally:
+        _run_store.flush()
+        _run_store.export_outcomes_log(outcomes_log)
+        metrics.write()
+        if trace_file:
+            timing.export_trace(os.path.join(root, trace_file))
+            print('\nWhere the time went (trace in %s):\n%s' % (trace_file, timing.summarize()))
+
+class _StopRun(Exception):
+    pass
+
+def iter_fix_prototypes(root, start_count=0, end_count=0):
+    '''
+    Run fix_prototypes in a thread and yield its events (see events.py) as
+    they happen. Closing the generator early stops the run before it
+    starts another function. Exceptions from the run, including SystemExit,
+    are raised here after the last event.
+    '''
+    queue = Queue.Queue()
+    stopping = threading.Event()
+    failed = []
+    def forward(event):
+        if stopping.is_set() and isinstance(event, (events.PassStarted, events.FunctionStarted)):
+            raise _StopRun()
+        queue.put(event)
+    def work():
+        try:
+            fix_prototypes(root, start_count, end_count)
+        except _StopRun:
+            pass
+        except BaseException as e:
+            failed.append(e)
+        finally:
+            queue.put(None)
+    events.subscribe(forward)
+    thread = threading.Thread(target=work)
+    thread.daemon = True
+    thread.start()
+    try:
+        while True:
+            event = queue.get()
+            if event is None:
+                break
+            yield event
+    finally:
+        stopping.set()
+        thread.join()
+        events.unsubscribe(forward)
+    if failed:
+        raise failed[0]
+
+def _new_signature(tags):
+    if '-->' in tags:
+        return tags.split('-->', 1)[1].strip()
+
+def _run_passes(root, cg, func_count, start_count, end_count):
+    started = time.time()
+    finished = 0
     tried_to_prune = False
     pass_number = 0
     while not cg.is_empty():
         pass_number += 1
         leaves = cg.get_leaves()
-        print('\nPass %d: %d leaves out of %d functions ----------------' % (pass_number, len(leaves), len(cg.by_callee)))
+        if _scheduler:
+            leaves = _scheduler.order(leaves)
+        events.emit(events.PassStarted(pass_number, len(leaves), len(cg.by_callee)))
         if len(leaves) == 0:
             # See if we can prune some stuff away by finding functions where const doesn't matter.
             if tried_to_prune:
@@ -416,25 +963,40 @@ def fix_prototypes(root, start_count=0, end_count=0):
                 continue
         else:
             tried_to_prune = False
+        if shard:
+            mine = [func for func in leaves if in_shard(func)]
+            if not mine:
+                # Our own functions are waiting on other shards' functions.
+                # Stop waiting; our callers will be tried against those
+                # callees as they are in this tree.
+                print('All %d leaves belong to other shards; no longer waiting on them.' % len(leaves))
+                for func in leaves:
+                    cg.remove(func)
+                    func_count -= 1
+                continue
+            leaves = mine
             
         i = 1
         for func in leaves:
+            if time_budget and time.time() - started > time_budget:
+                print('\nTime budget used up; stopping. Run again to pick up where this left off.')
+                return finished
             tags = ''
             callers = None
             if func in cg.by_callee:
                 callers = cg.by_callee[func]
             if not callers:
-                print('\n%d.%d. %s appears to be an orphan, never called.' % (pass_number, i, func))
                 tags += 'ORPHAN '
             params = cg.get_params(func)
             cls = _classify_func(params)
+            events.emit(events.FunctionStarted(pass_number, i, func, not callers, classify_labels[cls]))
             if cls == CONST_MATTERS:
-                print('\n%d.%d. Experimenting with changes to %s...' % (pass_number, i, func))
                 try:
                     if (start_count > 0 and func_count > start_count):
                         tags += 'SKIPPED '
                     else:
-                        tags = fix_func(func, root, cg, tags)
+                        with timing.attributed(func):
+                            tags = fix_func(func, root, cg, tags)
                 except SystemExit:
                     raise
                 except KeyboardInterrupt:
@@ -444,16 +1006,21 @@ def fix_prototypes(root, start_count=0, end_count=0):
                     tags += 'EXCEPTION '
             elif cls == OBNOXIOUS_CONST:
                 tags += 'OBNOXIOUS_CONST '
-                print('%d.%d. %s should not use const, but does.' % (pass_number, i, func))
             else:
                 tags += 'CONST_IRRELEVANT '
-                print("%d.%d. Constness is not relevant to %s." % (pass_number, i, func))
             tabulate(func, tags)
+            events.emit(events.FunctionFinished(func, tags, _new_signature(tags)))
             cg.remove(func)
             func_count -= 1
+            finished += 1
+            metrics.inc('functions_finished_total')
+            metrics.set_gauge('functions_remaining', len(cg.by_caller))
+            metrics.set_gauge('eta_seconds', len(cg.by_caller) * (time.time() - started) / finished)
+            metrics.maybe_write()
             if (end_count > 0 and func_count <= end_count):
                 break
             i += 1
+    return finished
 
 def report_crash():
     import smtplib
@@ -469,18 +1036,63 @@ def report_crash():
     s.quit()
 
 if __name__ == '__main__':
-    start_count = 0
-    end_count = 0
+    parser = argparse.ArgumentParser(description='Add const to prototypes wherever the code still builds and passes tests.')
+    parser.add_argument('folder', nargs='?', default='.', help='root of the codebase')
+    parser.add_argument('start_count', nargs='?', type=int, default=0,
+        help='skip functions until this many remain')
+    parser.add_argument('end_count', nargs='?', type=int, default=0,
+        help='stop when this many functions remain')
+    parser.add_argument('--time-budget', type=float, default=0, metavar='HOURS',
+        help="don't start new functions after this many hours")
+    parser.add_argument('--no-schedule', action='store_true',
+        help='process leaves in call graph order instead of by payoff per second')
+    parser.add_argument('--metrics-file', default=metrics_file, metavar='PATH',
+        help='where to write Prometheus metrics, relative to folder; empty to disable')
+    parser.add_argument('--shard', type=parse_shard, metavar='I/N',
+        help='work only on the functions that hash to shard I of N; see shardmerge.py')
+    parser.add_argument('--disk-callgraph', action='store_true',
+        help='keep the call graph in a memory-mapped file, for very large codebases')
+    parser.add_argument('--result-store', metavar='URL',
+        help='share experiment outcomes through the service run by resultstore.py')
+    parser.add_argument('--scratch', nargs='?', const='', metavar='DIR',
+        help='run every experiment in a copy of the tree under DIR (default /dev/shm), copying accepted changes back')
+    parser.add_argument('--keep-scratch', action='store_true',
+        help="don't delete the scratch copy afterward")
+    parser.add_argument('--param-names', action='store_true',
+        help='instead of adding const, copy the best param names into every prototype')
+    parser.add_argument('--obnoxious-const', action='store_true',
+        help='instead of adding const, remove const from by-value params in every declaration')
+    args = parser.parse_args()
+    metrics_file = args.metrics_file
+    time_budget = args.time_budget * 3600
+    schedule = not args.no_schedule
+    shard = args.shard
+    disk_callgraph = args.disk_callgraph
+    result_store_url = args.result_store
+    folder = args.folder
+    scratch = None
+    if args.scratch is not None:
+        # The copy has no VCS folder to tell doxygen's output is stale.
+        callgraph.refresh_doxygen_output(os.path.abspath(folder))
+        # Our settings are this module's, not those of the const_fix that workspace imports.
+        scratch = workspace.Workspace(folder, args.scratch or None, sys.modules[__name__])
+        scratch.mirror()
+        scratch.redirect()
+        events.subscribe(scratch.on_event)
+        folder = scratch.tree
     try:
-        if len(sys.argv) > 1:
-            folder = sys.argv[1]
-            if len(sys.argv) > 2:
-                start_count = int(sys.argv[2])
-                if len(sys.argv) > 3:
-                    end_count = int(sys.argv[3])
-        else:
-            folder = '.'
-        sys.exit(fix_prototypes(folder, start_count, end_count))
+        if args.param_names:
+            sys.exit(fix_param_names(folder))
+        if args.obnoxious_const:
+            sys.exit(fix_obnoxious_const(folder))
+        sys.exit(fix_prototypes(folder, args.start_count, args.end_count))
+    except SystemExit:
+        raise
     except:
         report_crash()
         raise
+    finally:
+        if scratch:
+            scratch.sync_back()
+            scratch.sync_artifacts()
+            scratch.close(args.keep_scratch)
@@ -0,0 +1,276 @@
+'''
+Keep const_fix resident, so checking the functions you just edited costs
+seconds instead of a doxygen run, a call graph build and a verification
+build every time.
+
+    python constd.py serve ROOT              # run the daemon
+    python constd.py analyze ROOT [FUNC ...] # what static analysis says; no build
+    python constd.py check ROOT [FUNC ...]   # try const on each param, as const_fix does
+    python constd.py status ROOT
+    python constd.py stop ROOT
+
+With no FUNC, analyze and check work on every function whose prototypes are
+in a file that changed since the daemon last checked it.
+
+The daemon loads the call graph and indexes every prototype once, then
+polls the sources' mtimes. A changed file is re-read on its own; the
+functions with prototypes in it are the only ones whose analysis is thrown
+away. Before the next check, the tree is compiled and the affected tests
+run once, to prove the edited sources clean. The call graph comes from
+doxygen, so calls and functions added after the daemon started aren't in
+it until the daemon is restarted.
+
+Requests and replies are one JSON message per line on a Unix socket,
+ROOT/.const_fix/constd.sock.
+'''
+import argparse, os, socket, sys, traceback
+
+try:
+    import SocketServer as socketserver
+except ImportError:
+    import socketserver
+
+import const_fix, interproc, timing
+from distrib import send, receive
+from prototype import PrototypeIndex, _iter_source_files
+
+socket_name = 'constd.sock'
+# How often to look for changed sources while idle.
+poll_secs = 2
+
+def socket_path(root):
+    return os.path.join(root, const_fix.state_folder, socket_name)
+
+def _as_func(name):
+    if not name.endswith('()'):
+        name += '()'
+    return name
+
+class Daemon:
+    '''The call graph and prototypes of one tree, kept current as it changes.'''
+    def __init__(self, root):
+        self.root = root
+        self.cg = const_fix.start_run(root)
+        self.facts = const_fix._const_facts = interproc.ConstFacts(self.cg)
+        print('Indexing prototypes...')
+        self.index = const_fix._prototype_index = PrototypeIndex(root, list(self.cg.by_caller.keys()))
+        self.stats = self._stat_sources()
+        # Functions with prototypes in files that changed since they were checked.
+        self.touched = set()
+        # func --> reply to analyze; dropped when one of its files changes
+        self.analyses = {}
+        # True when sources changed since the build was last proven clean.
+        self.dirty = False
+        self.stopping = False
+    def _stat_sources(self):
+        stats = {}
+        for fpath in _iter_source_files(self.root):
+            st = os.stat(fpath)
+            stats[fpath] = (st.st_mtime, st.st_size)
+        return stats
+    def poll(self):
+        '''Notice edited, added and deleted sources. Return the files that changed.'''
+        current = self._stat_sources()
+        changed = [fpath for fpath in current if self.stats.get(fpath) != current[fpath]]
+        changed += [fpath for fpath in self.stats if fpath not in current]
+        self.stats = current
+        if not changed:
+            return changed
+        # Functions that were in these files before the edit, and after it.
+        affected = self._funcs_in(changed)
+        self.index.refresh(changed)
+        affected.update(self._funcs_in(changed))
+        for func in affected:
+            self.analyses.pop(func, None)
+            const_fix._run_store.forget_function(func)
+        self.touched.update(affected)
+        self.dirty = True
+        print('%d %s changed; %d %s affected.' % (len(changed), const_fix._pluralize('file', len(changed)),
+            len(affected), const_fix._pluralize('function', len(affected))))
+        return changed
+    def _funcs_in(self, fpaths):
+        fpaths = set(fpaths)
+        return set([func for func, prototypes in self.index.by_func.items() if fpaths.intersection(prototypes)])
+    def _resolve(self, names):
+        if not names:
+            return sorted(self.touched)
+        return [_as_func(name) for name in names]
+    def analyze(self, func):
+        if func in self.analyses:
+            return self.analyses[func]
+        prototypes = self.index.find(func)
+        impl = prototypes.find_best()
+        if impl is None or not impl.start_of_body:
+            reply = {'func': func, 'error': 'no implementation found'}
+        else:
+            cant_be_const, batchable = self.facts.classify(func, impl)
+            params = []
+            for idx, param in enumerate(impl.params):
+                params.append({'decl': str(param), 'candidate': param.is_const_candidate() and not param.is_const(),
+                    'cant_be_const': cant_be_const.get(idx), 'batchable': idx in batchable})
+            reply = {'func': func, 'prototype': impl.get_ideal(), 'params': params}
+        self.analyses[func] = reply
+        return reply
+    def _prove_clean(self, funcs):
+        '''The sources were edited by hand; prove the new baseline before experimenting on it.'''
+        const_fix.forget_clean_build()
+        targets = set()
+        for func in funcs:
+            func_targets = const_fix.select_test_targets(self.root, self.cg, func)
+            if func_targets is None:
+                targets = None
+                break
+            targets.update(func_targets)
+        if targets is not None:
+            targets = sorted(targets)
+        print('Verifying edited sources...')
+        if not const_fix.compile_is_clean(self.root, test_targets=targets) or not const_fix.tests_pass(self.root, targets):
+            return False
+        const_fix.remember_clean_build(self.root)
+        self.dirty = False
+        return True
+    def check(self, funcs):
+        if self.dirty and not self._prove_clean(funcs):
+            return [{'func': func, 'error': 'tree does not build or pass tests as edited'} for func in funcs]
+        results = []
+        for func in funcs:
+            print('\n%s ----------------' % func)
+            if not self.index[func]:
+                results.append({'func': func, 'error': 'no prototypes found'})
+                continue
+            with timing.attributed(func):
+                tags = const_fix.fix_func(func, self.root, self.cg, '')
+            const_fix.tabulate(func, tags)
+            self.analyses.pop(func, None)
+            results.append({'func': func, 'tags': tags})
+        const_fix._run_store.flush()
+        self.touched.difference_update(funcs)
+        # Our own accepted changes and rollbacks aren't edits to react to.
+        self.index.refresh(self.poll_quietly())
+        return results
+    def poll_quietly(self):
+        current = self._stat_sources()
+        changed = [fpath for fpath in current if self.stats.get(fpath) != current[fpath]]
+        self.stats = current
+        return changed
+    def handle(self, msg):
+        self.poll()
+        cmd = msg.get('cmd')
+        if cmd == 'status':
+            return {'root': self.root, 'functions': len(self.cg.by_caller), 'touched': sorted(self.touched),
+                'dirty': self.dirty}
+        if cmd == 'analyze':
+            return {'results': [self.analyze(func) for func in self._resolve(msg.get('funcs'))]}
+        if cmd == 'check':
+            return {'results': self.check(self._resolve(msg.get('funcs')))}
+        if cmd == 'stop':
+            self.stopping = True
+            return {'stopped': True}
+        return {'error': 'unknown command %r' % cmd}
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        msg = receive(self.rfile)
+        if msg is None:
+            return
+        try:
+            reply = self.server.daemon.handle(msg)
+        except SystemExit:
+            # const_fix exits when it can't get back to a clean tree.
+            self.server.daemon.stopping = True
+            reply = {'error': 'unable to get back to a clean state; daemon stopped'}
+        except Exception:
+            traceback.print_exc()
+            reply = {'error': traceback.format_exc().splitlines()[-1]}
+        send(self.wfile, reply)
+
+class _Server(socketserver.UnixStreamServer):
+    def handle_timeout(self):
+        self.daemon.poll()
+
+def serve(root):
+    root = os.path.normpath(os.path.abspath(root))
+    path = socket_path(root)
+    try:
+        request(root, {'cmd': 'status'})
+        sys.stderr.write('A daemon is already serving %s.\n' % root)
+        return 1
+    except socket.error:
+        pass
+    daemon = Daemon(root)
+    if os.path.exists(path):
+        os.remove(path)
+    server = _Server(path, _Handler)
+    server.daemon = daemon
+    server.timeout = poll_secs
+    print('Serving %s on %s.' % (root, path))
+    sys.stdout.flush()
+    try:
+        while not daemon.stopping:
+            server.handle_request()
+            sys.stdout.flush()
+    finally:
+        server.server_close()
+        os.remove(path)
+        const_fix._run_store.flush()
+        const_fix._run_store.export_outcomes_log(const_fix.outcomes_log)
+    return 0
+
+def request(root, msg):
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path(os.path.abspath(root)))
+        f = sock.makefile('rwb')
+        send(f, msg)
+        return receive(f)
+    finally:
+        sock.close()
+
+def _show(reply):
+    if 'error' in reply:
+        print('Error: %s' % reply['error'])
+        return 1
+    if 'results' not in reply:
+        for key in sorted(reply):
+            print('%s: %s' % (key, reply[key]))
+        return 0
+    if not reply['results']:
+        print('Nothing has changed.')
+    exitcode = 0
+    for result in reply['results']:
+        if 'error' in result:
+            print('%s: %s' % (result['func'], result['error']))
+            exitcode = 1
+        elif 'tags' in result:
+            print('%s: %s' % (result['func'], result['tags']))
+        else:
+            print(result['prototype'])
+            for i, param in enumerate(result['params']):
+                if param['cant_be_const']:
+                    verdict = "can't be const (%s)" % param['cant_be_const']
+                elif param['batchable']:
+                    verdict = 'very likely const'
+                elif param['candidate']:
+                    verdict = 'worth trying'
+                else:
+                    verdict = 'nothing to do'
+                print('  %d. %s: %s' % (i + 1, param['decl'], verdict))
+    return exitcode
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Keep const_fix resident and answer requests about a changing tree.')
+    parser.add_argument('cmd', choices=['serve', 'status', 'analyze', 'check', 'stop'])
+    parser.add_argument('folder', help='root of the codebase')
+    parser.add_argument('funcs', nargs='*', metavar='func', help='functions to analyze or check')
+    args = parser.parse_args(argv)
+    if args.cmd == 'serve':
+        return serve(args.folder)
+    try:
+        reply = request(args.folder, {'cmd': args.cmd, 'funcs': args.funcs})
+    except socket.error:
+        sys.stderr.write('No daemon is serving %s.\n' % args.folder)
+        return 1
+    return _show(reply)
+
+if __name__ == '__main__':
+    sys.exit(main())
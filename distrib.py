@@ -0,0 +1,325 @@
+'''
+Spread experiments across build hosts.
+
+A coordinator owns the call graph and hands leaf functions to workers over
+TCP, one JSON message per line. Each worker has its own git checkout of the
+same commit; it runs fix_func on the function it's given, and sends back a
+git diff of what it kept plus the function's tags. The coordinator applies
+accepted patches to its own checkout in the order they arrive, and sends
+each worker the patches it hasn't seen along with its next job, so every
+experiment runs against a tree that includes all of its callees' changes.
+
+    python distrib.py coordinator ROOT [--port 7070]
+    python distrib.py worker HOST:PORT ROOT [--name NAME]
+
+Everything works on one box: run the coordinator and several workers on
+localhost, each worker in its own clone.
+'''
+import argparse, json, os, socket, subprocess, sys, threading, time, traceback
+
+try:
+    import SocketServer as socketserver
+except ImportError:
+    import socketserver
+
+import const_fix, interproc, runstore, timing
+from testimpact import bare_name
+
+default_port = 7070
+# How long a worker waits before asking again when nothing is ready.
+wait_secs = 2
+# Workers commit each patch from the coordinator as this author, so a
+# worker that reconnects can tell which patches it already has.
+sync_name = 'const_fix'
+sync_author = ['-c', 'user.name=%s' % sync_name, '-c', 'user.email=const_fix@localhost']
+
+def send(wfile, msg):
+    wfile.write((json.dumps(msg) + '\n').encode('utf-8'))
+    wfile.flush()
+
+def receive(rfile):
+    line = rfile.readline()
+    if not line:
+        return None
+    return json.loads(line.decode('utf-8'))
+
+def _git(root, args, stdin=None):
+    p = subprocess.Popen(['git'] + args, cwd=root, stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if stdin is not None and not isinstance(stdin, bytes):
+        stdin = stdin.encode('utf-8')
+    out, err = p.communicate(stdin)
+    return p.returncode, out.decode('utf-8', 'replace')
+
+def apply_patch(root, patch):
+    '''
+    Apply a patch from a worker. Const and rename edits never add or remove
+    lines, so if a neighbor's change has altered the surrounding context, we
+    fall back to matching on less of it. Coordinator and workers apply the
+    same patches in the same order this same way, so their trees agree.
+    '''
+    for extra in ([], ['-C1']):
+        exitcode, out = _git(root, ['apply'] + extra + ['-'], patch)
+        if exitcode == 0:
+            return True
+    return False
+
+class Coordinator:
+    '''
+    The schedule: which leaves are ready, which are out with a worker, and
+    every accepted patch so far, in order.
+    '''
+    def __init__(self, root, cg):
+        self.root = root
+        self.cg = cg
+        self.lock = threading.Lock()
+        self.done = threading.Event()
+        self.head = _git(root, ['rev-parse', 'HEAD'])[1].strip()
+        # Callees as of the start, so we can send their final types later.
+        self.callees = dict([(func, list(called)) for func, called in cg.by_caller.items()])
+        self.final = {}
+        self.patches = []
+        self.ready = []
+        self.in_flight = {}
+        self.tried_to_prune = False
+        self.finished = 0
+    def _refill(self):
+        '''
+        Find more work once everything ready has been handed out. A leaf
+        stays in the call graph until its result comes back, so skip the
+        ones already out with a worker.
+        '''
+        while not self.ready and not self.cg.is_empty():
+            leaves = [f for f in self.cg.get_leaves() if f not in self.in_flight]
+            if not leaves:
+                if self.in_flight:
+                    # Their results will free up callers.
+                    break
+                if self.tried_to_prune:
+                    print('No functions are leaves; fixes after this point may be hit or miss.')
+                    leaves = list(self.cg.by_caller.keys())
+                else:
+                    self.tried_to_prune = True
+                    const_fix.prune(self.cg)
+                    continue
+            else:
+                self.tried_to_prune = False
+            for func in leaves:
+                tags = self._settle_locally(func)
+                if tags is None:
+                    self.ready.append(func)
+                else:
+                    self._finish(func, tags)
+        if self.cg.is_empty() and not self.in_flight:
+            self.done.set()
+    def _settle_locally(self, func):
+        '''Tag functions that need no experiments. Return None if one does.'''
+        tags = self._orphan_tag(func)
+        cls = const_fix._classify_func(self.cg.get_params(func))
+        if cls == const_fix.CONST_MATTERS:
+            return None
+        if cls == const_fix.OBNOXIOUS_CONST:
+            return tags + 'OBNOXIOUS_CONST '
+        return tags + 'CONST_IRRELEVANT '
+    def _orphan_tag(self, func):
+        if not self.cg.by_callee.get(func):
+            return 'ORPHAN '
+        return ''
+    def _finish(self, func, tags):
+        const_fix.tabulate(func, tags)
+        self.cg.remove(func)
+        self.finished += 1
+    def next_job(self, worker):
+        '''Return the next message for a worker: a job, wait, or done.'''
+        with self.lock:
+            self._refill()
+            if self.done.is_set():
+                return {'type': 'done'}
+            if not self.ready:
+                return {'type': 'wait', 'secs': wait_secs}
+            func = self.ready.pop(0)
+            self.in_flight[func] = worker.name
+            final = {}
+            for callee in self.callees.get(func, []):
+                if bare_name(callee) in self.final:
+                    final[bare_name(callee)] = self.final[bare_name(callee)]
+            patches = self.patches[worker.synced:]
+            worker.synced = len(self.patches)
+            print('%s: %s (%d left)' % (worker.name, func, len(self.cg.by_caller)))
+            return {'type': 'job', 'func': func, 'tags': self._orphan_tag(func),
+                'patches': patches, 'final': final}
+    def take_result(self, msg):
+        with self.lock:
+            func = msg['func']
+            self.in_flight.pop(func, None)
+            if msg.get('patch'):
+                if not apply_patch(self.root, msg['patch']):
+                    # It was built against a tree that lacked some newer patch
+                    # it collides with. Try it again on a synced worker.
+                    print('Patch for %s no longer applies; requeueing it.' % func)
+                    self.ready.insert(0, func)
+                    return
+                self.patches.append(msg['patch'])
+            if msg.get('final') is not None:
+                self.final[bare_name(func)] = msg['final']
+            self._finish(func, msg['tags'])
+            const_fix._run_store.flush()
+    def abandon(self, worker):
+        '''A worker went away; give its function to someone else.'''
+        with self.lock:
+            for func, name in list(self.in_flight.items()):
+                if name == worker.name:
+                    del self.in_flight[func]
+                    self.ready.insert(0, func)
+
+class _WorkerHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        coordinator = self.server.coordinator
+        self.synced = 0
+        self.name = '%s:%d' % self.client_address
+        try:
+            hello = receive(self.rfile)
+            if not hello:
+                return
+            self.name = hello.get('name') or self.name
+            if hello.get('base') != coordinator.head or hello.get('synced', 0) > len(coordinator.patches):
+                send(self.wfile, {'type': 'error', 'message': 'Worker checkout must be at %s.' % coordinator.head})
+                return
+            self.synced = hello.get('synced', 0)
+            print('%s joined.' % self.name)
+            while True:
+                msg = coordinator.next_job(self)
+                send(self.wfile, msg)
+                if msg['type'] == 'done':
+                    return
+                reply = receive(self.rfile)
+                if reply is None:
+                    break
+                if reply.get('type') == 'result':
+                    coordinator.take_result(reply)
+        except (socket.error, IOError, ValueError):
+            traceback.print_exc()
+        finally:
+            coordinator.abandon(self)
+
+class _Server(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+def run_coordinator(root, port=default_port):
+    root = os.path.normpath(os.path.abspath(root))
+    cg = const_fix.start_run(root, verify=False)
+    # Workers' results are recorded from their handler threads, under the
+    # coordinator's lock.
+    const_fix._run_store.close()
+    const_fix._run_store = runstore.RunStore(const_fix._run_store.fpath, shared=True)
+    previously_analyzed = const_fix.load_previous_results()
+    const_fix.cut_noise(cg, previously_analyzed)
+    coordinator = Coordinator(root, cg)
+    server = _Server(('', port), _WorkerHandler)
+    server.coordinator = coordinator
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    print('Coordinating %d functions on port %d.' % (len(cg.by_caller), server.server_address[1]))
+    try:
+        with coordinator.lock:
+            coordinator._refill()
+        while not coordinator.done.wait(1):
+            pass
+    finally:
+        server.shutdown()
+        const_fix._run_store.flush()
+        const_fix._run_store.export_outcomes_log(const_fix.outcomes_log)
+    print('Finished %d functions; applied %d patches.' % (coordinator.finished, len(coordinator.patches)))
+
+def sync_state(root):
+    '''
+    Return the commit this checkout started from, and how many of the
+    coordinator's patches have been committed on top of it.
+    '''
+    exitcode, out = _git(root, ['log', '--format=%H %an'])
+    synced = 0
+    for line in out.splitlines():
+        commit, author = line.split(' ', 1)
+        if author != sync_name:
+            return commit, synced
+        synced += 1
+    return None, synced
+
+def _sync(root, patches, synced):
+    '''Apply and commit the coordinator's patches, so git diff only shows our own work.'''
+    for patch in patches:
+        synced += 1
+        if not apply_patch(root, patch):
+            sys.stderr.write('Could not apply a patch from the coordinator.\n')
+            sys.exit(1)
+        _git(root, sync_author + ['commit', '-qam', 'const_fix: sync patch %d' % synced])
+    if patches:
+        # Sources changed without a build to prove them.
+        const_fix.forget_clean_build()
+
+def run_worker(address, root, name=None):
+    root = os.path.normpath(os.path.abspath(root))
+    host, port = address.rsplit(':', 1)
+    cg = const_fix.start_run(root)
+    const_fix._const_facts = facts = interproc.ConstFacts(cg)
+    sock = socket.create_connection((host, int(port)))
+    rfile = sock.makefile('rb')
+    wfile = sock.makefile('wb')
+    base, synced = sync_state(root)
+    send(wfile, {'type': 'hello', 'name': name or socket.gethostname(),
+        'base': base, 'synced': synced})
+    while True:
+        msg = receive(rfile)
+        if msg is None or msg['type'] == 'done':
+            break
+        if msg['type'] == 'error':
+            sys.stderr.write(msg['message'] + '\n')
+            sys.exit(1)
+        if msg['type'] == 'wait':
+            time.sleep(msg.get('secs', wait_secs))
+            send(wfile, {'type': 'ready'})
+            continue
+        _sync(root, msg['patches'], synced)
+        synced += len(msg['patches'])
+        facts.final.update(msg['final'])
+        func = msg['func']
+        print('\nExperimenting with changes to %s...' % func)
+        tags = msg['tags']
+        try:
+            with timing.attributed(func):
+                tags = const_fix.fix_func(func, root, cg, tags)
+        except (SystemExit, KeyboardInterrupt):
+            raise
+        except:
+            traceback.print_exc()
+            tags += 'EXCEPTION '
+        patch = _git(root, ['diff'])[1]
+        # Our change comes back to us as a sync patch, once it's accepted.
+        _git(root, ['reset', '-q', '--hard'])
+        if patch:
+            const_fix.forget_clean_build()
+        send(wfile, {'type': 'result', 'func': func, 'tags': tags, 'patch': patch,
+            'final': facts.final.get(bare_name(func))})
+    sock.close()
+    const_fix._run_store.flush()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Distribute const_fix experiments across hosts.')
+    sub = parser.add_subparsers(dest='mode')
+    p = sub.add_parser('coordinator', help='own the call graph and hand out work')
+    p.add_argument('root')
+    p.add_argument('--port', type=int, default=default_port)
+    p = sub.add_parser('worker', help='build and test functions handed out by a coordinator')
+    p.add_argument('address', help='HOST:PORT of the coordinator')
+    p.add_argument('root', help='this worker\'s own checkout')
+    p.add_argument('--name')
+    args = parser.parse_args(argv)
+    if args.mode == 'coordinator':
+        run_coordinator(args.root, args.port)
+    else:
+        run_worker(args.address, args.root, args.name)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+'''
+Typed records of what a run is doing, for programs that embed const_fix and
+want to react to results as they happen instead of parsing its output.
+
+Every event goes to each subscriber in turn, on the thread that emitted it.
+The console is just the first subscriber; remove print_event to silence it.
+'''
+
+class Event(object):
+    fields = ()
+    def __init__(self, *args):
+        for name, value in zip(self.fields, args):
+            setattr(self, name, value)
+    def as_dict(self):
+        d = dict([(name, getattr(self, name)) for name in self.fields])
+        d['event'] = self.__class__.__name__
+        return d
+    def __repr__(self):
+        return '%s(%s)' % (self.__class__.__name__,
+            ', '.join(['%s=%r' % (name, getattr(self, name)) for name in self.fields]))
+
+class RunStarted(Event):
+    fields = ('root', 'functions')
+
+class PassStarted(Event):
+    fields = ('number', 'leaves', 'functions')
+
+class FunctionStarted(Event):
+    '''classification is one of const_fix.classify_labels.'''
+    fields = ('pass_number', 'index', 'func', 'orphan', 'classification')
+
+class ExperimentStarted(Event):
+    '''params are the indexes of the params being made const together.'''
+    fields = ('func', 'params', 'signature')
+
+class ExperimentFinished(Event):
+    '''
+    The secs are None when the outcome came from an earlier run, or when
+    the tests were skipped.
+    '''
+    fields = ('func', 'params', 'signature', 'accepted', 'cached', 'compile_secs', 'test_secs')
+
+class CompileStarted(Event):
+    '''func is the function being changed, or None when proving the whole tree.'''
+    fields = ('func',)
+
+class CompileRetried(Event):
+    '''An incremental build failed, so part ('sources' or 'tests') is being cleaned and rebuilt.'''
+    fields = ('func', 'part')
+
+class CompileFinished(Event):
+    '''const_error is True when the build failed on func's own const change, so no clean build was tried.'''
+    fields = ('func', 'ok', 'const_error', 'log')
+
+class TestsStarted(Event):
+    '''targets is None when the whole suite runs.'''
+    fields = ('func', 'targets')
+
+class TestsSkipped(Event):
+    '''reason is 'no affected tests' or 'object code unchanged'.'''
+    fields = ('func', 'reason')
+
+class TestsFinished(Event):
+    fields = ('func', 'ok', 'log')
+
+class RollbackStarted(Event):
+    fields = ('func',)
+
+class RollbackFinished(Event):
+    '''
+    how the tree was proven clean again: 'restored' (sources and artifacts
+    put back), 'unchanged' (object code matches), 'rebuilt', or 'failed',
+    after which the run exits.
+    '''
+    fields = ('func', 'how')
+
+class ChangeKept(Event):
+    '''label is what the accepted-patch log calls the change.'''
+    fields = ('label',)
+
+class FunctionFinished(Event):
+    '''signature is the new prototype, or None if nothing changed.'''
+    fields = ('func', 'tags', 'signature')
+
+class RunFinished(Event):
+    fields = ('finished', 'elapsed')
+
+def print_event(event):
+    '''The console's view of a run.'''
+    if isinstance(event, PassStarted):
+        print('\nPass %d: %d leaves out of %d functions ----------------' % (event.number, event.leaves, event.functions))
+    elif isinstance(event, FunctionStarted):
+        label = '%d.%d.' % (event.pass_number, event.index)
+        if event.orphan:
+            print('\n%s %s appears to be an orphan, never called.' % (label, event.func))
+        if event.classification == 'CONST_MATTERS':
+            print('\n%s Experimenting with changes to %s...' % (label, event.func))
+        elif event.classification == 'OBNOXIOUS_CONST':
+            print('%s %s should not use const, but does.' % (label, event.func))
+        else:
+            print('%s Constness is not relevant to %s.' % (label, event.func))
+    elif isinstance(event, ExperimentStarted):
+        if len(event.params) > 1:
+            print('Trying %d params at once: %s...' % (len(event.params), event.signature))
+        else:
+            print('Trying %s...' % event.signature)
+
+    elif isinstance(event, CompileStarted):
+        print('Compiling...')
+    elif isinstance(event, CompileRetried):
+        if event.part == 'sources':
+            print('  Incremental compile failed. Trying to clean.')
+        else:
+            print('  Trying to clean and then compile tests.')
+    elif isinstance(event, CompileFinished):
+        if event.ok:
+            print('  Compile succeeded.')
+        elif event.const_error:
+            print('  Compile failed due to const error.')
+        else:
+            print('  Clean compile failed. See %s for details.' % event.log)
+    elif isinstance(event, TestsStarted):
+        print('Testing...')
+    elif isinstance(event, TestsSkipped):
+        if event.reason == 'object code unchanged':
+            print('  Object code is unchanged; skipping tests.')
+        else:
+            print('  No tests are affected by this change.')
+    elif isinstance(event, TestsFinished):
+        if event.ok:
+            print('  Tests pass.')
+        else:
+            print('  Tests failed. See %s for details.' % event.log)
+    elif isinstance(event, RollbackStarted):
+        print("  Change doesn't work. Backing it out.")
+    elif isinstance(event, RollbackFinished):
+        if event.how == 'restored':
+            print('  Sources and build artifacts restored to the last clean build; no need to re-verify.')
+        elif event.how == 'unchanged':
+            print('  Object code matches the last clean build; no need to re-verify.')
+        elif event.how == 'failed':
+            print('Unable to get back to a clean state; exiting prematurely.')
+    elif isinstance(event, ChangeKept):
+        print('  It works. Keeping change.')
+
+subscribers = [print_event]
+
+def subscribe(callback):
+    subscribers.append(callback)
+
+def unsubscribe(callback):
+    subscribers.remove(callback)
+
+def emit(event):
+    for callback in list(subscribers):
+        callback(event)
@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+'''
+A stand-in for make, scons and g++ when benchmarking against a tree from
+synthcode.py. It understands just enough C to notice when a const param is
+written to, aliased by a non-const pointer, or passed to a non-const param,
+and reports those the way g++ does, so const_fix parses the diagnostics
+exactly as it would in a real build.
+
+    fakecc.py compile ROOT        build ROOT/src into ROOT/build/*.o
+    fakecc.py compile-tests ROOT  pretend to build the tests
+    fakecc.py test ROOT [TARGET...]
+    fakecc.py clean ROOT
+
+FAKECC_TU_SECS and FAKECC_TEST_SECS say how long each translation unit or
+test target should appear to take.
+'''
+import os, re, sys, time, hashlib
+
+tu_secs = float(os.environ.get('FAKECC_TU_SECS', '0.02'))
+test_secs = float(os.environ.get('FAKECC_TEST_SECS', '0.05'))
+max_errors = 5
+
+_comment_pat = re.compile(r'//[^\n]*|/\*.*?\*/', re.DOTALL)
+_def_pat = re.compile(r'^int\s+(\w+)\s*\(([^)]*)\)\s*\{', re.MULTILINE)
+_call_pat = re.compile(r'\b(\w+)\s*\(([^;]*?)\)\s*;')
+
+def _strip_comments(txt):
+    # Keep newlines, so line numbers in diagnostics stay right.
+    return _comment_pat.sub(lambda m: re.sub(r'[^\n]', ' ', m.group(0)), txt)
+
+def _split_param(decl):
+    decl = decl.strip()
+    m = re.search(r'(\w+)$', decl)
+    if not m or m.start() == 0:
+        return decl, ''
+    return decl[:m.start()].strip(), m.group(1)
+
+def _compact(typ):
+    '''Write a type the way g++ does in diagnostics: const T*'''
+    base = ' '.join([w for w in re.findall(r'\w+', typ) if w != 'const'])
+    return ('const ' if 'const' in typ else '') + base + '*' * typ.count('*')
+
+def parse_functions(txt):
+    '''Return a list of (name, [(type, name), ...], body start, body end).'''
+    funcs = []
+    for m in _def_pat.finditer(txt):
+        params = [_split_param(p) for p in m.group(2).split(',') if p.strip()]
+        end = txt.find('\n}', m.end())
+        if end == -1:
+            end = len(txt)
+        funcs.append((m.group(1), params, m.end(), end))
+    return funcs
+
+def _line_of(txt, offset):
+    return txt.count('\n', 0, offset) + 1
+
+def check_const(fname, txt, signatures):
+    '''Return a list of g++-style diagnostics for misuse of const params.'''
+    errors = []
+    for name, params, start, end in parse_functions(txt):
+        body = txt[start:end]
+        header = '%s: In function ‘int %s(%s)’:' % (fname, name,
+            ', '.join([_compact(typ) for typ, pname in params]))
+        found = []
+        for typ, pname in params:
+            if 'const' not in typ or '*' not in typ or not pname:
+                continue
+            plain = _compact(typ)[len('const '):]
+            for m in re.finditer(r'\b%s\s*->\s*(\w+)\s*(?:[-+*/|&]?=(?!=)|\+\+|--)' % pname, body):
+                found.append((start + m.start(), 'assignment of member ‘%s’ in read-only object' % m.group(1)))
+            for m in re.finditer(r'\b%s\s*\[[^\]]*\]\s*=(?!=)' % pname, body):
+                found.append((start + m.start(), 'assignment of read-only location ‘*%s’' % pname))
+            for m in re.finditer(r'([A-Za-z_][\w ]*?)\s*\*\s*\w+\s*=\s*%s\s*;' % pname, body):
+                if 'const' not in m.group(1) and m.group(1).strip() not in ('return',):
+                    found.append((start + m.start(), 'invalid conversion from ‘const %s’ to ‘%s’ [-fpermissive]' % (plain, plain)))
+            for m in _call_pat.finditer(body):
+                callee = signatures.get(m.group(1))
+                if not callee:
+                    continue
+                args = [a.strip() for a in m.group(2).split(',')]
+                for i, arg in enumerate(args):
+                    if arg == pname and i < len(callee):
+                        target = callee[i][0]
+                        if '*' in target and 'const' not in target:
+                            found.append((start + m.start(2), 'invalid conversion from ‘const %s’ to ‘%s’ [-fpermissive]' % (plain, _compact(target))))
+        if found:
+            errors.append(header)
+            for offset, msg in sorted(found):
+                errors.append('%s:%d:5: error: %s' % (fname, _line_of(txt, offset), msg))
+    return errors
+
+def object_code(txt):
+    '''
+    What the "compiler" emits for a TU. const and comments don't affect code
+    generation, so a const-only change produces an identical object.
+    '''
+    txt = _strip_comments(txt)
+    txt = re.sub(r'\bconst\b', '', txt)
+    txt = ' '.join(txt.split())
+    return 'FAKEOBJ %s\n' % hashlib.sha1(txt.encode('utf-8')).hexdigest()
+
+def _sources(root):
+    folder = os.path.join(root, 'src')
+    return sorted([os.path.join(folder, f) for f in os.listdir(folder) if f.endswith('.c')])
+
+def _newest_header(root):
+    folder = os.path.join(root, 'include')
+    mtimes = [os.path.getmtime(os.path.join(folder, f)) for f in os.listdir(folder) if f.endswith('.h')]
+    return max(mtimes or [0])
+
+def compile_tree(root):
+    build = os.path.join(root, 'build')
+    if not os.path.isdir(build):
+        os.makedirs(build)
+    texts = {}
+    signatures = {}
+    for fpath in _sources(root):
+        with open(fpath, 'r') as f:
+            texts[fpath] = _strip_comments(f.read())
+        for name, params, start, end in parse_functions(texts[fpath]):
+            signatures[name] = params
+    newest_header = _newest_header(root)
+    errors = []
+    for fpath in _sources(root):
+        obj = os.path.join(build, os.path.basename(fpath)[:-2] + '.o')
+        if os.path.isfile(obj):
+            built = os.path.getmtime(obj)
+            if built >= os.path.getmtime(fpath) and built >= newest_header:
+                continue
+        rel = os.path.relpath(fpath, root)
+        print('g++ -c %s' % rel)
+        sys.stdout.flush()
+        time.sleep(tu_secs)
+        these = check_const(rel, texts[fpath], signatures)
+        if these:
+            errors.extend(these)
+            if os.path.isfile(obj):
+                os.remove(obj)
+            continue
+        with open(obj, 'w') as f:
+            f.write(object_code(texts[fpath]))
+    if errors:
+        print('\n'.join(errors[:max_errors * 2]))
+        print('make: *** [all] Error 1')
+        return 2
+    return 0
+
+def run_tests(root, targets):
+    test_root = os.path.join(root, 'test')
+    if not targets:
+        targets = sorted([d for d in os.listdir(test_root) if os.path.isdir(os.path.join(test_root, d))])
+    for target in targets:
+        print('Running %s...' % target)
+        sys.stdout.flush()
+        time.sleep(test_secs)
+    print('%d test targets passed.' % len(targets))
+    return 0
+
+def clean(root):
+    build = os.path.join(root, 'build')
+    if os.path.isdir(build):
+        for f in os.listdir(build):
+            os.remove(os.path.join(build, f))
+    return 0
+
+def main(argv):
+    if len(argv) < 3:
+        sys.stderr.write(__doc__)
+        return 1
+    cmd, root = argv[1], argv[2]
+    if cmd == 'compile':
+        return compile_tree(root)
+    if cmd == 'compile-tests':
+        time.sleep(tu_secs)
+        return 0
+    if cmd == 'test':
+        return run_tests(root, argv[3:])
+    if cmd == 'clean':
+        return clean(root)
+    sys.stderr.write('Unknown command %s.\n' % cmd)
+    return 1
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
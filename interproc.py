@@ -0,0 +1,51 @@
+from testimpact import bare_name
+
+class ConstFacts:
+    '''
+    Carry what we learn about each function's params up the call graph.
+
+    fix_prototypes works bottom-up, so by the time we get to a caller, its
+    callees have been finalized: each of their pointer params either became
+    const or stayed non-const. A caller that forwards its own param to a
+    callee param that stayed non-const can't make that param const either,
+    and a caller whose params only flow into const callee params is very
+    likely to succeed, so those params can be tried together in one build.
+    '''
+    def __init__(self, cg):
+        self.cg = cg
+        # bare function name --> param types after we finished with it
+        self.final = {}
+    def finalize(self, func, params):
+        self.final[bare_name(func)] = [p.data_type for p in params]
+    def callee_params(self, name):
+        '''
+        Return the current param types of a function we might pass a param
+        to. Finalized functions are authoritative. Functions still in the
+        call graph haven't been changed yet, so doxygen's view of them is
+        current. Anything else is unknown.
+        '''
+        if name in self.final:
+            return self.final[name]
+        return self.cg.get_params(name + '()')
+    def classify(self, func, impl):
+        '''
+        Pre-classify impl's params without building. Return a dict of param
+        index --> reason for params that can't be const, and a list of the
+        candidate params that are safe to try together in a single batch.
+        '''
+        # param index --> [(callee, arg index), ...]
+        forwards = {}
+        cant_be_const = impl.find_params_that_cant_be_const(self.callee_params, forwards)
+        batchable = []
+        for idx, param in enumerate(impl.params):
+            if idx in cant_be_const or not param.is_const_candidate() or param.is_const():
+                continue
+            known = True
+            for callee, arg_idx in forwards.get(idx, []):
+                params = self.callee_params(callee)
+                if not params or arg_idx >= len(params) or 'const' not in params[arg_idx]:
+                    known = False
+                    break
+            if known:
+                batchable.append(idx)
+        return cant_be_const, batchable
@@ -0,0 +1,89 @@
+import os, time
+
+prefix = 'const_fix_'
+# Seconds between rewrites of the metrics file.
+write_interval = 15
+
+# name --> (type, help text)
+_declared = {
+    'functions_remaining': ('gauge', 'Functions still in the call graph.'),
+    'functions_finished_total': ('counter', 'Functions finished in this run.'),
+    'experiments_attempted_total': ('counter', 'Const changes tried, whether built or answered from cache.'),
+    'experiments_accepted_total': ('counter', 'Const changes that were kept.'),
+    'experiments_rejected_total': ('counter', 'Const changes that were backed out.'),
+    'builds_avoided_total': ('counter', 'Builds skipped, by reason.'),
+    'compile_seconds_average': ('gauge', 'Average seconds per experiment build.'),
+    'test_seconds_average': ('gauge', 'Average seconds per experiment test run.'),
+    'eta_seconds': ('gauge', 'Projected seconds until every function is finished.'),
+    'last_update_timestamp_seconds': ('gauge', 'When this file was written.'),
+}
+# (name, ((label, value), ...)) --> value
+_values = {}
+# name --> (total, count), for gauges that hold a running average
+_sums = {}
+_fpath = None
+_last_write = 0
+
+def _key(name, labels):
+    if name not in _declared:
+        raise KeyError('Undeclared metric %s.' % name)
+    return (name, tuple(sorted(labels.items())))
+
+def inc(name, amount=1, **labels):
+    key = _key(name, labels)
+    _values[key] = _values.get(key, 0) + amount
+
+def set_gauge(name, value, **labels):
+    _values[_key(name, labels)] = value
+
+def observe(name, value):
+    '''Fold value into a gauge that holds the running average.'''
+    total, count = _sums.get(name, (0.0, 0))
+    _sums[name] = (total + value, count + 1)
+    set_gauge(name, _sums[name][0] / _sums[name][1])
+
+def get(name, **labels):
+    return _values.get(_key(name, labels), 0)
+
+def render():
+    '''Return every metric in Prometheus text exposition format.'''
+    lines = []
+    for name in sorted(_declared):
+        samples = sorted([(labels, value) for (n, labels), value in _values.items() if n == name])
+        if not samples:
+            continue
+        kind, help = _declared[name]
+        lines.append('# HELP %s%s %s' % (prefix, name, help))
+        lines.append('# TYPE %s%s %s' % (prefix, name, kind))
+        for labels, value in samples:
+            label_txt = ''
+            if labels:
+                label_txt = '{%s}' % ','.join(['%s="%s"' % pair for pair in labels])
+            lines.append('%s%s%s %s' % (prefix, name, label_txt, repr(float(value))))
+    return '\n'.join(lines) + '\n'
+
+def start(fpath):
+    '''Begin writing metrics to fpath, which should end in .prom for node_exporter.'''
+    global _fpath
+    _fpath = fpath
+    write()
+
+def write():
+    '''
+    Rewrite the metrics file. It's written to a temp file and renamed into
+    place, so a scraper never sees half of it.
+    '''
+    global _last_write
+    if not _fpath:
+        return
+    _last_write = time.time()
+    set_gauge('last_update_timestamp_seconds', _last_write)
+    tmp = _fpath + '.tmp'
+    with open(tmp, 'w') as f:
+        f.write(render())
+    os.rename(tmp, _fpath)
+
+def maybe_write():
+    '''Call this often; it only writes every write_interval seconds.'''
+    if _fpath and time.time() - _last_write >= write_interval:
+        write()
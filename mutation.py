@@ -0,0 +1,251 @@
+import re
+
+_token_pat = re.compile(r'''
+    (?P<space>\s+)
+  | (?P<comment>//[^\n]*|/\*.*?\*/)
+  | (?P<literal>"(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')
+  | (?P<word>[A-Za-z_0-9]+)
+  | (?P<op><<=|>>=|->|\+\+|--|::|&&|\|\||<<|>>|[-+*/%&|^!=<>]=|.)
+''', re.DOTALL | re.VERBOSE)
+
+assign_ops = set(['=', '+=', '-=', '*=', '/=', '%=', '&=', '|=', '^=', '<<=', '>>='])
+incdec_ops = set(['++', '--'])
+not_calls = set(['if', 'while', 'for', 'switch', 'return', 'sizeof', 'catch'])
+cpp_casts = set(['const_cast', 'static_cast', 'reinterpret_cast', 'dynamic_cast'])
+
+# Common libc functions that write through a pointer argument. Types are
+# written the way doxygen reports them, so they can be looked up the same
+# way as the ones in the call graph.
+libc_params = {
+    'strcpy': ['char *', 'const char *'],
+    'strncpy': ['char *', 'const char *', 'size_t'],
+    'strcat': ['char *', 'const char *'],
+    'strncat': ['char *', 'const char *', 'size_t'],
+    'memset': ['void *', 'int', 'size_t'],
+    'memcpy': ['void *', 'const void *', 'size_t'],
+    'memmove': ['void *', 'const void *', 'size_t'],
+    'sprintf': ['char *', 'const char *'],
+    'snprintf': ['char *', 'size_t', 'const char *'],
+    'fgets': ['char *', 'int', 'FILE *'],
+    'strtok': ['char *', 'const char *'],
+    'free': ['void *'],
+}
+
+def tokenize(txt, start=0, end=None):
+    '''
+    Split C/C++ source into tokens, dropping whitespace, comments and
+    preprocessor lines. String and char literals become a single '""' token
+    so nothing inside them is mistaken for code.
+    '''
+    if end is None:
+        end = len(txt)
+    tokens = []
+    i = start
+    at_line_start = True
+    while i < end:
+        m = _token_pat.match(txt, i, end)
+        kind = m.lastgroup
+        i = m.end()
+        if kind == 'space':
+            if '\n' in m.group():
+                at_line_start = True
+            continue
+        if kind == 'comment':
+            continue
+        if kind == 'op' and m.group() == '#' and at_line_start:
+            j = txt.find('\n', i, end)
+            while j > -1 and txt[j - 1] == '\\':
+                j = txt.find('\n', j + 1, end)
+            i = end if j == -1 else j
+            continue
+        at_line_start = False
+        if kind == 'literal':
+            tokens.append('""')
+        else:
+            tokens.append(m.group())
+    return tokens
+
+def _is_operand_end(tok):
+    '''Could tok be the last token of an expression, making a following * or & binary?'''
+    return tok[0].isalnum() or tok[0] == '_' or tok in (')', ']', '""')
+
+def _is_unary(tokens, k):
+    '''Is the operator at tokens[k] a prefix (unary) operator?'''
+    if k == 0:
+        return True
+    if tokens[k - 1] in incdec_ops:
+        # i++ * p ends an operand; x = ++*p doesn't.
+        return _is_unary(tokens, k - 1)
+    return not _is_operand_end(tokens[k - 1]) or tokens[k - 1] == 'return'
+
+def _skip_brackets(tokens, j, opener, closer):
+    '''tokens[j] is opener; return the index just past its matching closer.'''
+    depth = 0
+    while j < len(tokens):
+        if tokens[j] == opener:
+            depth += 1
+        elif tokens[j] == closer:
+            depth -= 1
+            if depth == 0:
+                return j + 1
+        j += 1
+    return j
+
+def _find_open_paren(tokens, k):
+    '''
+    Walk backward from tokens[k] to the ( that encloses it. Return that index
+    and which argument (0-based) tokens[k] is in, or (-1, -1).
+    '''
+    depth = 0
+    arg_idx = 0
+    j = k - 1
+    while j >= 0:
+        tok = tokens[j]
+        if tok in (')', ']'):
+            depth += 1
+        elif tok in ('(', '['):
+            if depth == 0:
+                if tok == '(':
+                    return j, arg_idx
+                return -1, -1
+            depth -= 1
+        elif tok == ',' and depth == 0:
+            arg_idx += 1
+        elif tok in (';', '{', '}'):
+            return -1, -1
+        j -= 1
+    return -1, -1
+
+def _is_nonconst_indirection(typ):
+    return typ and ('*' in typ or '&' in typ) and 'const' not in typ
+
+def _type_tokens_drop_const(tokens):
+    '''Do tokens spell a pointer or reference type without const?'''
+    if not tokens or tokens[-1] not in ('*', '&') or 'const' in tokens:
+        return False
+    for tok in tokens:
+        if not (tok[0].isalpha() or tok[0] == '_' or tok in ('*', '&', '::')):
+            return False
+    return True
+
+def _check_use(tokens, k, pivot, return_type, callee_params):
+    '''
+    tokens[k] is a use of a pointer (pivot '*') or reference (pivot '&')
+    parameter. Return a reason why the use rules out making the parameter
+    point to (or refer to) const, or None.
+    '''
+    n = len(tokens)
+    prev = tokens[k - 1] if k > 0 else ''
+    nxt = tokens[k + 1] if k + 1 < n else ''
+    # Write through the param: p->x = ..., p[i]++, ++p->x, r = ..., r.x += ...
+    j = None
+    if pivot == '*' and nxt == '->':
+        j = k + 3
+        written = 'member assigned'
+    elif pivot == '*' and nxt == '[':
+        j = _skip_brackets(tokens, k + 1, '[', ']')
+        written = 'assigned through array index'
+    elif pivot == '&':
+        j = k + 1
+        written = 'assigned'
+    if j is not None:
+        # Only . keeps us inside the pointee; another -> or [ might go through
+        # a pointer member, which the param's const doesn't cover.
+        while j + 1 < n and tokens[j] == '.':
+            j += 2
+        if j < n and tokens[j] not in ('->', '[', '('):
+            if tokens[j] in assign_ops or tokens[j] in incdec_ops or prev in incdec_ops:
+                return written
+    # Write through a dereference: *p = ..., ++*p, *p++ = ...
+    if pivot == '*' and prev == '*' and _is_unary(tokens, k - 1):
+        if nxt in assign_ops:
+            return 'assigned through dereference'
+        if k >= 2 and tokens[k - 2] in incdec_ops:
+            return 'assigned through dereference'
+        if nxt in incdec_ops and k + 2 < n and tokens[k + 2] in assign_ops:
+            return 'assigned through dereference'
+    # Address taken: &p
+    if prev == '&' and _is_unary(tokens, k - 1) and nxt not in ('->', '.', '['):
+        return 'address taken'
+    # C-style cast that drops const: (mjob_t *)p
+    if prev == ')':
+        i = k - 2
+        while i >= 0 and tokens[i] != '(':
+            i -= 1
+        if i >= 0 and _type_tokens_drop_const(tokens[i + 1:k - 1]):
+            return 'cast to non-const'
+    # C++ cast that drops const: static_cast<mjob_t *>(p)
+    if prev == '(' and nxt == ')' and k >= 2 and tokens[k - 2] == '>':
+        i = k - 3
+        while i >= 0 and tokens[i] != '<':
+            i -= 1
+        if i >= 1 and tokens[i - 1] in cpp_casts and _type_tokens_drop_const(tokens[i + 1:k - 2]):
+            return 'cast to non-const'
+    # Returned as non-const: return p;
+    if prev == 'return' and nxt == ';' and _is_nonconst_indirection(return_type):
+        return 'returned as non-const'
+    # Passed to a non-const pointer or reference param: Foo(x, p)
+    target = find_call_target(tokens, k)
+    if target and callee_params:
+        params = callee_params(target[0])
+        if params and target[1] < len(params) and _is_nonconst_indirection(params[target[1]]):
+            return 'passed to non-const param %d of %s' % (target[1] + 1, target[0])
+    return None
+
+def find_call_target(tokens, k):
+    '''
+    If tokens[k] is passed, by itself, as an argument to a function call,
+    return (function name, argument index); otherwise return None.
+    '''
+    if k == 0 or k + 1 >= len(tokens):
+        return None
+    if tokens[k - 1] not in ('(', ',') or tokens[k + 1] not in (',', ')'):
+        return None
+    open_idx, arg_idx = _find_open_paren(tokens, k)
+    if open_idx > 0:
+        callee = tokens[open_idx - 1]
+        if (callee[0].isalpha() or callee[0] == '_') and callee not in not_calls:
+            return callee, arg_idx
+    return None
+
+def find_disqualified_params(txt, start, end, params, return_type='', callee_params=None, forwards=None):
+    '''
+    Scan a function body once, and return a dict of param index --> reason
+    for every pointer or reference param whose use proves it can't be made
+    const. Params that aren't in the dict might still fail to compile as
+    const; this only catches the common, certain cases.
+
+    callee_params(name) should return the param types of a function we might
+    pass a param to, or None if they aren't known. If forwards is a dict, it
+    is filled with param index --> list of (callee, arg index) for every
+    call the param is passed to.
+    '''
+    watched = {}
+    for idx, param in enumerate(params):
+        name = param.new_name or param.name
+        pivot = param.get_pivot_point()
+        if name and pivot is not None:
+            watched[name] = (idx, param.data_type[pivot])
+    if not watched:
+        return {}
+    def lookup(name):
+        found = None
+        if callee_params:
+            found = callee_params(name)
+        if found is None:
+            found = libc_params.get(name)
+        return found
+    tokens = tokenize(txt, start, end)
+    reasons = {}
+    for k, tok in enumerate(tokens):
+        if tok in watched and (k == 0 or tokens[k - 1] not in ('.', '->', '::')):
+            idx, pivot = watched[tok]
+            if forwards is not None:
+                target = find_call_target(tokens, k)
+                if target:
+                    forwards.setdefault(idx, []).append(target)
+            if idx not in reasons:
+                reason = _check_use(tokens, k, pivot, return_type, lookup)
+                if reason:
+                    reasons[idx] = reason
+    return reasons
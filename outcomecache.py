@@ -0,0 +1,68 @@
+import os, hashlib, subprocess
+
+ACCEPTED = 'ACCEPTED'
+REJECTED = 'REJECTED'
+
+compiler_version_cmd = ['cc', '--version']
+
+def _sha1(txt):
+    if not isinstance(txt, bytes):
+        txt = txt.encode('utf-8')
+    return hashlib.sha1(txt).hexdigest()
+
+def toolchain_fingerprint(root, cmds):
+    '''
+    Hash everything outside the function itself that decides whether an
+    experiment builds and passes: the commands we run, the compiler's
+    version, and the top-level Makefile (which holds the flags).
+    '''
+    parts = list(cmds)
+    try:
+        p = subprocess.Popen(compiler_version_cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        parts.append(p.communicate()[0].decode('utf-8', 'replace'))
+    except OSError:
+        parts.append('no compiler')
+    makefile = os.path.join(root, 'Makefile')
+    if os.path.isfile(makefile):
+        with open(makefile, 'r') as f:
+            parts.append(f.read())
+    return _sha1('\n'.join(parts))
+
+def experiment_key(func, param_idx, impl, prototypes, toolchain):
+    '''
+    Build a key that changes whenever anything that could change the outcome
+    of an experiment changes: the impl's body, the text of every prototype,
+    or the toolchain. The param index (or indexes, joined with +, for a
+    batch) plus the prototypes' text determine exactly which edit is being
+    tried.
+    '''
+    body = ''
+    if impl.start_of_body:
+        body = impl.txt[impl.start_of_body:impl.end_of_body]
+    protos = []
+    for fpath in sorted(prototypes.keys()):
+        for proto in prototypes[fpath]:
+            protos.append(proto.original)
+    return '%s:%s:%s:%s:%s' % (func, param_idx, _sha1(body), _sha1('\n'.join(protos)), toolchain)
+
+class ExperimentCache:
+    '''
+    Remember the outcome of every experiment we've run, keyed by content
+    rather than by function name, so a re-run on a later revision only
+    rebuilds experiments whose inputs actually changed.
+    '''
+    def __init__(self, fpath):
+        self.fpath = fpath
+        self.outcomes = {}
+        if os.path.isfile(fpath):
+            with open(fpath, 'r') as f:
+                for line in f:
+                    fields = line.rstrip('\n').split('\t')
+                    if len(fields) == 2:
+                        self.outcomes[fields[0]] = fields[1]
+    def lookup(self, key):
+        return self.outcomes.get(key)
+    def record(self, key, outcome):
+        self.outcomes[key] = outcome
+        with open(self.fpath, 'a') as f:
+            f.write('%s\t%s\n' % (key, outcome))
@@ -1,7 +1,8 @@
 import re
 
+import typecanon
+
 array_spec_pat = re.compile('.*(\[^]]\])$')
-const_prefix_pat = re.compile('^const ([a-zA-Z0-9_]+)(.*)$')
 moab_type_pat = re.compile('.*\Wm[a-z_0-9]+_t$')
 datatype_names = 'int|short|long|double|float|char|bool'.split('|')
 moab_struct_naming_pat = re.compile(r'm([a-z_]+)_t(?=$|\W)')
@@ -36,10 +37,6 @@ abbreviatable = {
     'class': 'cls'
 }
     
-def _squeeze(txt):
-    '''Replace all runs of whitepace with a single space, and trim front and back.'''
-    return re.sub(r'\s{2,}', ' ', txt).strip()
-    
 def normalize_type(typ):
     '''
     Put the type portion of a parameter declaration into normalized
@@ -47,22 +44,48 @@ def normalize_type(typ):
     
       const char* --> char const *
       mjob_t  & --> mjob_t &
+
+    Results are memoized; see typecanon.
     '''
-    typ = _squeeze(typ.replace('*', ' * ').replace('&', ' & ')).replace('* *', '**')
-    m = const_prefix_pat.match(typ)
-    if m:
-        typ = '%s const%s' % (m.group(1), m.group(2))
-    return typ
+    return typecanon.normalize(typ)
 
-class Param:
+# CType --> whether a param of that type is worth trying as const, ignoring its name
+_candidate_types = {}
+
+def _is_candidate_type(ctype):
+    answer = _candidate_types.get(ctype)
+    if answer is None:
+        # Params that are not pointers or references are passed by value,
+        # so their constness is irrelevant. Params that are *& or ** are
+        # virtually guaranteed to be OUT params, so their constness should
+        # not be adjusted. It's also common in the codebase to see pointers
+        # to numeric types passed for OUT params: int * size, long * count,
+        # etc. These are also not worth checking.
+        answer = not ('void' in ctype.text or
+            (not ctype.pointers and not ctype.reference) or
+            (ctype.pointers and ctype.reference) or
+            ctype.pointers > 1 or
+            (ctype.pointers and moab_common_out_pat.match(ctype.text)))
+        _candidate_types[ctype] = answer
+    return answer
+
+class Param(object):
     def __init__(self, begin, decl):
         self.begin = begin
         self.decl = decl
         self.array_spec = ''
-        self.data_type = None
+        self.ctype = None
         self.name = None
         self.new_name = None
         self._parse()
+
+    @property
+    def data_type(self):
+        return self.ctype.text
+
+    @data_type.setter
+    def data_type(self, value):
+        self.ctype = typecanon.intern(value)
         
     def propose_name(self):
         m = moab_struct_naming_pat.match(self.data_type)
@@ -95,58 +118,39 @@ class Param:
             return proposed
 
     def is_const_candidate(self):
-        dt = self.data_type
-        if 'void' in dt:
+        # EMsg bufs are passed around to accumulate error messages; we
+        # know they are modified.
+        if self.name == 'EMsg' and self.ctype.text == 'char *':
             return False
-        i = dt.find('*')
-        j = dt.find('&')
-        # Params that are not pointers or references are passed by value,
-        # so their constness is irrelevant.
-        if i == -1 and j == -1:
-            return False
-        # Just some optimizations that applies to moab specifically.
-        # 1. EMsg bufs are passed around to accumulate error messages; we
-        #    know they are modified.
-        # 2. It's common in the codebase to see pointers to numeric types
-        #    passed for OUT params: int * size, long * count, etc. These
-        #    are also not worth checking.
-        if i > -1 and self.data_type == 'char *' and self.name == 'EMsg':
-            return False
-        if i > -1 and moab_common_out_pat.match(self.data_type):
-            return False
-        # Params that are *& are virtually guaranteed to be OUT params,
-        # so their constness should not be adjusted.
-        if i > -1 and j > -1:
-            return False
-        # Same for **.
-        if i > -1 and i < dt.rfind('*'): 
-            return False
-        
-        return True
+        return _is_candidate_type(self.ctype)
 
     def is_const(self):
         return 'const' in self.decl
 
+    def has_top_level_const(self):
+        # Only true of params passed by value. Such a const constrains the
+        # definition's body, but isn't part of the function's type.
+        ctype = self.ctype
+        return 'const' in ctype.qualifiers and not ctype.pointers and not ctype.reference and '[' not in self.decl
+
+    def signature_type(self):
+        '''Return the param's type as far as the function's type is concerned.'''
+        if self.has_top_level_const():
+            return self.ctype.without_const()
+        return self.ctype
+
     def get_pivot_point(self):
-        i = self.data_type.find('*')
-        j = self.data_type.find('&')
-        if i > -1:
-            if j > -1:
-                return min(i, j)
-            return i
-        elif j > -1:
-            return j
+        return self.ctype.pivot
         
     def set_const(self, value):
-        i = self.get_pivot_point()
         if value:
             if not self.is_const():
-                self.data_type = _squeeze(self.data_type[:i].rstrip() + ' const ' + self.data_type[i:])
+                self.ctype = self.ctype.with_const()
         elif self.is_const():
-            self.data_type = _squeeze(self.data_type.replace('const', ''))
+            self.ctype = self.ctype.without_const()
 
     def _parse(self):
-        decl = _squeeze(self.decl)
+        decl = typecanon.squeeze(self.decl)
         m = array_spec_pat.match(decl)
         if m:
             self.array_spec = m.group(1).replace(' ', '')
@@ -171,7 +175,6 @@ class Param:
             self.name = decl[name_idx:]
         else:
             self.data_type = decl
-        self.data_type = normalize_type(self.data_type)
 
     def __str__(self):
         name = self.new_name
@@ -1,5 +1,6 @@
 import os, sys, re
 
+import mutation, timing
 from param import Param
 
 _label_not_proto_pat = re.compile(r':[ \t\r]*\n')
@@ -187,41 +188,26 @@ class Prototype:
     def matches(self, other):
         if len(self.params) == len(other.params):
             for i in xrange(len(self.params)):
-                type_a = self.params[i].data_type
-                type_b = other.params[i].data_type
-                if type_a != type_b:
+                # Types are interned, so equal types are the same object.
+                if self.params[i].signature_type() is not other.params[i].signature_type():
                     return False
             return True
         return False
     
-    def prove_param_cant_be_const(self, param_idx):
-        if self.start_of_body:
-            if len(self.params) > param_idx:
-                param = self.params[param_idx]
-                name = param.new_name
-                if not name:
-                    name = param.name
-                if name:
-                    i = param.get_pivot_point()
-                    if i > -1:
-                        pivot = param.data_type[i]
-                        if pivot == '*':
-                            operator = '->'
-                        else:
-                            assert pivot == '&'
-                            operator = r'\.'
-                        pat = re.compile(r'[^a-zA-Z0-9_]%s%s[a-zA-Z0-9_]+\s*(\+[+=]|-[-=]|=(?!=))' % (name, operator))
-                        if pat.search(self.txt, self.start_of_body, self.end_of_body):
-                            return True
-                        if pivot == '*':
-                            pat = re.compile(r'\*%s\s*(\+[+=]|-[-=]|=(?!=))' % name)
-                            if pat.search(self.txt, self.start_of_body, self.end_of_body):
-                                return True
-                        else:
-                            pat = re.compile(r'[^a-zA-Z0-9_]%s\s*(\+[+=]|-[-=]|=(?!=))' % name)
-                            if pat.search(self.txt, self.start_of_body, self.end_of_body):
-                                return True
-        return False
+    def find_params_that_cant_be_const(self, callee_params=None, forwards=None):
+        '''
+        Analyze the body once, and return a dict of param index --> reason for
+        each param that is used in a way that rules out const. See
+        mutation.find_disqualified_params for what callee_params and forwards
+        mean.
+        '''
+        if not self.start_of_body:
+            return {}
+        return mutation.find_disqualified_params(self.txt, self.start_of_body, self.end_of_body,
+            self.params, self.return_type, callee_params, forwards)
+
+    def prove_param_cant_be_const(self, param_idx, callee_params=None):
+        return param_idx in self.find_params_that_cant_be_const(callee_params)
     
 def adjust_match_if_true_prototype(txt, m):
     # There's no good way, with regex, to tolerate comments and string literals inside a
@@ -277,6 +263,9 @@ def adjust_match_if_true_prototype(txt, m):
 def find_prototypes_in_file(func, fpath):
     with open(fpath, 'r') as f:
         txt = f.read()
+    return find_prototypes_in_text(func, fpath, txt)
+
+def find_prototypes_in_text(func, fpath, txt):
     i = func.find('(')
     if i > -1:
         func = func[:i]
@@ -299,22 +288,26 @@ def find_prototypes_in_file(func, fpath):
                 protos.append(Prototype(fpath, txt, m))
     return protos
 
+def _iter_source_files(root):
+    for root, dirs, files in os.walk(root):
+        skip = [d for d in dirs if d.startswith('.')]
+        for d in skip:
+            dirs.remove(d)
+        for f in files:
+            if (not f.startswith('.')) and (f.endswith('.h') or f.endswith('.c') or f.endswith('.cpp')):
+                yield os.path.join(root, f)
+
+@timing.timed('prototype scan')
 def find_prototypes_in_codebase(func, root, files=None):
     prototypes = PrototypeMap()
     if files:
         for f in files:
             prototypes[fpath] = find_prototypes_in_file(f)
     else:
-        for root, dirs, files in os.walk(root):
-            skip = [d for d in dirs if d.startswith('.')]
-            for d in skip:
-                dirs.remove(d)
-            for f in files:
-                if (not f.startswith('.')) and (f.endswith('.h') or f.endswith('.c') or f.endswith('.cpp')):
-                    fpath = os.path.join(root, f)
-                    in_this_file = find_prototypes_in_file(func, fpath)
-                    if in_this_file:
-                        prototypes[fpath] = in_this_file
+        for fpath in _iter_source_files(root):
+            in_this_file = find_prototypes_in_file(func, fpath)
+            if in_this_file:
+                prototypes[fpath] = in_this_file
     if prototypes:
         count = len(prototypes)
         print('  Found %d %s.' % (count, _pluralize('prototype', count)))
@@ -382,3 +375,54 @@ class PrototypeMap(dict):
         for protos in self.values():
             for p in protos:
                 return p
+
+_word_pat = re.compile(r'[A-Za-z_][A-Za-z0-9_]*')
+
+class PrototypeIndex:
+    '''
+    The prototypes of many functions at once, found by reading each source
+    file a single time instead of once per function.
+    '''
+    def __init__(self, root, funcs):
+        self.root = root
+        # last identifier in a function's name --> functions with that name
+        self.by_word = {}
+        for func in funcs:
+            word = func.split('(')[0].split('::')[-1]
+            self.by_word.setdefault(word, []).append(func)
+        # function --> PrototypeMap
+        self.by_func = {}
+        with timing.phase('prototype scan'):
+            for fpath in _iter_source_files(root):
+                self._scan(fpath)
+    def _scan(self, fpath):
+        with open(fpath, 'r') as f:
+            txt = f.read()
+        for word in set(_word_pat.findall(txt)).intersection(self.by_word):
+            for func in self.by_word[word]:
+                protos = find_prototypes_in_text(func, fpath, txt)
+                if protos:
+                    self.by_func.setdefault(func, PrototypeMap())[fpath] = protos
+    def refresh(self, fpaths):
+        '''Re-read files that changed on disk, so offsets are current again.'''
+        for fpath in fpaths:
+            for prototypes in self.by_func.values():
+                prototypes.pop(fpath, None)
+            if os.path.isfile(fpath):
+                self._scan(fpath)
+    def find(self, func):
+        '''
+        Return fresh prototypes of func, like find_prototypes_in_codebase,
+        but only reading the files known to hold them.
+        '''
+        prototypes = PrototypeMap()
+        for fpath in self[func]:
+            in_this_file = find_prototypes_in_file(func, fpath)
+            if in_this_file:
+                prototypes[fpath] = in_this_file
+        if prototypes:
+            count = len(prototypes)
+            print('  Found %d %s.' % (count, _pluralize('prototype', count)))
+        return prototypes
+    def __getitem__(self, func):
+        return self.by_func.get(func, PrototypeMap())
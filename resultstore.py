@@ -0,0 +1,160 @@
+'''
+Share experiment outcomes across a team, so no one rebuilds an experiment
+that someone else has already run.
+
+An experiment's key (see outcomecache.experiment_key) hashes everything
+that decides its outcome: the function, which params, the body, every
+prototype, and the toolchain. So an outcome is valid for anyone whose tree
+has the same text there, whatever else differs.
+
+Run the stand-in service somewhere everyone can reach:
+
+    python resultstore.py serve FILE [--port 7071]
+
+and point each run at it:
+
+    python const_fix.py --result-store http://HOST:7071 ROOT
+
+Each run still keeps its own local cache; outcomes found remotely are
+copied into it, and everything it learns is published. If the service
+can't be reached, the run carries on with just the local cache.
+
+Any object with lookup(key) and record(key, outcome) can serve as a store.
+'''
+import argparse, sys, threading
+
+try:
+    from urllib2 import urlopen, Request, HTTPError, URLError
+    from urllib import quote, unquote
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+except ImportError:
+    from urllib.request import urlopen, Request
+    from urllib.error import HTTPError, URLError
+    from urllib.parse import quote, unquote
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+
+import outcomecache
+
+default_port = 7071
+_prefix = '/outcomes/'
+
+class HttpResultStore:
+    '''The client side of the service run by serve().'''
+    def __init__(self, url, timeout=5):
+        self.url = url.rstrip('/')
+        self.timeout = timeout
+        self.unreachable = False
+    def _request(self, key, data=None):
+        req = Request(self.url + _prefix + quote(key, safe=''), data)
+        if data is not None:
+            req.get_method = lambda: 'PUT'
+        return urlopen(req, timeout=self.timeout)
+    def _give_up(self, e):
+        # One warning, then no more waiting on timeouts for the rest of the run.
+        print('  Result store at %s is unreachable (%s); carrying on without it.' % (self.url, e))
+        self.unreachable = True
+    def lookup(self, key):
+        if self.unreachable:
+            return None
+        try:
+            response = self._request(key)
+            try:
+                outcome = response.read().decode('utf-8')
+            finally:
+                response.close()
+        except HTTPError as e:
+            if e.code != 404:
+                self._give_up(e)
+            return None
+        except (URLError, IOError) as e:
+            self._give_up(e)
+            return None
+        if outcome in (outcomecache.ACCEPTED, outcomecache.REJECTED):
+            return outcome
+    def record(self, key, outcome):
+        if self.unreachable:
+            return
+        try:
+            self._request(key, outcome.encode('utf-8')).close()
+        except (URLError, IOError) as e:
+            self._give_up(e)
+
+class TieredStore:
+    '''Look in a local store first, then a shared one; record in both.'''
+    def __init__(self, local, shared):
+        self.local = local
+        self.shared = shared
+    def lookup(self, key):
+        outcome = self.local.lookup(key)
+        if outcome is None:
+            outcome = self.shared.lookup(key)
+            if outcome is not None:
+                print('  Outcome found in the shared result store.')
+                self.local.record(key, outcome)
+        return outcome
+    def record(self, key, outcome):
+        self.local.record(key, outcome)
+        self.shared.record(key, outcome)
+
+class _Handler(BaseHTTPRequestHandler):
+    def _key(self):
+        if self.path.startswith(_prefix) and len(self.path) > len(_prefix):
+            return unquote(self.path[len(_prefix):])
+    def _reply(self, code, body=b''):
+        self.send_response(code)
+        self.send_header('Content-Type', 'text/plain')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    def do_GET(self):
+        key = self._key()
+        if key is None:
+            return self._reply(400)
+        with self.server.lock:
+            outcome = self.server.cache.lookup(key)
+        if outcome is None:
+            return self._reply(404)
+        self._reply(200, outcome.encode('utf-8'))
+    def do_PUT(self):
+        key = self._key()
+        length = int(self.headers.get('Content-Length') or 0)
+        outcome = self.rfile.read(length).decode('utf-8')
+        if key is None or outcome not in (outcomecache.ACCEPTED, outcomecache.REJECTED):
+            return self._reply(400)
+        with self.server.lock:
+            if self.server.cache.lookup(key) != outcome:
+                self.server.cache.record(key, outcome)
+        self._reply(204)
+    def log_message(self, format, *args):
+        pass
+
+class _Server(ThreadingMixIn, HTTPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+def make_server(fpath, port=default_port):
+    '''Return a server that keeps its outcomes in fpath, in ExperimentCache's format.'''
+    server = _Server(('', port), _Handler)
+    server.cache = outcomecache.ExperimentCache(fpath)
+    server.lock = threading.Lock()
+    return server
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Share experiment outcomes between const_fix runs.')
+    subparsers = parser.add_subparsers(dest='cmd')
+    serve = subparsers.add_parser('serve', help='run the shared result store')
+    serve.add_argument('fpath', help='file to keep outcomes in')
+    serve.add_argument('--port', type=int, default=default_port)
+    args = parser.parse_args(argv)
+    server = make_server(args.fpath, args.port)
+    print('Serving %d outcomes from %s on port %d.' % (len(server.cache.outcomes), args.fpath, server.server_address[1]))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,159 @@
+import os, re, sqlite3, time
+
+_tag_pat = re.compile(r'\b[A-Z][A-Z_]{2,}\b')
+
+_schema = '''
+CREATE TABLE IF NOT EXISTS functions (
+    name TEXT PRIMARY KEY,
+    tags TEXT,
+    finished REAL
+);
+CREATE TABLE IF NOT EXISTS params (
+    func TEXT,
+    param_idx INTEGER,
+    outcome TEXT,
+    compile_secs REAL,
+    test_secs REAL,
+    recorded REAL,
+    PRIMARY KEY (func, param_idx)
+);
+CREATE TABLE IF NOT EXISTS tags (
+    func TEXT,
+    tag TEXT
+);
+CREATE INDEX IF NOT EXISTS tags_by_tag ON tags (tag);
+CREATE INDEX IF NOT EXISTS tags_by_func ON tags (func);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+'''
+
+def split_tags(tags):
+    '''
+    Pull the labels (ORPHAN, OBNOXIOUS_CONST, ...) out of a tags string.
+    Labels come first; after the first : or --> there are only params and
+    signatures, whose type names (FILE, MSNL) aren't labels.
+    '''
+    labels = tags.split('-->', 1)[0].split(':', 1)[0]
+    return sorted(set(_tag_pat.findall(labels)))
+
+class RunStore:
+    '''
+    Everything we know about a run, in an indexed SQLite file: which
+    functions are finished and how, which params of unfinished functions
+    have already been tried, and how long each experiment took.
+
+    Writes are batched: they're committed every commit_every records or
+    commit_interval seconds, whichever comes first, and on flush(). Losing
+    the last few records in a crash is harmless; the experiments they
+    describe are simply repeated.
+
+    Pass shared=True to use one store from several threads; the caller
+    must make sure only one of them uses it at a time.
+    '''
+    commit_every = 200
+    commit_interval = 30
+
+    def __init__(self, fpath, shared=False):
+        self.fpath = fpath
+        self.db = sqlite3.connect(fpath, check_same_thread=not shared)
+        self.db.text_factory = str
+        self.db.executescript(_schema)
+        self.db.commit()
+        self.pending = 0
+        self.last_commit = time.time()
+    def _wrote(self):
+        self.pending += 1
+        if self.pending >= self.commit_every or time.time() - self.last_commit > self.commit_interval:
+            self.flush()
+    def flush(self):
+        self.db.commit()
+        self.pending = 0
+        self.last_commit = time.time()
+    def close(self):
+        self.flush()
+        self.db.close()
+    def is_empty(self):
+        return self.db.execute('SELECT COUNT(*) FROM functions').fetchone()[0] == 0
+    def record_function(self, func, tags):
+        self.db.execute('INSERT OR REPLACE INTO functions VALUES (?, ?, ?)', (func, tags, time.time()))
+        self.db.execute('DELETE FROM tags WHERE func = ?', (func,))
+        self.db.executemany('INSERT INTO tags VALUES (?, ?)', [(func, tag) for tag in split_tags(tags)])
+        self._wrote()
+    def record_param(self, func, param_idx, outcome, compile_secs=None, test_secs=None):
+        self.db.execute('INSERT OR REPLACE INTO params VALUES (?, ?, ?, ?, ?, ?)',
+            (func, param_idx, outcome, compile_secs, test_secs, time.time()))
+        self._wrote()
+    def forget_function(self, func):
+        '''Drop what we know about func, e.g. because its body was edited.'''
+        self.db.execute('DELETE FROM functions WHERE name = ?', (func,))
+        self.db.execute('DELETE FROM params WHERE func = ?', (func,))
+        self.db.execute('DELETE FROM tags WHERE func = ?', (func,))
+        self._wrote()
+    def finished_functions(self):
+        return [row[0] for row in self.db.execute('SELECT name FROM functions')]
+    def param_outcomes(self, func):
+        '''Return param index --> outcome for params of func already tried.'''
+        rows = self.db.execute('SELECT param_idx, outcome FROM params WHERE func = ?', (func,))
+        return dict(rows.fetchall())
+    def functions_with_tag(self, tag):
+        rows = self.db.execute('SELECT func FROM tags WHERE tag = ? ORDER BY func', (tag,))
+        return [row[0] for row in rows]
+    def average_secs(self):
+        '''Return the average compile and test seconds per experiment so far.'''
+        return self.db.execute('SELECT AVG(compile_secs), AVG(test_secs) FROM params').fetchone()
+    def param_timings(self):
+        '''Return (func, compile secs, test secs) for every timed experiment.'''
+        return self.db.execute('SELECT func, compile_secs, test_secs FROM params WHERE compile_secs IS NOT NULL').fetchall()
+    def outcome_counts(self):
+        '''Return outcome --> how many params ended that way.'''
+        return dict(self.db.execute('SELECT outcome, COUNT(*) FROM params GROUP BY outcome').fetchall())
+    def get_meta(self, key):
+        row = self.db.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        if row:
+            return row[0]
+    def set_meta(self, key, value):
+        self.db.execute('INSERT OR REPLACE INTO meta VALUES (?, ?)', (key, value))
+        self.flush()
+    def merge(self, fpath):
+        '''
+        Add every function and param recorded in another store, such as one
+        from another shard. Where both stores have a record, the later one
+        wins. Return the functions the two stores finished differently.
+        '''
+        self.flush()
+        self.db.execute('ATTACH DATABASE ? AS other', (fpath,))
+        try:
+            conflicts = [row[0] for row in self.db.execute('SELECT f.name FROM functions f '
+                'JOIN other.functions o ON f.name = o.name WHERE f.tags != o.tags')]
+            newer = self.db.execute('SELECT name, tags FROM other.functions o WHERE NOT EXISTS '
+                '(SELECT 1 FROM functions f WHERE f.name = o.name AND f.finished >= o.finished)').fetchall()
+            self.db.execute('INSERT OR REPLACE INTO params SELECT * FROM other.params o WHERE NOT EXISTS '
+                '(SELECT 1 FROM params p WHERE p.func = o.func AND p.param_idx = o.param_idx AND p.recorded >= o.recorded)')
+            self.db.execute('INSERT OR REPLACE INTO functions SELECT * FROM other.functions o WHERE NOT EXISTS '
+                '(SELECT 1 FROM functions f WHERE f.name = o.name AND f.finished >= o.finished)')
+            for func, tags in newer:
+                self.db.execute('DELETE FROM tags WHERE func = ?', (func,))
+                self.db.executemany('INSERT INTO tags VALUES (?, ?)', [(func, tag) for tag in split_tags(tags)])
+            self.db.commit()
+        finally:
+            self.db.execute('DETACH DATABASE other')
+        return conflicts
+    def import_outcomes_log(self, fpath):
+        '''Load a const-outcomes.txt from an older run, if there is one.'''
+        count = 0
+        if os.path.isfile(fpath):
+            with open(fpath, 'r') as f:
+                for line in f:
+                    i = line.find('\t')
+                    if i > -1:
+                        self.record_function(line[:i], line[i + 1:].rstrip('\n'))
+                        count += 1
+            self.flush()
+        return count
+    def export_outcomes_log(self, fpath):
+        '''Write the finished functions out in the old const-outcomes.txt format.'''
+        with open(fpath, 'w') as f:
+            for name, tags in self.db.execute('SELECT name, tags FROM functions ORDER BY finished'):
+                f.write('%s\t%s\n' % (name, tags))
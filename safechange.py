@@ -1,4 +1,23 @@
-import os
+import os, hashlib
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+import spanedit
+
+# fpath --> (digest before, mtime before, digest after, inverse edits) for
+# each file the current experiment has edited. Undoing an edit only touches
+# the spans that changed, and the restored file can be proven byte-identical;
+# if the build artifacts are restored too, it can be made to look untouched
+# to make.
+_journal = {}
+# Where the journal is mirrored for crash recovery; None = memory only.
+journal_path = None
+# Paths in the recovery log are relative to this, if set, so a run in a
+# fresh copy of the tree (see workspace.py) can still use it.
+journal_root = None
 
 class param_name_rollback:
     def __call__(self, prototypes):
@@ -11,37 +30,143 @@ class param_name_rollback:
 class const_rollback:
     def __init__(self, param, param_idx, rolled_back_state):
         param.set_const(rolled_back_state)
-        self.data_type = param.data_type
+        self.ctype = param.ctype
         self.param_idx = param_idx
     def __call__(self, prototypes):
         for fpath in prototypes:
             for proto in prototypes[fpath]:
-                proto.params[self.param_idx].data_type = self.data_type
+                proto.params[self.param_idx].ctype = self.ctype
+                proto.dirty = False
+
+class ctype_rollback:
+    def __init__(self, changes):
+        # (param, type before)
+        self.changes = changes
+    def __call__(self, prototypes):
+        for param, ctype in self.changes:
+            param.ctype = ctype
+        for fpath in prototypes:
+            for proto in prototypes[fpath]:
                 proto.dirty = False
 
-def _name_to_backup_name(fname):
-    assert not fname.startswith('.')
-    return '.' + fname + '.bak'
+class batch_rollback:
+    def __init__(self, rollbacks):
+        self.rollbacks = rollbacks
+    def __call__(self, prototypes):
+        for rollback in self.rollbacks:
+            rollback(prototypes)
+
+def _sha1(txt):
+    if not isinstance(txt, bytes):
+        txt = txt.encode('utf-8')
+    return hashlib.sha1(txt).hexdigest()
+
+def _save_journal():
+    '''
+    Mirror the journal to the recovery log, so a run that dies mid-experiment
+    can still be undone. The log only ever holds the edits in flight.
+    '''
+    if not journal_path:
+        return
+    if not _journal:
+        if os.path.exists(journal_path):
+            os.remove(journal_path)
+        return
+    journal = _journal
+    if journal_root:
+        journal = dict([(os.path.relpath(fpath, journal_root), entry) for fpath, entry in _journal.items()])
+    tmp = journal_path + '.tmp'
+    with open(tmp, 'wb') as f:
+        pickle.dump(journal, f, 2)
+    os.rename(tmp, journal_path)
 
-def _backup_name_to_name(fname):
-    assert fname.startswith('.')
-    return fname[1:].replace('.bak', '')
+def journal_edits(changes):
+    '''
+    Remember how to undo a set of edits. Call this once, before any of the
+    new text is written, so the recovery log is written once per experiment
+    rather than once per file. changes is a list of (fpath, old text, new
+    text, inverse), where inverse is the list of (begin, end, old text)
+    edits that turn the new text back into the old; see spanedit.EditList.
+    '''
+    for fpath, old_txt, new_txt, inverse in changes:
+        _journal[fpath] = (_sha1(old_txt), os.stat(fpath).st_mtime, _sha1(new_txt), inverse)
+    _save_journal()
 
-def _backup_or_restore_file(fpath, name_func):
-    folder, fname = os.path.split(fpath)
-    new_name = os.path.join(folder, name_func(fname))
+def forget_edits():
+    '''The edits in the journal are being kept; stop tracking them.'''
+    _journal.clear()
+    _save_journal()
+
+def _undo(fpath, entry):
+    old_digest, mtime, new_digest, inverse = entry
     with open(fpath, 'r') as f:
         txt = f.read()
-    if os.path.isfile(new_name):
-        os.remove(new_name)
-    with open(new_name, 'w') as f:
-        f.write(txt)
-        
-def backup_file(fpath):
-    _backup_or_restore_file(fpath, _name_to_backup_name)
-    
-def restore_file(fpath):
-    folder, fname = os.path.split(fpath)
-    fpath = os.path.join(folder, _name_to_backup_name(fname))
-    _backup_or_restore_file(fpath, _backup_name_to_name)
+    if _sha1(txt) == old_digest:
+        return True
+    if _sha1(txt) != new_digest:
+        return False
+    edits = spanedit.EditList(txt)
+    for begin, end, old in inverse:
+        edits.replace(begin, end, old)
+    txt = edits.apply()
+    if _sha1(txt) != old_digest:
+        return False
+    spanedit.write_atomically(fpath, txt)
+    # Newer than any object built from the edit, so make rebuilds it.
+    os.utime(fpath, None)
+    return True
+
+def restore_files(fpaths):
+    '''
+    Undo the journaled edits of fpaths. Return a dict of fpath --> the mtime
+    it had before the edit, for each file that is now byte-identical to what
+    it was; pass that to os.utime only once the build artifacts from before
+    the edit are back, or make will take the experiment's objects as up to
+    date. A file that had changed behind our back is left alone, and left
+    out of the dict.
+    '''
+    restored = {}
+    for fpath in fpaths:
+        entry = _journal.pop(fpath, None)
+        if entry is not None and _undo(fpath, entry):
+            restored[fpath] = entry[1]
+    _save_journal()
+    return restored
+
+def backdate(mtimes):
+    '''
+    Give each file in mtimes, from restore_files, its old mtime back. A file
+    that was never rewritten may still be a hard link into another tree (see
+    workspace.py); it gets its own copy first, so that tree is left alone.
+    '''
+    for fpath, mtime in mtimes.items():
+        if os.stat(fpath).st_nlink > 1:
+            with open(fpath, 'r') as f:
+                txt = f.read()
+            spanedit.write_atomically(fpath, txt)
+        os.utime(fpath, (mtime, mtime))
 
+def open_journal(fpath, root=None):
+    '''
+    Keep the recovery log at fpath, with paths relative to root if it's
+    given. If a previous run left one behind, it died mid-experiment; undo
+    whatever it was trying. Return the paths that couldn't be restored.
+    '''
+    global journal_path, journal_root
+    journal_path = fpath
+    journal_root = root
+    failed = []
+    if os.path.isfile(fpath):
+        with open(fpath, 'rb') as f:
+            leftover = pickle.load(f)
+        for path, entry in leftover.items():
+            if root:
+                path = os.path.join(root, path)
+            print('Restoring %s, which an interrupted run had edited.' % path)
+            if not os.path.isfile(path) or not _undo(path, entry):
+                failed.append(path)
+        # Keep the log until every file is back, so the next run tries again
+        # rather than carrying on with a half-edited tree.
+        if not failed:
+            os.remove(fpath)
+    return failed
@@ -0,0 +1,131 @@
+import os, re
+
+import outcomecache
+from testimpact import bare_name
+
+_include_pat = re.compile(r'^\s*#\s*include\s*[<"]([^>"]+)[>"]', re.MULTILINE)
+_decl_pat = re.compile(r'\b([A-Za-z_]\w*)\s*\(')
+source_exts = ('.c', '.cpp', '.cc')
+header_exts = ('.h', '.hpp')
+
+# Until we've timed a few experiments, assume this much.
+default_tu_secs = 5.0
+default_test_secs = 30.0
+default_accept_rate = 0.5
+# How much a newly unblocked caller is worth, relative to an accepted change.
+unblock_weight = 0.5
+
+def _pointer_candidates(params):
+    '''Count the params in a call graph param list that are worth trying.'''
+    count = 0
+    for p in params or []:
+        if ('*' in p or '&' in p) and 'const' not in p and 'void' not in p:
+            count += 1
+    return count
+
+class IncludeIndex:
+    '''
+    Which translation units include each header, directly or through other
+    headers, and which headers declare each function. Built with one pass
+    over the tree.
+    '''
+    def __init__(self, root):
+        self.root = root
+        # header basename --> files that #include it directly
+        self.included_by = {}
+        # bare function name --> header basenames that mention it
+        self.declared_in = {}
+        self.sources = set()
+        for folder, dirs, files in os.walk(root):
+            skip = [d for d in dirs if d.startswith('.')]
+            for d in skip:
+                dirs.remove(d)
+            for f in files:
+                if f.startswith('.') or not f.endswith(source_exts + header_exts):
+                    continue
+                with open(os.path.join(folder, f), 'r') as fp:
+                    txt = fp.read()
+                for m in _include_pat.finditer(txt):
+                    self.included_by.setdefault(os.path.basename(m.group(1)), set()).add(f)
+                if f.endswith(header_exts):
+                    for m in _decl_pat.finditer(txt):
+                        self.declared_in.setdefault(m.group(1), set()).add(f)
+                else:
+                    self.sources.add(f)
+        self._fan_out = {}
+    def fan_out(self, header):
+        '''Return how many translation units rebuild when header changes.'''
+        if header not in self._fan_out:
+            seen = set()
+            pending = [header]
+            while pending:
+                for f in self.included_by.get(pending.pop(), ()):
+                    if f not in seen:
+                        seen.add(f)
+                        pending.append(f)
+            self._fan_out[header] = len([f for f in seen if f in self.sources])
+        return self._fan_out[header]
+    def rebuild_count(self, func):
+        '''Estimate how many translation units an edit to func's prototypes rebuilds.'''
+        count = 1
+        for header in self.declared_in.get(bare_name(func), ()):
+            count += self.fan_out(header)
+        return count
+
+class Scheduler:
+    '''
+    Order each pass's leaves to get the most accepted changes per hour.
+
+    An experiment costs roughly (translation units rebuilt) * (seconds per
+    TU) plus a test run; a function costs one experiment per candidate
+    param. Its payoff is the changes we expect to keep, plus the callers
+    that become leaves once it's finished. Per-TU and test seconds are fit
+    to the timings in the run store, and refined as experiments complete.
+    '''
+    def __init__(self, root, cg, store=None):
+        self.cg = cg
+        self.index = IncludeIndex(root)
+        self.compile_secs = 0.0
+        self.rebuilt_tus = 0
+        self.test_secs = 0.0
+        self.tested = 0
+        self.accept_rate = default_accept_rate
+        if store:
+            for func, compile_secs, test_secs in store.param_timings():
+                self.observe(func, compile_secs, test_secs)
+            counts = store.outcome_counts()
+            total = sum(counts.values())
+            if total:
+                self.accept_rate = float(counts.get(outcomecache.ACCEPTED, 0)) / total
+    def observe(self, func, compile_secs, test_secs=None):
+        if compile_secs is not None:
+            self.compile_secs += compile_secs
+            self.rebuilt_tus += self.index.rebuild_count(func)
+        if test_secs is not None:
+            self.test_secs += test_secs
+            self.tested += 1
+    def secs_per_tu(self):
+        if self.rebuilt_tus:
+            return self.compile_secs / self.rebuilt_tus
+        return default_tu_secs
+    def secs_per_test(self):
+        if self.tested:
+            return self.test_secs / self.tested
+        return default_test_secs
+    def cost(self, func):
+        '''Estimated seconds to finish func.'''
+        experiments = max(1, _pointer_candidates(self.cg.get_params(func)))
+        per_experiment = self.index.rebuild_count(func) * self.secs_per_tu() + self.secs_per_test()
+        return experiments * per_experiment
+    def payoff(self, func):
+        expected = _pointer_candidates(self.cg.get_params(func)) * self.accept_rate
+        unblocked = 0
+        for caller in self.cg.by_callee.get(func, []):
+            if self.cg.by_caller.get(caller) == [func]:
+                unblocked += 1
+        return expected + unblock_weight * unblocked
+    def order(self, leaves):
+        '''Return leaves sorted by payoff per second, best first.'''
+        scored = [(-self.payoff(func) / self.cost(func), func) for func in leaves]
+        scored.sort()
+        return [func for score, func in scored]
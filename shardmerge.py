@@ -0,0 +1,199 @@
+'''
+Combine the results of sharded runs.
+
+Each machine runs its own shard of the functions in its own checkout of the
+same commit:
+
+    python const_fix.py --shard 1/3 ROOT
+    python const_fix.py --shard 2/3 ROOT
+    ...
+
+Then, in one checkout (typically a fresh one at the same commit), merge what
+they found:
+
+    python shardmerge.py TREE SHARD_ROOT [SHARD_ROOT ...] [--apply]
+
+The shards' outcome databases are merged into TREE's, and their accepted-patch
+logs are concatenated into TREE/const-merged.patch. With --apply, each
+accepted change is applied to TREE in turn; changes that no longer apply are
+collected in TREE/const-merged.rejects.patch.
+'''
+import argparse, os, re, sys
+
+import const_fix, distrib, runstore, spanedit
+
+merged_patch = 'const-merged.patch'
+rejects_patch = 'const-merged.rejects.patch'
+
+def split_patch_log(txt):
+    '''
+    Split an accepted-patch log into (label, diff) pairs, one per accepted
+    change. Every line of a diff starts with a diff marker, so a line that
+    starts with '# ' can only be a label.
+    '''
+    changes = []
+    label = None
+    lines = []
+    for line in txt.splitlines(True):
+        if line.startswith('# '):
+            if label is not None:
+                changes.append((label, ''.join(lines)))
+            label = line[2:].rstrip('\n')
+            lines = []
+        else:
+            lines.append(line)
+    if label is not None:
+        changes.append((label, ''.join(lines)))
+    return changes
+
+_hunk_pat = re.compile(r'^@@ -(\d+)(?:,(\d+))? \+\d+(?:,(\d+))? @@')
+
+def _hunks(diff):
+    '''
+    Yield (relative path, line number, old lines, new lines) for each hunk
+    of a diff, less its leading and trailing context.
+    '''
+    rel = None
+    hunk = []
+    old_left = new_left = 0
+    for line in diff.splitlines() + ['']:
+        if old_left or new_left:
+            if line.startswith('\\'):
+                continue
+            hunk.append(line)
+            if not line.startswith('+'):
+                old_left -= 1
+            if not line.startswith('-'):
+                new_left -= 1
+            continue
+        changed = [i for i, txt in enumerate(hunk) if txt[:1] in ('-', '+')]
+        if changed:
+            lineno += len([txt for txt in hunk[:changed[0]] if not txt.startswith('+')])
+            hunk = hunk[changed[0]:changed[-1] + 1]
+            yield (rel, lineno, [txt[1:] for txt in hunk if not txt.startswith('+')],
+                [txt[1:] for txt in hunk if not txt.startswith('-')])
+        hunk = []
+        if line.startswith('+++ '):
+            rel = line[4:]
+            if rel.startswith('b/'):
+                rel = rel[2:]
+        m = _hunk_pat.match(line)
+        if m:
+            lineno = int(m.group(1))
+            old_left = int(m.group(2) or 1)
+            new_left = int(m.group(3) or 1)
+
+def _apply_where_recorded(tree, diff):
+    '''
+    Apply diff ignoring its context, but only if the lines it replaces are
+    all still at the line numbers it gives for them. Return False, having
+    changed nothing, if any aren't.
+    '''
+    files = {}
+    for rel, lineno, old, new in _hunks(diff):
+        if rel not in files:
+            fpath = os.path.join(tree, rel)
+            if not os.path.isfile(fpath):
+                return False
+            with open(fpath, 'r') as f:
+                files[rel] = (f.read().splitlines(True), [])
+        lines, hunks = files[rel]
+        if lineno < 1 or [line.rstrip('\n') for line in lines[lineno - 1:lineno - 1 + len(old)]] != old:
+            return False
+        hunks.append((lineno, old, new))
+    for rel, (lines, hunks) in files.items():
+        # Bottom up, so earlier line numbers stay put.
+        for lineno, old, new in sorted(hunks, reverse=True):
+            end = lineno - 1 + len(old)
+            eol = '\n' if end < len(lines) or lines[-1].endswith('\n') else ''
+            lines[lineno - 1:end] = [txt + '\n' for txt in new[:-1]] + [txt + eol for txt in new[-1:]]
+        spanedit.write_atomically(os.path.join(tree, rel), ''.join(lines))
+    return True
+
+def apply_change(tree, diff):
+    '''
+    Apply one shard's accepted change. Another shard's change to an
+    adjacent line alters the context, so if the diff doesn't apply as is,
+    ignore the context. Const and rename edits never add or remove lines,
+    so that is only done where the lines being replaced are still exactly
+    where the diff says; matching them anywhere else (as git apply -C0
+    does) could edit an identical line, say a second copy of a
+    declaration.
+    '''
+    return distrib.apply_patch(tree, diff) or _apply_where_recorded(tree, diff)
+
+def _is_same_folder(a, b):
+    return os.path.normcase(os.path.realpath(a)) == os.path.normcase(os.path.realpath(b))
+
+def merge_outcomes(tree, shard_roots):
+    '''Merge each shard's outcomes into tree's store. Return how many functions it now holds.'''
+    store = runstore.RunStore(os.path.join(tree, const_fix.outcomes_db))
+    if store.is_empty():
+        store.import_outcomes_log(os.path.join(tree, const_fix.outcomes_log))
+    for shard_root in shard_roots:
+        if _is_same_folder(shard_root, tree):
+            continue
+        fpath = os.path.join(shard_root, const_fix.outcomes_db)
+        if not os.path.isfile(fpath):
+            # An older run that only kept the text log.
+            fpath = os.path.join(shard_root, const_fix.outcomes_db + '.imported')
+            imported = runstore.RunStore(fpath)
+            imported.import_outcomes_log(os.path.join(shard_root, const_fix.outcomes_log))
+            imported.close()
+        conflicts = store.merge(fpath)
+        if conflicts:
+            print('%s disagrees about %d %s; kept the later result: %s' % (shard_root, len(conflicts),
+                const_fix._pluralize('function', len(conflicts)), ', '.join(conflicts)))
+    store.flush()
+    store.export_outcomes_log(os.path.join(tree, const_fix.outcomes_log))
+    count = len(store.finished_functions())
+    store.close()
+    return count
+
+def merge_patches(tree, shard_roots, apply=False):
+    '''
+    Concatenate the shards' accepted changes into one log and, if apply is
+    true, apply each one to tree. Return (changes, changes that didn't apply).
+    '''
+    changes = []
+    rejects = []
+    with open(os.path.join(tree, merged_patch), 'w') as out:
+        for shard_root in shard_roots:
+            fpath = os.path.join(shard_root, const_fix.accepted_patch_log)
+            if not os.path.isfile(fpath):
+                print('No accepted changes in %s.' % shard_root)
+                continue
+            with open(fpath, 'r') as f:
+                txt = f.read()
+            out.write(txt)
+            already_there = _is_same_folder(shard_root, tree)
+            for label, diff in split_patch_log(txt):
+                changes.append(label)
+                # A shard's own tree already has its changes.
+                if apply and not already_there and not apply_change(tree, diff):
+                    print('Change for %s from %s no longer applies.' % (label, shard_root))
+                    rejects.append((label, diff))
+    if rejects:
+        with open(os.path.join(tree, rejects_patch), 'w') as f:
+            for label, diff in rejects:
+                f.write('# %s\n%s' % (label, diff))
+    return changes, rejects
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Merge the outcomes and accepted changes of sharded const_fix runs.')
+    parser.add_argument('tree', help='checkout to merge into')
+    parser.add_argument('shard_roots', nargs='+', metavar='shard_root', help='root of a sharded run')
+    parser.add_argument('--apply', action='store_true', help='apply the accepted changes to tree')
+    args = parser.parse_args(argv)
+    tree = os.path.normpath(os.path.abspath(args.tree))
+    count = merge_outcomes(tree, args.shard_roots)
+    print('Merged outcomes for %d %s into %s.' % (count, const_fix._pluralize('function', count), const_fix.outcomes_log))
+    changes, rejects = merge_patches(tree, args.shard_roots, args.apply)
+    print('Collected %d accepted %s in %s.' % (len(changes), const_fix._pluralize('change', len(changes)), merged_patch))
+    if rejects:
+        print('%d %s did not apply; see %s.' % (len(rejects), const_fix._pluralize('change', len(rejects)), rejects_patch))
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,69 @@
+import difflib, os, re, shutil
+
+class EditList:
+    '''
+    Replacements of spans of one text. Edits can be added in any order;
+    apply() sorts them and builds the new text in a single join, so the cost
+    is linear in the size of the text no matter how many edits there are.
+    '''
+    def __init__(self, txt):
+        self.txt = txt
+        self.edits = []
+        # After apply(), the edits that turn the new text back into the old.
+        self.inverse = []
+    def replace(self, begin, end, new):
+        if new != self.txt[begin:end]:
+            self.edits.append((begin, end, new))
+    def __len__(self):
+        return len(self.edits)
+    def apply(self):
+        self.edits.sort(key=lambda edit: edit[0])
+        parts = []
+        self.inverse = []
+        i = 0
+        shift = 0
+        for begin, end, new in self.edits:
+            if begin < i:
+                raise ValueError('Edit at offset %d overlaps the edit before it.' % begin)
+            parts.append(self.txt[i:begin])
+            parts.append(new)
+            self.inverse.append((begin + shift, begin + shift + len(new), self.txt[begin:end]))
+            shift += len(new) - (end - begin)
+            i = end
+        parts.append(self.txt[i:])
+        return ''.join(parts)
+
+def rename_identifiers(txt, renames):
+    '''
+    Rename every whole-word use of each key in renames to its value, with one
+    pass of one regex. Member accesses (x.name, x->name) are left alone.
+    '''
+    if not renames:
+        return txt
+    names = sorted(renames, key=len, reverse=True)
+    pat = re.compile(r'(?<![\w.>])(%s)(?!\w)' % '|'.join([re.escape(name) for name in names]))
+    return pat.sub(lambda m: renames[m.group(1)], txt)
+
+def write_atomically(fpath, txt):
+    '''
+    Write txt to a temp file next to fpath, then rename it into place, so
+    a crash never leaves a half-written source file.
+    '''
+    folder, fname = os.path.split(fpath)
+    tmp = os.path.join(folder, '.%s.tmp' % fname)
+    with open(tmp, 'w') as f:
+        f.write(txt)
+    if os.path.exists(fpath):
+        shutil.copymode(fpath, tmp)
+    os.rename(tmp, fpath)
+
+def unified_diff(old, new, rel_path):
+    '''Return a git-style unified diff of one file, usable with patch -p1 or git apply.'''
+    lines = difflib.unified_diff(old.splitlines(True), new.splitlines(True),
+        'a/' + rel_path, 'b/' + rel_path)
+    parts = []
+    for line in lines:
+        parts.append(line)
+        if not line.endswith('\n'):
+            parts.append('\n\\ No newline at end of file\n')
+    return ''.join(parts)
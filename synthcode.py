@@ -0,0 +1,204 @@
+'''
+Generate a synthetic, moab-flavored C codebase for benchmarking: source
+files whose functions take struct pointers, scalars and buffers, with
+comments scattered through param lists and bodies, headers that declare
+the functions without param names, test folders full of mock macros, and
+doxygen-style HTML pages describing the call graph.
+'''
+import os, random
+
+struct_types = ['mjob_t', 'mrsv_t', 'mnode_t', 'mreq_t', 'mpar_t', 'mrm_t']
+scalar_types = ['int', 'long', 'mbool_t']
+fields = ['State', 'Flags', 'Count', 'Index', 'Size', 'Priority']
+param_names = {
+    'mjob_t': 'J', 'mrsv_t': 'R', 'mnode_t': 'N',
+    'mreq_t': 'RQ', 'mpar_t': 'P', 'mrm_t': 'RM'}
+
+class SynthFunc:
+    def __init__(self, name, module, params):
+        self.name = name
+        self.module = module
+        # (type, name) pairs; type is how it's written in the impl.
+        self.params = params
+        self.callees = []
+        self.callers = []
+        self.body = []
+
+def _make_params(rng, max_params):
+    params = []
+    used = set()
+    for i in range(rng.randint(1, max_params)):
+        roll = rng.random()
+        if roll < 0.55:
+            typ = rng.choice(struct_types)
+            name = param_names[typ]
+            typ += ' *'
+        elif roll < 0.65:
+            typ, name = 'char *', 'Buf'
+        elif roll < 0.72:
+            typ, name = 'const char *', 'Name'
+        elif roll < 0.77:
+            typ, name = 'const int', 'Limit'
+        else:
+            typ = rng.choice(scalar_types)
+            name = 'Count'
+        while name in used:
+            name += str(i)
+        used.add(name)
+        params.append((typ, name))
+    return params
+
+def _arg_for(typ):
+    return 'NULL' if '*' in typ else '0'
+
+def _build_funcs(rng, modules, funcs_per_module, max_params):
+    funcs = []
+    for m in range(modules):
+        module = 'mod%d' % m
+        for i in range(funcs_per_module):
+            name = 'MSyn%s%d' % (module.capitalize(), i)
+            funcs.append(SynthFunc(name, module, _make_params(rng, max_params)))
+    # Functions only call functions generated before them, so the graph is a
+    # DAG and the first pass has plenty of leaves.
+    for idx, func in enumerate(funcs):
+        lines = ['  int rc = 0;', '  long total = 0;']
+        for typ, name in func.params:
+            if '*' not in typ:
+                lines.append('  total += %s;' % name)
+                continue
+            if typ.startswith('const'):
+                lines.append('  total += (%s != NULL);' % name)
+                continue
+            roll = rng.random()
+            if name.startswith('Buf'):
+                lines.append('  /* fill in the caller\'s buffer */')
+                lines.append('  %s[0] = \'\\0\';' % name)
+            elif roll < 0.35:
+                lines.append('  %s->%s = %d;' % (name, rng.choice(fields), idx))
+            elif roll < 0.42:
+                # A write through a local alias, which only the compiler catches.
+                lines.append('  %s local%s = %s;' % (typ, name, name))
+                lines.append('  local%s->%s++;' % (name, rng.choice(fields)))
+            elif roll < 0.55 and idx > 0:
+                base = typ.split()[0] + ' *'
+                candidates = [f for f in funcs[max(0, idx - 40):idx] if f.params and f.params[0][0] == base]
+                if candidates:
+                    callee = rng.choice(candidates)
+                    args = [name] + [_arg_for(t) for t, n in callee.params[1:]]
+                    lines.append('  rc = %s(%s);' % (callee.name, ', '.join(args)))
+                    func.callees.append(callee)
+                    callee.callers.append(func)
+                else:
+                    lines.append('  total += %s->%s;' % (name, rng.choice(fields)))
+            else:
+                lines.append('  if (%s->%s > 0) /* read only */' % (name, rng.choice(fields)))
+                lines.append('    total++;')
+        if rng.random() < 0.3:
+            lines.append('  MDB(7, "{not a brace} %ld", total);')
+        if idx > 0 and rng.random() < 0.4:
+            callee = funcs[rng.randint(max(0, idx - 20), idx - 1)]
+            if callee not in func.callees:
+                args = [_arg_for(t) for t, n in callee.params]
+                lines.append('  rc = %s(%s); // unrelated call' % (callee.name, ', '.join(args)))
+                func.callees.append(callee)
+                callee.callers.append(func)
+        lines.append('  return(rc + (int)total);')
+        func.body = lines
+    return funcs
+
+def _impl_text(func):
+    out = ['/**', ' * %s does synthetic work.' % func.name, ' */', '', 'int %s(' % func.name]
+    for i, (typ, name) in enumerate(func.params):
+        sep = ',' if i < len(func.params) - 1 else ')'
+        out.append('  %s %s%s /* I */' % (typ, name, sep))
+    out.append('{')
+    out.extend(func.body)
+    out.append('}')
+    out.append('')
+    return '\n'.join(out)
+
+def _decl_text(func):
+    return 'int %s(%s);' % (func.name, ', '.join([typ for typ, name in func.params]))
+
+def _mock_text(func):
+    return 'MOCK_CMETHOD%d(int, %s, %s);' % (len(func.params), func.name,
+        ', '.join([typ for typ, name in func.params]))
+
+def _html_param_rows(func):
+    rows = []
+    for typ, name in func.params:
+        rows.append('<td class="paramtype">%s&#160;</td><td class="paramname"><em>%s</em></td>' % (
+            typ.replace('&', '&amp;'), name))
+    return ''.join(rows)
+
+def _html_links(funcs):
+    return ', '.join(['<a class="el" href="%s_8c.html">%s()</a>' % (f.module, f.name) for f in funcs])
+
+def _html_page(module, funcs):
+    out = ['<html><body>', '<h2 class="groupheader">Function Documentation</h2>']
+    for func in funcs:
+        out.append('<div class="memitem">')
+        out.append('<div class="memproto">')
+        out.append('<table class="memname"><tr><td class="memname">int %s</td><td>(</td>%s</tr></table>' % (
+            func.name, _html_param_rows(func)))
+        out.append('</div><div class="memdoc">')
+        if func.callees:
+            out.append('<p>References %s.</p>' % _html_links(sorted(func.callees, key=lambda f: f.name)))
+        if func.callers:
+            out.append('<p>Referenced by %s.</p>' % _html_links(sorted(func.callers, key=lambda f: f.name)))
+        out.append('</div>')
+        out.append('</div>')
+    out.append('</body></html>')
+    return '\n'.join(out)
+
+def _write(fpath, txt):
+    folder = os.path.dirname(fpath)
+    if not os.path.isdir(folder):
+        os.makedirs(folder)
+    with open(fpath, 'w') as f:
+        f.write(txt)
+
+def generate(root, modules=10, funcs_per_module=20, max_params=4, html_folder=None, seed=1):
+    '''
+    Write a synthetic codebase under root, and doxygen-style HTML for it
+    under html_folder (root/html by default). Return the list of SynthFuncs.
+    '''
+    rng = random.Random(seed)
+    if html_folder is None:
+        html_folder = os.path.join(root, 'html')
+    funcs = _build_funcs(rng, modules, funcs_per_module, max_params)
+    by_module = {}
+    for func in funcs:
+        by_module.setdefault(func.module, []).append(func)
+    _write(os.path.join(root, 'Makefile'), 'all:\n\t@echo synthetic tree; build with fakecc.py\n')
+    for module, mfuncs in sorted(by_module.items()):
+        header = ['#ifndef __MSYN_%s_H__' % module.upper(), '#define __MSYN_%s_H__' % module.upper(), '']
+        header.extend([_decl_text(f) for f in mfuncs])
+        header.extend(['', '#endif'])
+        _write(os.path.join(root, 'include', 'msyn_%s.h' % module), '\n'.join(header) + '\n')
+        src = ['#include "moab.h"', '#include "msyn_%s.h"' % module, '']
+        src.extend([_impl_text(f) for f in mfuncs])
+        _write(os.path.join(root, 'src', 'msyn_%s.c' % module), '\n'.join(src))
+        # Each module's tests mock a few functions from elsewhere, and call
+        # a few of its own.
+        others = [f for f in funcs if f.module != module]
+        mocked = rng.sample(others, min(3, len(others)))
+        test = ['#include "gmock/gmock.h"', '']
+        test.extend([_mock_text(f) for f in mocked])
+        test.extend(['', 'TEST(%s, Basics)' % module, '  {'])
+        for f in rng.sample(mfuncs, min(3, len(mfuncs))):
+            test.append('  int rc = %s(%s);' % (f.name, ', '.join([_arg_for(t) for t, n in f.params])))
+        test.extend(['  }', ''])
+        _write(os.path.join(root, 'test', module, 'test_%s.cpp' % module), '\n'.join(test))
+        _write(os.path.join(html_folder, '%s_8c.html' % module), _html_page(module, mfuncs))
+    _write(os.path.join(html_folder, 'index.html'), '<html></html>\n')
+    return funcs
+
+if __name__ == '__main__':
+    import sys
+    if len(sys.argv) < 2:
+        sys.stderr.write('usage: synthcode.py ROOT [MODULES [FUNCS_PER_MODULE]]\n')
+        sys.exit(1)
+    args = [int(x) for x in sys.argv[2:4]]
+    funcs = generate(sys.argv[1], *args)
+    print('Generated %d functions in %s.' % (len(funcs), sys.argv[1]))
@@ -0,0 +1,79 @@
+import os, shutil, tempfile, unittest
+
+import buildcache
+
+class ArtifactStashTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.root = os.path.join(self.folder, 'tree')
+        os.makedirs(os.path.join(self.root, 'build'))
+        self.objects = [os.path.join(self.root, 'build', 'f%d.o' % i) for i in range(2)]
+        for i, fpath in enumerate(self.objects):
+            self._write(fpath, 'object %d' % i, 1000000 + i)
+        self.stash = buildcache.ArtifactStash(os.path.join(self.folder, 'artifacts'))
+        self.stash.capture(self.root)
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+    def _write(self, fpath, txt, mtime):
+        with open(fpath, 'w') as f:
+            f.write(txt)
+        os.utime(fpath, (mtime, mtime))
+    def _read(self, fpath):
+        with open(fpath) as f:
+            return f.read()
+    def test_restore(self):
+        self._write(self.objects[0], 'rebuilt', 2000000)
+        extra = os.path.join(self.root, 'build', 'new.o')
+        self._write(extra, 'new', 2000000)
+        os.remove(self.objects[1])
+        self.assertTrue(self.stash.restore(self.root))
+        for i, fpath in enumerate(self.objects):
+            self.assertEqual(self._read(fpath), 'object %d' % i)
+            self.assertEqual(os.path.getmtime(fpath), 1000000 + i)
+        self.assertFalse(os.path.exists(extra))
+    def test_unchanged_artifacts_not_copied(self):
+        self.assertEqual(len(os.listdir(self.stash.folder)), 2)
+        self._write(self.objects[0], 'rebuilt', 2000000)
+        self.stash.capture(self.root)
+        # The old copy is dropped; only what's current is kept.
+        self.assertEqual(len(os.listdir(self.stash.folder)), 2)
+    def test_missing_copy(self):
+        self._write(self.objects[0], 'rebuilt', 2000000)
+        shutil.rmtree(self.stash.folder)
+        os.makedirs(self.stash.folder)
+        self.assertFalse(self.stash.restore(self.root))
+    def test_nothing_captured(self):
+        self.assertFalse(buildcache.ArtifactStash(os.path.join(self.folder, 'other')).restore(self.root))
+    def test_saved_across_runs(self):
+        self.stash.save()
+        self._write(self.objects[1], 'rebuilt', 2000000)
+        stash = buildcache.ArtifactStash(self.stash.folder)
+        stash.load()
+        self.assertTrue(stash.restore(self.root))
+        self.assertEqual(self._read(self.objects[1]), 'object 1')
+
+class SnapshotTest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.saved = buildcache._can_strip
+        # Hash raw bytes, whether or not objcopy is installed.
+        buildcache._can_strip = False
+        self.fpath = os.path.join(self.root, 'f.o')
+        with open(self.fpath, 'w') as f:
+            f.write('code')
+    def tearDown(self):
+        buildcache._can_strip = self.saved
+        buildcache._digest_cache.clear()
+        shutil.rmtree(self.root)
+    def test_changed_objects(self):
+        before = buildcache.snapshot_objects(self.root)
+        self.assertEqual(buildcache.changed_objects(before, buildcache.snapshot_objects(self.root)), [])
+        with open(self.fpath, 'w') as f:
+            f.write('other code')
+        os.utime(self.fpath, (3000000, 3000000))
+        self.assertEqual(buildcache.changed_objects(before, buildcache.snapshot_objects(self.root)), [self.fpath])
+        os.remove(self.fpath)
+        self.assertEqual(buildcache.changed_objects(before, buildcache.snapshot_objects(self.root)), [self.fpath])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,39 @@
+import unittest
+
+import callgraph
+
+class _StubGraph(callgraph.Callgraph):
+    def load(self):
+        pass
+
+def _stub_graph(calls):
+    '''Build a Callgraph from (caller, callee) pairs, without doxygen.'''
+    cg = _StubGraph('.')
+    cg.by_caller = {}
+    cg.by_callee = {}
+    cg.params_by_caller = {}
+    for caller, callee in calls:
+        for func in (caller, callee):
+            cg.by_caller.setdefault(func, [])
+            cg.by_callee.setdefault(func, [])
+            cg.params_by_caller.setdefault(func, [])
+        cg.by_caller[caller].append(callee)
+        cg.by_callee[callee].append(caller)
+    cg._remember_callers()
+    return cg
+
+class TransitiveCallersTest(unittest.TestCase):
+    def test_chain(self):
+        cg = _stub_graph([('A()', 'B()'), ('B()', 'C()')])
+        self.assertEqual(cg.get_transitive_callers('C()'), set(['A()', 'B()']))
+    def test_survives_removal_of_intermediate(self):
+        cg = _stub_graph([('A()', 'B()'), ('B()', 'C()')])
+        # B is cut as noise before C is finished.
+        cg.remove('B()')
+        self.assertEqual(cg.get_transitive_callers('C()'), set(['A()', 'B()']))
+    def test_cycle_excludes_func(self):
+        cg = _stub_graph([('A()', 'B()'), ('B()', 'A()')])
+        self.assertEqual(cg.get_transitive_callers('A()'), set(['B()']))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+import os, shutil, sys, tempfile, unittest
+
+import callgraph, cgstore, synthcode
+
+class DiskCallgraphTest(unittest.TestCase):
+    def setUp(self):
+        self.scratch = tempfile.mkdtemp()
+        self.root = os.path.join(self.scratch, 'tree')
+        self.html = os.path.join(self.scratch, 'html')
+        synthcode.generate(self.root, modules=3, funcs_per_module=12, html_folder=self.html, seed=3)
+        self.saved = (callgraph.doxy_output_folder, sys.stdout)
+        callgraph.doxy_output_folder = self.html
+        sys.stdout = open(os.devnull, 'w')
+        self.fpath = os.path.join(self.scratch, cgstore.store_name)
+        self.disk = cgstore.load(self.root, self.fpath)
+        self.ram = callgraph.Callgraph(self.root)
+    def tearDown(self):
+        self.disk.close()
+        sys.stdout.close()
+        callgraph.doxy_output_folder, sys.stdout = self.saved
+        shutil.rmtree(self.scratch)
+    def assertSameGraph(self):
+        self.assertEqual(sorted(self.disk.by_caller.keys()), sorted(self.ram.by_caller.keys()))
+        self.assertEqual(len(self.disk.by_callee), len(self.ram.by_callee))
+        for func in self.ram.by_caller:
+            self.assertEqual(self.disk.by_caller[func], self.ram.by_caller[func])
+            self.assertEqual(self.disk.by_callee.get(func), self.ram.by_callee.get(func))
+            self.assertEqual(self.disk.get_params(func), self.ram.get_params(func))
+        self.assertEqual(sorted(self.disk.get_leaves()), sorted(self.ram.get_leaves()))
+    def test_same_as_callgraph(self):
+        self.assertSameGraph()
+        self.assertEqual(self.disk.get_params('NoSuchFunc()'), None)
+        self.assertFalse('NoSuchFunc()' in self.disk.by_caller)
+    def test_remove_in_lockstep(self):
+        everything = list(self.ram.by_caller.keys())
+        passes = 0
+        while not self.ram.is_empty():
+            self.assertFalse(self.disk.is_empty())
+            leaves = sorted(self.ram.get_leaves()) or sorted(self.ram.by_caller.keys())[:1]
+            for func in leaves:
+                self.ram.remove(func)
+                self.disk.remove(func)
+            self.assertSameGraph()
+            passes += 1
+        self.assertTrue(self.disk.is_empty())
+        self.assertTrue(passes > 1)
+        # Test selection still sees the whole graph.
+        for func in everything:
+            self.assertEqual(self.disk.get_transitive_callers(func), self.ram.get_transitive_callers(func))
+    def test_rebuilt_only_when_stale(self):
+        mtime = int(os.path.getmtime(self.fpath)) + 10
+        os.utime(self.fpath, (mtime, mtime))
+        cgstore.load(self.root, self.fpath).close()
+        self.assertEqual(os.path.getmtime(self.fpath), mtime)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,140 @@
+import os, re, shutil, subprocess, sys, tempfile, unittest
+
+import benchmark, const_fix, safechange, synthcode, timing
+from param import Param
+from prototype import find_prototypes_in_text
+
+_here = os.path.dirname(os.path.abspath(__file__))
+
+class TopLevelConstTest(unittest.TestCase):
+    def test_by_value(self):
+        self.assertTrue(Param(0, 'const int Limit').has_top_level_const())
+        self.assertTrue(Param(0, 'mjob_t const J').has_top_level_const())
+        self.assertTrue(Param(0, 'const int').has_top_level_const())
+    def test_not_by_value(self):
+        for decl in ('char const * Name', 'mrsv_t const & R', 'int const Counts[]', 'int Limit', 'int constant'):
+            self.assertFalse(Param(0, decl).has_top_level_const(), decl)
+    def test_not_part_of_the_signature(self):
+        txt = 'int MFoo(int, char const *);\nint MFoo(const int Limit, const char *Name)\n{\n  return 0;\n}\n'
+        decl, impl = find_prototypes_in_text('MFoo()', 'x.c', txt)
+        self.assertTrue(decl.matches(impl))
+        txt = 'int MFoo(int, char *);\nint MFoo(int Limit, const char *Name)\n{\n  return 0;\n}\n'
+        decl, impl = find_prototypes_in_text('MFoo()', 'x.c', txt)
+        self.assertFalse(decl.matches(impl))
+
+class ObnoxiousConstTest(unittest.TestCase):
+    def setUp(self):
+        self.scratch = tempfile.mkdtemp()
+        self.root = os.path.join(self.scratch, 'tree')
+        html = os.path.join(self.scratch, 'html')
+        self.funcs = synthcode.generate(self.root, modules=2, funcs_per_module=6, html_folder=html)
+        benchmark.configure_const_fix(self.root, html, self.scratch)
+        self.saved = (const_fix.outcomes_log, sys.stdout, os.environ.get('FAKECC_TU_SECS'), os.environ.get('FAKECC_TEST_SECS'))
+        os.environ['FAKECC_TU_SECS'] = os.environ['FAKECC_TEST_SECS'] = '0'
+        sys.stdout = open(os.devnull, 'w')
+    def tearDown(self):
+        sys.stdout.close()
+        (const_fix.outcomes_log, sys.stdout, tu, test) = self.saved
+        for name, value in (('FAKECC_TU_SECS', tu), ('FAKECC_TEST_SECS', test)):
+            if value is None:
+                del os.environ[name]
+            else:
+                os.environ[name] = value
+        shutil.rmtree(self.scratch)
+    def _read(self, *parts):
+        with open(os.path.join(self.root, *parts)) as f:
+            return f.read()
+    def test_declarations_only(self):
+        obnoxious = [f.name + '()' for f in self.funcs if 'const int' in [typ for typ, name in f.params]]
+        self.assertTrue(obnoxious)
+        const_fix.fix_obnoxious_const(self.root)
+        for module in ('mod0', 'mod1'):
+            header = self._read('include', 'msyn_%s.h' % module)
+            self.assertFalse(re.search(r'const int\b|\bint const\b', header), header)
+            # Definitions keep theirs.
+            self.assertEqual(self._read('src', 'msyn_%s.c' % module).count('const int Limit'),
+                len([f for f in self.funcs if f.module == module and ('const int', 'Limit') in f.params]))
+        self.assertTrue(self._read(const_fix.accepted_patch_log).startswith('# obnoxious const\n'))
+        env = dict(os.environ, FAKECC_TU_SECS='0')
+        self.assertEqual(subprocess.call([sys.executable, os.path.join(_here, 'fakecc.py'), 'compile', self.root],
+            stdout=subprocess.PIPE, env=env), 0)
+
+_names_tree = {
+    'include/names.h': 'int MFoo(mjob_t *);\nint MBar(mrsv_t *);\nint MBad(mnode_t *);\nint MUnnamed(int, char *Name);\n',
+    # Overloads, declared in different files.
+    'include/over1.h': 'int MOver(int);\n',
+    'include/over2.h': 'int MOver(int, char *Name);\n',
+    'src/names.c': 'int MFoo(mjob_t *Job)\n{\n  return Job->Count;\n}\n'
+        'int MBar(mrsv_t *Rsv)\n{\n  return Rsv->Count;\n}\n'
+        'int MBad(mnode_t *BadName)\n{\n  return BadName->Count;\n}\n'
+        'int MUnnamed(int Count, char *)\n{\n  return Count;\n}\n'
+        'int MOver(int Limit)\n{\n  return Limit;\n}\n',
+}
+
+class _Callgraph:
+    def __init__(self, funcs):
+        self.by_caller = dict([(func, []) for func in funcs])
+
+class ParamNamesTest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        for rel, txt in _names_tree.items():
+            fpath = os.path.join(self.root, rel)
+            if not os.path.isdir(os.path.dirname(fpath)):
+                os.makedirs(os.path.dirname(fpath))
+            with open(fpath, 'w') as f:
+                f.write(txt)
+        os.makedirs(os.path.join(self.root, 'test'))
+        names = ['compile_cmd', 'compile_tests_cmd', 'make_clean_cmd', 'clean_tests_cmd', 'test_cmd', 'compile_log', 'test_log',
+            '_run_store', '_artifact_stash', '_baseline_objects']
+        self.saved = dict([(name, getattr(const_fix, name)) for name in names])
+        # Nothing left over from another test's run.
+        const_fix._run_store = const_fix._artifact_stash = const_fix._baseline_objects = None
+        self.saved_stdout = sys.stdout
+        self.saved_journal = safechange.journal_path
+        safechange.journal_path = None
+        # The build breaks if a header names a param BadName.
+        const_fix.compile_cmd = '! grep -q BadName include/*.h'
+        const_fix.compile_tests_cmd = const_fix.make_clean_cmd = const_fix.clean_tests_cmd = const_fix.test_cmd = 'true'
+        const_fix.compile_log = os.path.join(self.root, 'make.log')
+        const_fix.test_log = os.path.join(self.root, 'test.log')
+        sys.stdout = open(os.devnull, 'w')
+    def tearDown(self):
+        sys.stdout.close()
+        sys.stdout = self.saved_stdout
+        for name, value in self.saved.items():
+            setattr(const_fix, name, value)
+        safechange.journal_path = self.saved_journal
+        shutil.rmtree(self.root)
+    def _read(self, *parts):
+        with open(os.path.join(self.root, *parts)) as f:
+            return f.read()
+    def _improve(self, funcs):
+        before = len([e for e in timing._events if e[0] == 'compile'])
+        kept, rejected = const_fix.improve_all_param_names(self.root, _Callgraph(funcs))
+        return sorted(kept), sorted(rejected), len([e for e in timing._events if e[0] == 'compile']) - before
+    def test_one_build(self):
+        self.assertEqual(self._improve(['MFoo()', 'MBar()']), (['MBar()', 'MFoo()'], [], 1))
+        header = self._read('include', 'names.h')
+        self.assertTrue('int MFoo(mjob_t * Job);\nint MBar(mrsv_t * Rsv);\n' in header, header)
+        self.assertEqual(self._read('src', 'names.c'), _names_tree['src/names.c'])
+        self.assertTrue(self._read(const_fix.accepted_patch_log).startswith('# param names\n'))
+    def test_bisect(self):
+        kept, rejected, builds = self._improve(['MFoo()', 'MBar()', 'MBad()', 'MUnnamed()'])
+        self.assertEqual((kept, rejected), (['MBar()', 'MFoo()', 'MUnnamed()'], ['MBad()']))
+        self.assertTrue(builds > 1)
+        header = self._read('include', 'names.h')
+        self.assertTrue('int MBad(mnode_t *);\n' in header, header)
+        self.assertTrue('int MFoo(mjob_t * Job);\n' in header, header)
+    def test_unnamed_in_definition(self):
+        self.assertEqual(self._improve(['MUnnamed()']), (['MUnnamed()'], [], 1))
+        self.assertTrue('int MUnnamed(int Count, char * Name);\n' in self._read('include', 'names.h'))
+        # The definition doesn't use it, so it stays unnamed.
+        self.assertEqual(self._read('src', 'names.c'), _names_tree['src/names.c'])
+    def test_overloads_left_alone(self):
+        self.assertEqual(self._improve(['MOver()']), ([], [], 0))
+        for rel in ('include/over1.h', 'include/over2.h', 'src/names.c'):
+            self.assertEqual(self._read(*rel.split('/')), _names_tree[rel])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import os, shutil, socket, subprocess, sys, tempfile, time, unittest
+
+import constd, synthcode
+
+_here = os.path.dirname(os.path.abspath(__file__))
+
+_runner = '''
+import os, sys
+sys.path.insert(0, %(here)r)
+import benchmark, const_fix, constd
+root = sys.argv[1]
+benchmark.configure_const_fix(root, %(html)r, %(logs)r)
+constd.poll_secs = 0.2
+sys.exit(constd.serve(root))
+'''
+
+class DaemonTest(unittest.TestCase):
+    def setUp(self):
+        self.scratch = tempfile.mkdtemp()
+        self.root = os.path.join(self.scratch, 'tree')
+        html = os.path.join(self.scratch, 'html')
+        self.funcs = synthcode.generate(self.root, modules=2, funcs_per_module=4, html_folder=html)
+        runner = os.path.join(self.scratch, 'run.py')
+        with open(runner, 'w') as f:
+            f.write(_runner % {'here': _here, 'html': html, 'logs': self.scratch})
+        env = dict(os.environ, FAKECC_TU_SECS='0', FAKECC_TEST_SECS='0')
+        self.log = open(os.path.join(self.scratch, 'daemon.log'), 'w')
+        self.daemon = subprocess.Popen([sys.executable, runner, self.root], stdout=self.log, stderr=subprocess.STDOUT, env=env)
+        for i in range(300):
+            try:
+                self.status = constd.request(self.root, {'cmd': 'status'})
+                break
+            except socket.error:
+                self.assertEqual(self.daemon.poll(), None)
+                time.sleep(0.1)
+    def tearDown(self):
+        if self.daemon.poll() is None:
+            self.daemon.kill()
+            self.daemon.wait()
+        self.log.close()
+        shutil.rmtree(self.scratch)
+    def test_edit_then_check(self):
+        self.assertTrue(self.status['functions'] > 0)
+        self.assertEqual(self.status['touched'], [])
+        module = self.funcs[0].module
+        with open(os.path.join(self.root, 'src', 'msyn_%s.c' % module), 'a') as f:
+            f.write('\n/* edited */\n')
+        reply = constd.request(self.root, {'cmd': 'analyze', 'funcs': []})
+        names = sorted([result['func'] for result in reply['results']])
+        self.assertEqual(names, sorted([f.name + '()' for f in self.funcs if f.module == module]))
+        for result in reply['results']:
+            self.assertTrue(result['prototype'].startswith('int '))
+        func = names[0]
+        reply = constd.request(self.root, {'cmd': 'check', 'funcs': [func[:-2]]})
+        self.assertEqual([result['func'] for result in reply['results']], [func])
+        self.assertTrue('tags' in reply['results'][0], reply)
+        status = constd.request(self.root, {'cmd': 'status'})
+        self.assertFalse(status['dirty'])
+        self.assertFalse(func in status['touched'])
+        self.assertEqual(constd.request(self.root, {'cmd': 'stop'}), {'stopped': True})
+        self.assertEqual(self.daemon.wait(), 0)
+        self.assertFalse(os.path.exists(constd.socket_path(self.root)))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+'''
+Run a coordinator and two workers on localhost, against a synthetic tree
+built with fakecc, and check that every function gets finished and the
+coordinator's tree still compiles.
+'''
+import os, shutil, socket, subprocess, sys, tempfile, time, unittest
+
+import distrib, synthcode
+
+_here = os.path.dirname(os.path.abspath(__file__))
+
+_runner = '''
+import os, sys
+sys.path.insert(0, %(here)r)
+import benchmark, distrib
+mode, root, port = sys.argv[1], sys.argv[2], int(sys.argv[3])
+logs = root + '-logs'
+os.makedirs(logs)
+benchmark.configure_const_fix(root, %(html)r, logs)
+if mode == 'coordinator':
+    distrib.run_coordinator(root, port)
+else:
+    distrib.run_worker('127.0.0.1:%%d' %% port, root, mode)
+'''
+
+def _free_port():
+    s = socket.socket()
+    s.bind(('127.0.0.1', 0))
+    port = s.getsockname()[1]
+    s.close()
+    return port
+
+def _git(root, *args):
+    subprocess.check_call(['git', '-c', 'user.name=test', '-c', 'user.email=test@localhost'] + list(args),
+        cwd=root, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+class DistribOnOneBoxTest(unittest.TestCase):
+    def setUp(self):
+        self.scratch = tempfile.mkdtemp()
+        self.html = os.path.join(self.scratch, 'html')
+        self.main = os.path.join(self.scratch, 'main')
+        self.funcs = synthcode.generate(self.main, modules=2, funcs_per_module=4, html_folder=self.html)
+        with open(os.path.join(self.main, '.gitignore'), 'w') as f:
+            f.write('build/\n')
+        _git(self.main, 'init', '-q')
+        _git(self.main, 'add', '-A')
+        _git(self.main, 'commit', '-qm', 'synthetic tree')
+        for name in ('w1', 'w2'):
+            _git(self.scratch, 'clone', '-q', self.main, name)
+        self.runner = os.path.join(self.scratch, 'run.py')
+        with open(self.runner, 'w') as f:
+            f.write(_runner % {'here': _here, 'html': self.html})
+        self.env = dict(os.environ, FAKECC_TU_SECS='0', FAKECC_TEST_SECS='0')
+    def tearDown(self):
+        shutil.rmtree(self.scratch)
+    def _start(self, mode, root, port):
+        log = open(os.path.join(self.scratch, mode + '.log'), 'w')
+        return subprocess.Popen([sys.executable, self.runner, mode, root, str(port)],
+            stdout=log, stderr=subprocess.STDOUT, env=self.env)
+    def _log(self, mode):
+        with open(os.path.join(self.scratch, mode + '.log')) as f:
+            return f.read()
+    def test_coordinator_and_two_workers(self):
+        port = _free_port()
+        coordinator = self._start('coordinator', self.main, port)
+        # Workers retry nothing, so let the coordinator get listening first.
+        for i in range(100):
+            if 'Coordinating' in self._log('coordinator'):
+                break
+            coordinator.poll()
+            self.assertEqual(coordinator.returncode, None, self._log('coordinator'))
+            time.sleep(0.1)
+        workers = [self._start(name, os.path.join(self.scratch, name), port) for name in ('w1', 'w2')]
+        for w in workers:
+            self.assertEqual(w.wait(), 0)
+        self.assertEqual(coordinator.wait(), 0, self._log('coordinator'))
+        log = self._log('coordinator')
+        self.assertTrue('w1 joined.' in log and 'w2 joined.' in log, log)
+        self.assertTrue('w1: ' in log and 'w2: ' in log, log)
+        with open(os.path.join(self.main, 'const-outcomes.txt')) as f:
+            outcomes = f.read()
+        for func in self.funcs:
+            self.assertTrue(func.name + '()' in outcomes, func.name)
+        # At least one param became const, and the merged tree still builds.
+        diff = subprocess.check_output(['git', 'diff'], cwd=self.main)
+        self.assertTrue(b'const' in diff)
+        self.assertEqual(subprocess.call([sys.executable, os.path.join(_here, 'fakecc.py'), 'compile', self.main],
+            stdout=subprocess.PIPE, env=self.env), 0)
+        # A worker's history is the base commit plus one commit per synced patch.
+        base = distrib.sync_state(os.path.join(self.scratch, 'w1'))[0]
+        self.assertEqual(base, distrib._git(self.main, ['rev-parse', 'HEAD'])[1].strip())
+
+if __name__ == '__main__':
+    unittest.main()
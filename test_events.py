@@ -0,0 +1,110 @@
+import os, shutil, sys, tempfile, unittest
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+import benchmark, const_fix, events, runstore, synthcode
+
+class EventTest(unittest.TestCase):
+    def test_as_dict(self):
+        event = events.FunctionFinished('MFoo()', '1 --> int MFoo(char const * s)', 'int MFoo(char const * s)')
+        self.assertEqual(event.as_dict(), {'event': 'FunctionFinished', 'func': 'MFoo()',
+            'tags': '1 --> int MFoo(char const * s)', 'signature': 'int MFoo(char const * s)'})
+    def test_subscribe(self):
+        seen = []
+        events.subscribe(seen.append)
+        try:
+            events.emit(events.RunFinished(3, 1.5))
+        finally:
+            events.unsubscribe(seen.append)
+        self.assertEqual([(e.finished, e.elapsed) for e in seen], [(3, 1.5)])
+
+    def test_console(self):
+        saved = sys.stdout
+        sys.stdout = out = StringIO()
+        try:
+            events.print_event(events.CompileFinished('MFoo()', False, False, '/tmp/make.log'))
+            events.print_event(events.TestsSkipped('MFoo()', 'object code unchanged'))
+            events.print_event(events.RollbackFinished('MFoo()', 'rebuilt'))
+        finally:
+            sys.stdout = saved
+        self.assertEqual(out.getvalue(), '  Clean compile failed. See /tmp/make.log for details.\n'
+            '  Object code is unchanged; skipping tests.\n')
+
+class StreamTest(unittest.TestCase):
+    def setUp(self):
+        self.scratch = tempfile.mkdtemp()
+        self.root = os.path.join(self.scratch, 'tree')
+        html = os.path.join(self.scratch, 'html')
+        self.funcs = synthcode.generate(self.root, modules=2, funcs_per_module=5, html_folder=html)
+        benchmark.configure_const_fix(self.root, html, self.scratch)
+        self.saved = (const_fix.metrics_file, const_fix.trace_file, const_fix.outcomes_log, sys.stdout,
+            os.environ.get('FAKECC_TU_SECS'), os.environ.get('FAKECC_TEST_SECS'))
+        const_fix.metrics_file = None
+        const_fix.trace_file = None
+        os.environ['FAKECC_TU_SECS'] = os.environ['FAKECC_TEST_SECS'] = '0'
+        events.unsubscribe(events.print_event)
+        sys.stdout = open(os.devnull, 'w')
+    def tearDown(self):
+        sys.stdout.close()
+        events.subscribe(events.print_event)
+        (const_fix.metrics_file, const_fix.trace_file, const_fix.outcomes_log, sys.stdout, tu, test) = self.saved
+        for name, value in (('FAKECC_TU_SECS', tu), ('FAKECC_TEST_SECS', test)):
+            if value is None:
+                del os.environ[name]
+            else:
+                os.environ[name] = value
+        const_fix._prototype_index = const_fix._const_facts = const_fix._scheduler = None
+        shutil.rmtree(self.scratch)
+    def test_whole_run(self):
+        stream = list(const_fix.iter_fix_prototypes(self.root))
+        # The codebase is proven clean before the run proper starts.
+        first = [i for i, e in enumerate(stream) if isinstance(e, events.RunStarted)][0]
+        self.assertEqual([e.__class__ for e in stream[:first]],
+            [events.CompileStarted, events.CompileFinished, events.TestsStarted, events.TestsFinished])
+        self.assertEqual([e.func for e in stream[:first]], [None] * first)
+        self.assertTrue(isinstance(stream[-1], events.RunFinished))
+        started = [e.func for e in stream if isinstance(e, events.FunctionStarted)]
+        finished = [e.func for e in stream if isinstance(e, events.FunctionFinished)]
+        self.assertEqual(started, finished)
+        # Functions that cut_noise settled before the first pass have no events.
+        self.assertTrue(finished and set(finished).issubset([f.name + '()' for f in self.funcs]))
+        self.assertEqual(stream[-1].finished, len(finished))
+        tried = [e for e in stream if isinstance(e, events.ExperimentStarted)]
+        results = [e for e in stream if isinstance(e, events.ExperimentFinished)]
+        self.assertEqual([(e.func, e.params) for e in tried], [(e.func, e.params) for e in results])
+        accepted = [e for e in results if e.accepted]
+        self.assertTrue(accepted)
+        for e in accepted:
+            self.assertTrue('const' in e.signature)
+            self.assertTrue(e.compile_secs is not None)
+        # Builds, tests and rollbacks are in the stream too, not just on the console.
+        def count(kind):
+            return len([e for e in stream if isinstance(e, kind)])
+        self.assertTrue(count(events.CompileStarted) > 0)
+        self.assertEqual(count(events.CompileStarted), count(events.CompileFinished))
+        self.assertEqual(count(events.TestsStarted), count(events.TestsFinished))
+        self.assertEqual(count(events.ChangeKept), len([e for e in accepted if not e.cached]))
+        rejected = [e for e in results if not e.accepted and not e.cached]
+        self.assertEqual(count(events.RollbackStarted), len(rejected))
+        self.assertEqual(count(events.RollbackFinished), len(rejected))
+        for e in stream:
+            if isinstance(e, events.FunctionFinished) and e.signature:
+                self.assertTrue(e.func[:-2] in e.signature)
+    def test_stop_early(self):
+        count = 0
+        noise = None
+        for event in const_fix.iter_fix_prototypes(self.root):
+            if isinstance(event, events.RunStarted):
+                noise = len(self.funcs) - event.functions
+            if isinstance(event, events.FunctionFinished):
+                count += 1
+                if count == 2:
+                    break
+        store = runstore.RunStore(os.path.join(self.root, const_fix.outcomes_db))
+        self.assertEqual(len(store.finished_functions()), count + noise)
+        store.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+import os, shutil, tempfile, unittest
+
+import metrics
+
+class MetricsTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.saved = (dict(metrics._values), dict(metrics._sums), metrics._fpath, metrics._last_write)
+        metrics._values.clear()
+        metrics._sums.clear()
+    def tearDown(self):
+        metrics._values.clear()
+        metrics._sums.clear()
+        values, sums, metrics._fpath, metrics._last_write = self.saved
+        metrics._values.update(values)
+        metrics._sums.update(sums)
+        shutil.rmtree(self.folder)
+    def test_render(self):
+        metrics.inc('experiments_attempted_total')
+        metrics.inc('experiments_attempted_total', 2)
+        metrics.inc('builds_avoided_total', reason='cache')
+        metrics.inc('builds_avoided_total', 3, reason='batch')
+        metrics.set_gauge('functions_remaining', 7)
+        self.assertEqual(metrics.render(),
+            '# HELP const_fix_builds_avoided_total Builds skipped, by reason.\n'
+            '# TYPE const_fix_builds_avoided_total counter\n'
+            'const_fix_builds_avoided_total{reason="batch"} 3.0\n'
+            'const_fix_builds_avoided_total{reason="cache"} 1.0\n'
+            '# HELP const_fix_experiments_attempted_total Const changes tried, whether built or answered from cache.\n'
+            '# TYPE const_fix_experiments_attempted_total counter\n'
+            'const_fix_experiments_attempted_total 3.0\n'
+            '# HELP const_fix_functions_remaining Functions still in the call graph.\n'
+            '# TYPE const_fix_functions_remaining gauge\n'
+            'const_fix_functions_remaining 7.0\n')
+    def test_running_average(self):
+        metrics.observe('compile_seconds_average', 2)
+        metrics.observe('compile_seconds_average', 4)
+        self.assertEqual(metrics.get('compile_seconds_average'), 3.0)
+    def test_undeclared(self):
+        self.assertRaises(KeyError, metrics.inc, 'no_such_metric')
+    def test_write(self):
+        fpath = os.path.join(self.folder, 'const-metrics.prom')
+        metrics.inc('functions_finished_total')
+        metrics.start(fpath)
+        with open(fpath) as f:
+            txt = f.read()
+        self.assertTrue('\nconst_fix_functions_finished_total 1.0\n' in txt)
+        self.assertTrue('\nconst_fix_last_update_timestamp_seconds ' in txt)
+        self.assertFalse(os.path.exists(fpath + '.tmp'))
+        # Too soon to write again.
+        metrics.inc('functions_finished_total')
+        metrics.maybe_write()
+        with open(fpath) as f:
+            self.assertEqual(f.read(), txt)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import unittest
+
+import mutation
+from param import Param
+
+def _reasons(body, decls=('mjob_t *J',), return_type='', callee_params=None, forwards=None):
+    params = [Param(0, decl) for decl in decls]
+    return mutation.find_disqualified_params(body, 0, len(body), params, return_type, callee_params, forwards)
+
+class DisqualifiedTest(unittest.TestCase):
+    '''Uses that prove a param can't be const.'''
+    def assertReason(self, body, reason, decls=('mjob_t *J',), **kwargs):
+        self.assertEqual(_reasons(body, decls, **kwargs), {0: reason})
+    def test_member_assigned(self):
+        self.assertReason('{ J->State = 1; }', 'member assigned')
+    def test_member_of_member_assigned(self):
+        self.assertReason('{ J->Req.Size += 2; }', 'member assigned')
+    def test_member_incremented(self):
+        self.assertReason('{ J->Count++; }', 'member assigned')
+        self.assertReason('{ ++J->Count; }', 'member assigned')
+    def test_array_index(self):
+        self.assertReason('{ Buf[i + 1] = 0; }', 'assigned through array index', ('char *Buf',))
+    def test_dereference(self):
+        self.assertReason('{ *Buf = 0; }', 'assigned through dereference', ('char *Buf',))
+        self.assertReason('{ x = ++*Buf; }', 'assigned through dereference', ('char *Buf',))
+        self.assertReason('{ *Buf++ = c; }', 'assigned through dereference', ('char *Buf',))
+    def test_reference_assigned(self):
+        self.assertReason('{ R.Flags |= 4; }', 'assigned', ('mrsv_t &R',))
+    def test_address_taken(self):
+        self.assertReason('{ mjob_t **JP = &J; }', 'address taken')
+    def test_casts(self):
+        self.assertReason('{ mjob_t *X = (mjob_t *)J; }', 'cast to non-const')
+        self.assertReason('{ X = static_cast<mjob_t *>(J); }', 'cast to non-const')
+    def test_returned(self):
+        self.assertReason('{ return J; }', 'returned as non-const', return_type='mjob_t *')
+    def test_passed_to_libc(self):
+        self.assertReason('{ strcpy(Buf, "x"); }', 'passed to non-const param 1 of strcpy', ('char *Buf',))
+    def test_passed_to_known_callee(self):
+        lookup = {'MJobSet': ['mjob_t *', 'int']}.get
+        self.assertReason('{ MJobSet(J, 1); }', 'passed to non-const param 1 of MJobSet', callee_params=lookup)
+    def test_only_the_guilty_param(self):
+        self.assertEqual(_reasons('{ N->State = J->State; }', ('mjob_t *J', 'mnode_t *N')), {1: 'member assigned'})
+
+class NotDisqualifiedTest(unittest.TestCase):
+    '''Uses that leave the param a candidate.'''
+    def assertClean(self, body, decls=('mjob_t *J',), **kwargs):
+        self.assertEqual(_reasons(body, decls, **kwargs), {})
+    def test_reads(self):
+        self.assertClean('{ if (J->State == 1) return J->Count; x = J[0].Size; }')
+    def test_postfix_increment_then_multiply(self):
+        self.assertClean('{ x = i++ * J[0]; }', ('int *J',))
+        self.assertClean('{ x = i-- * *J; }', ('mjob_t *J',))
+    def test_binary_and_multiply(self):
+        self.assertClean('{ x = a * Buf[0]; y = a & *Buf; }', ('char *Buf',))
+    def test_write_through_pointer_member(self):
+        # The param's const doesn't cover what its members point to.
+        self.assertClean('{ J->Req->Size = 1; J->Buf[0] = 0; }')
+    def test_other_names(self):
+        self.assertClean('{ J2->State = 1; X.J = 1; Y->J = 2; mjob_t::J = 3; }')
+    def test_literals_comments_preprocessor(self):
+        self.assertClean('{ MDB(7, "J->State = 1 {"); /* J->State = 1; */ // *J = 0\n'
+            '#define SET(J) J->State = 1\n x = 1; }')
+    def test_passed_to_const_param(self):
+        lookup = {'MJobShow': ['mjob_t const *', 'int']}.get
+        self.assertClean('{ MJobShow(J, 1); strlen(Buf); }', ('mjob_t *J', 'char *Buf'), callee_params=lookup)
+    def test_unknown_callee(self):
+        self.assertClean('{ MSomething(J); }', callee_params=lambda name: None)
+    def test_returned_as_const(self):
+        self.assertClean('{ return J; }', return_type='mjob_t const *')
+    def test_by_value(self):
+        self.assertClean('{ Count = 0; Count++; }', ('int Count',))
+
+class ForwardsTest(unittest.TestCase):
+    def test_records_calls(self):
+        forwards = {}
+        _reasons('{ MJobShow(J, 1); MJobLog(x, J); if (J) { } }', forwards=forwards)
+        self.assertEqual(forwards, {0: [('MJobShow', 0), ('MJobLog', 1)]})
+
+if __name__ == '__main__':
+    unittest.main()
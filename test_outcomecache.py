@@ -0,0 +1,72 @@
+import os, shutil, sys, tempfile, unittest
+
+import outcomecache
+from prototype import PrototypeMap, find_prototypes_in_text
+
+_header = 'int MFoo(char *Name, mjob_t *J);\n'
+_impl = 'int MFoo(char *Name, mjob_t *J)\n{\n  return J->Count;\n}\n'
+
+class ExperimentKeyTest(unittest.TestCase):
+    def _key(self, header=_header, impl=_impl, param_idx='0', toolchain='tools'):
+        prototypes = PrototypeMap()
+        prototypes['x.h'] = find_prototypes_in_text('MFoo()', 'x.h', header)
+        prototypes['x.c'] = find_prototypes_in_text('MFoo()', 'x.c', impl)
+        return outcomecache.experiment_key('MFoo()', param_idx, prototypes.find_best(), prototypes, toolchain)
+    def test_stable(self):
+        self.assertEqual(self._key(), self._key())
+    def test_changes_with_inputs(self):
+        key = self._key()
+        self.assertNotEqual(self._key(param_idx='1'), key)
+        self.assertNotEqual(self._key(param_idx='0+1'), key)
+        self.assertNotEqual(self._key(toolchain='other tools'), key)
+        self.assertNotEqual(self._key(impl=_impl.replace('J->Count', 'J->Count++')), key)
+        self.assertNotEqual(self._key(header=_header.replace('char *', 'char const *')), key)
+
+class ToolchainTest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.saved = outcomecache.compiler_version_cmd
+        self.version = os.path.join(self.root, 'version.txt')
+        self._write(self.version, 'cc 1.0')
+        outcomecache.compiler_version_cmd = [sys.executable, '-c', 'import sys; sys.stdout.write(open(sys.argv[1]).read())', self.version]
+        self._write(os.path.join(self.root, 'Makefile'), 'CFLAGS = -O2\n')
+    def tearDown(self):
+        outcomecache.compiler_version_cmd = self.saved
+        shutil.rmtree(self.root)
+    def _write(self, fpath, txt):
+        with open(fpath, 'w') as f:
+            f.write(txt)
+    def _fingerprint(self):
+        return outcomecache.toolchain_fingerprint(self.root, ['make -j%(jobs)d'])
+    def test_changes_with_toolchain(self):
+        before = self._fingerprint()
+        self.assertEqual(self._fingerprint(), before)
+        self.assertNotEqual(outcomecache.toolchain_fingerprint(self.root, ['make -j%(jobs)d V=1']), before)
+        self._write(os.path.join(self.root, 'Makefile'), 'CFLAGS = -O2 -Werror\n')
+        flags = self._fingerprint()
+        self.assertNotEqual(flags, before)
+        self._write(self.version, 'cc 2.0')
+        self.assertNotEqual(self._fingerprint(), flags)
+    def test_no_compiler(self):
+        outcomecache.compiler_version_cmd = [os.path.join(self.root, 'no-such-cc')]
+        self.assertTrue(self._fingerprint())
+
+class ExperimentCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.fpath = os.path.join(self.folder, 'experiments.txt')
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+    def test_kept_across_runs(self):
+        cache = outcomecache.ExperimentCache(self.fpath)
+        self.assertEqual(cache.lookup('k'), None)
+        cache.record('k', outcomecache.REJECTED)
+        cache.record('k', outcomecache.ACCEPTED)
+        cache.record('other', outcomecache.REJECTED)
+        cache = outcomecache.ExperimentCache(self.fpath)
+        # The latest outcome wins.
+        self.assertEqual(cache.lookup('k'), outcomecache.ACCEPTED)
+        self.assertEqual(cache.lookup('other'), outcomecache.REJECTED)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+import os, shutil, sys, tempfile, threading, unittest
+
+import benchmark, const_fix, outcomecache, resultstore, synthcode, timing
+
+class _Service:
+    def __init__(self, fpath):
+        self.server = resultstore.make_server(fpath, 0)
+        self.url = 'http://127.0.0.1:%d' % self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+class HttpResultStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.scratch = tempfile.mkdtemp()
+        self.fpath = os.path.join(self.scratch, 'shared.txt')
+        self.service = _Service(self.fpath)
+        self.saved = sys.stdout
+        sys.stdout = open(os.devnull, 'w')
+    def tearDown(self):
+        sys.stdout.close()
+        sys.stdout = self.saved
+        self.service.stop()
+        shutil.rmtree(self.scratch)
+    def test_shared_between_clients(self):
+        key = 'MSNL::SetCount():0+2:abc/def:123?:tool chain'
+        resultstore.HttpResultStore(self.service.url).record(key, outcomecache.REJECTED)
+        other = resultstore.HttpResultStore(self.service.url)
+        self.assertEqual(other.lookup(key), outcomecache.REJECTED)
+        self.assertEqual(other.lookup('MFoo():0:x:y:z'), None)
+        self.assertFalse(other.unreachable)
+    def test_kept_across_restarts(self):
+        resultstore.HttpResultStore(self.service.url).record('k', outcomecache.ACCEPTED)
+        self.service.stop()
+        self.service = _Service(self.fpath)
+        self.assertEqual(resultstore.HttpResultStore(self.service.url).lookup('k'), outcomecache.ACCEPTED)
+    def test_unreachable(self):
+        self.service.stop()
+        store = resultstore.HttpResultStore(self.service.url, timeout=1)
+        self.assertEqual(store.lookup('k'), None)
+        self.assertTrue(store.unreachable)
+        store.record('k', outcomecache.ACCEPTED)
+        self.service = _Service(self.fpath)
+    def test_tiered_copies_remote_hits(self):
+        resultstore.HttpResultStore(self.service.url).record('k', outcomecache.ACCEPTED)
+        local = outcomecache.ExperimentCache(os.path.join(self.scratch, 'local.txt'))
+        store = resultstore.TieredStore(local, resultstore.HttpResultStore(self.service.url))
+        self.assertEqual(store.lookup('k'), outcomecache.ACCEPTED)
+        self.assertEqual(local.lookup('k'), outcomecache.ACCEPTED)
+
+class SharedRunTest(unittest.TestCase):
+    '''A second engineer's run of the same code builds nothing the first already tried.'''
+    def setUp(self):
+        self.scratch = tempfile.mkdtemp()
+        self.root = os.path.join(self.scratch, 'tree')
+        self.html = os.path.join(self.scratch, 'html')
+        self.service = _Service(os.path.join(self.scratch, 'shared.txt'))
+        self.saved = (const_fix.outcomes_log, const_fix.metrics_file, const_fix.trace_file, const_fix.result_store_url,
+            sys.stdout, os.environ.get('FAKECC_TU_SECS'), os.environ.get('FAKECC_TEST_SECS'))
+        const_fix.metrics_file = const_fix.trace_file = None
+        const_fix.result_store_url = self.service.url
+        os.environ['FAKECC_TU_SECS'] = os.environ['FAKECC_TEST_SECS'] = '0'
+        sys.stdout = open(os.devnull, 'w')
+    def tearDown(self):
+        sys.stdout.close()
+        (const_fix.outcomes_log, const_fix.metrics_file, const_fix.trace_file, const_fix.result_store_url,
+            sys.stdout, tu, test) = self.saved
+        for name, value in (('FAKECC_TU_SECS', tu), ('FAKECC_TEST_SECS', test)):
+            if value is None:
+                del os.environ[name]
+            else:
+                os.environ[name] = value
+        const_fix._const_facts = const_fix._scheduler = None
+        self.service.stop()
+        shutil.rmtree(self.scratch)
+    def _run(self):
+        '''Run on a fresh copy of the tree, with no local state; return how many builds it took.'''
+        if os.path.isdir(self.root):
+            shutil.rmtree(self.root)
+        synthcode.generate(self.root, modules=2, funcs_per_module=5, html_folder=self.html)
+        benchmark.configure_const_fix(self.root, self.html, self.scratch)
+        before = len([e for e in timing._events if e[0] == 'compile'])
+        const_fix.fix_prototypes(self.root)
+        with open(os.path.join(self.root, const_fix.outcomes_log)) as f:
+            outcomes = f.read()
+        return len([e for e in timing._events if e[0] == 'compile']) - before, outcomes
+    def test_second_run_reuses_outcomes(self):
+        first_builds, first_outcomes = self._run()
+        second_builds, second_outcomes = self._run()
+        self.assertTrue(first_builds > 1)
+        # Only the up-front verification build.
+        self.assertEqual(second_builds, 1)
+        self.assertEqual(sorted(first_outcomes.splitlines()), sorted(second_outcomes.splitlines()))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,31 @@
+import unittest
+
+import runstore
+
+class SplitTagsTest(unittest.TestCase):
+    def test_labels_only(self):
+        self.assertEqual(runstore.split_tags('ORPHAN CONST_IRRELEVANT '), ['CONST_IRRELEVANT', 'ORPHAN'])
+    def test_signature_types_are_not_tags(self):
+        self.assertEqual(runstore.split_tags('ORPHAN 1 --> int MFoo(FILE * fp, MSNL const * N)'), ['ORPHAN'])
+    def test_params_are_not_tags(self):
+        self.assertEqual(runstore.split_tags('OBNOXIOUS_CONST: FILE const * fp OBNOXIOUS_CONST: int const n 0'),
+            ['OBNOXIOUS_CONST'])
+
+class FunctionsWithTagTest(unittest.TestCase):
+    def test_lookup(self):
+        store = runstore.RunStore(':memory:')
+        store.record_function('MFoo()', 'ORPHAN 1 --> int MFoo(FILE * fp)')
+        store.record_function('MBar()', 'CONST_IRRELEVANT ')
+        self.assertEqual(store.functions_with_tag('ORPHAN'), ['MFoo()'])
+        self.assertEqual(store.functions_with_tag('FILE'), [])
+    def test_forget(self):
+        store = runstore.RunStore(':memory:')
+        store.record_function('MFoo()', 'ORPHAN 1 --> int MFoo(FILE * fp)')
+        store.record_param('MFoo()', 0, 'ACCEPTED')
+        store.forget_function('MFoo()')
+        self.assertEqual(store.finished_functions(), [])
+        self.assertEqual(store.param_outcomes('MFoo()'), {})
+        self.assertEqual(store.functions_with_tag('ORPHAN'), [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import os, shutil, tempfile, unittest
+
+import safechange, spanedit
+
+class JournalTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.log = os.path.join(self.folder, 'undo.journal')
+        safechange.open_journal(self.log)
+        self.fpaths = []
+        for i in range(3):
+            fpath = os.path.join(self.folder, 'f%d.c' % i)
+            with open(fpath, 'w') as f:
+                f.write('int MFoo%d(char *s, mjob_t *J);\n' % i)
+            os.utime(fpath, (1000000 + i, 1000000 + i))
+            self.fpaths.append(fpath)
+    def tearDown(self):
+        safechange.forget_edits()
+        safechange.journal_path = None
+        shutil.rmtree(self.folder)
+    def _read(self, fpath):
+        with open(fpath) as f:
+            return f.read()
+    def _edit_all(self):
+        '''Make s const in every file, the way rewrite_prototypes does.'''
+        changes = []
+        for fpath in self.fpaths:
+            txt = self._read(fpath)
+            edits = spanedit.EditList(txt)
+            i = txt.index('char')
+            edits.replace(i, i + 4, 'char const')
+            changes.append((fpath, txt, edits.apply(), edits.inverse))
+        safechange.journal_edits(changes)
+        for fpath, txt, new_txt, inverse in changes:
+            spanedit.write_atomically(fpath, new_txt)
+        return changes
+    def test_restore(self):
+        changes = self._edit_all()
+        self.assertTrue(os.path.isfile(self.log))
+        mtimes = safechange.restore_files(self.fpaths)
+        self.assertEqual(sorted(mtimes), sorted(self.fpaths))
+        for fpath, txt, new_txt, inverse in changes:
+            self.assertEqual(self._read(fpath), txt)
+            self.assertEqual(mtimes[fpath], 1000000 + self.fpaths.index(fpath))
+            # Left fresh until the caller knows the artifacts are back.
+            self.assertTrue(os.stat(fpath).st_mtime > mtimes[fpath])
+        self.assertFalse(os.path.exists(self.log))
+    def test_changed_behind_our_back(self):
+        self._edit_all()
+        with open(self.fpaths[1], 'a') as f:
+            f.write('/* someone else */\n')
+        mtimes = safechange.restore_files(self.fpaths)
+        self.assertEqual(sorted(mtimes), sorted([self.fpaths[0], self.fpaths[2]]))
+        self.assertTrue(self._read(self.fpaths[1]).endswith('/* someone else */\n'))
+    def test_forget(self):
+        self._edit_all()
+        safechange.forget_edits()
+        self.assertEqual(safechange.restore_files(self.fpaths), {})
+        self.assertTrue('char const' in self._read(self.fpaths[0]))
+        self.assertFalse(os.path.exists(self.log))
+    def test_recover_after_crash(self):
+        changes = self._edit_all()
+        # A new run finds the log left behind.
+        safechange._journal.clear()
+        self.assertEqual(safechange.open_journal(self.log), [])
+        for fpath, txt, new_txt, inverse in changes:
+            self.assertEqual(self._read(fpath), txt)
+        self.assertFalse(os.path.exists(self.log))
+    def test_failed_recovery_keeps_log(self):
+        self._edit_all()
+        safechange._journal.clear()
+        with open(self.fpaths[2], 'w') as f:
+            f.write('rewritten by hand\n')
+        self.assertEqual(safechange.open_journal(self.log), [self.fpaths[2]])
+        self.assertTrue(os.path.isfile(self.log))
+        self.assertFalse('char const' in self._read(self.fpaths[0]))
+
+if __name__ == '__main__':
+    unittest.main()
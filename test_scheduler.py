@@ -0,0 +1,74 @@
+import os, shutil, tempfile, unittest
+
+import outcomecache, runstore, scheduler
+
+_files = {
+    'include/common.h': '#include "wide.h"\n',
+    'include/wide.h': 'int MWide(mjob_t *J);\n',
+    'include/narrow.h': 'int MNarrow(mjob_t *J);\n',
+    'src/s1.c': '#include "common.h"\n#include "narrow.h"\n',
+    'src/s2.c': '#include "common.h"\n',
+    'src/s3.c': '#include <common.h>\n',
+}
+
+class _Callgraph:
+    def __init__(self, by_caller, params):
+        self.by_caller = by_caller
+        self.by_callee = {}
+        for caller, callees in by_caller.items():
+            for callee in callees:
+                self.by_callee.setdefault(callee, []).append(caller)
+        self.params = params
+    def get_params(self, func):
+        return self.params.get(func)
+
+class SchedulerTest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        for rel, txt in _files.items():
+            fpath = os.path.join(self.root, rel)
+            if not os.path.isdir(os.path.dirname(fpath)):
+                os.makedirs(os.path.dirname(fpath))
+            with open(fpath, 'w') as f:
+                f.write(txt)
+        funcs = ['MWide()', 'MNarrow()', 'MLocal()', 'MUnblocks()']
+        by_caller = dict([(func, []) for func in funcs])
+        by_caller['MCaller()'] = ['MUnblocks()']
+        params = dict([(func, ['mjob_t *']) for func in funcs])
+        self.cg = _Callgraph(by_caller, params)
+    def tearDown(self):
+        shutil.rmtree(self.root)
+    def test_rebuild_count(self):
+        index = scheduler.IncludeIndex(self.root)
+        # Through common.h.
+        self.assertEqual(index.rebuild_count('MWide()'), 4)
+        self.assertEqual(index.rebuild_count('MNarrow()'), 2)
+        self.assertEqual(index.rebuild_count('MLocal()'), 1)
+    def test_order_by_payoff_per_second(self):
+        s = scheduler.Scheduler(self.root, self.cg)
+        self.assertEqual(s.cost('MWide()'), 4 * scheduler.default_tu_secs + scheduler.default_test_secs)
+        self.assertEqual(s.payoff('MUnblocks()'), scheduler.default_accept_rate + scheduler.unblock_weight)
+        self.assertEqual(s.order(['MWide()', 'MNarrow()', 'MLocal()', 'MUnblocks()']),
+            ['MUnblocks()', 'MLocal()', 'MNarrow()', 'MWide()'])
+    def test_no_candidates_still_costs_one_experiment(self):
+        self.cg.params['MLocal()'] = ['mjob_t const *', 'int']
+        s = scheduler.Scheduler(self.root, self.cg)
+        self.assertEqual(s.payoff('MLocal()'), 0)
+        self.assertEqual(s.cost('MLocal()'), scheduler.default_tu_secs + scheduler.default_test_secs)
+        self.assertEqual(s.order(['MLocal()', 'MWide()']), ['MWide()', 'MLocal()'])
+    def test_fit_to_timings(self):
+        store = runstore.RunStore(':memory:')
+        store.record_param('MNarrow()', 0, outcomecache.ACCEPTED, 20.0, 10.0)
+        store.record_param('MWide()', 0, outcomecache.REJECTED, 20.0, None)
+        store.record_param('MLocal()', 0, outcomecache.REJECTED)
+        s = scheduler.Scheduler(self.root, self.cg, store)
+        # 40 seconds over 2 + 4 rebuilt TUs; one test run.
+        self.assertAlmostEqual(s.secs_per_tu(), 40.0 / 6)
+        self.assertEqual(s.secs_per_test(), 10.0)
+        self.assertAlmostEqual(s.accept_rate, 1.0 / 3)
+        s.observe('MLocal()', 5.0, 20.0)
+        self.assertAlmostEqual(s.secs_per_tu(), 45.0 / 7)
+        self.assertEqual(s.secs_per_test(), 15.0)
+
+if __name__ == '__main__':
+    unittest.main()
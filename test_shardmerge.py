@@ -0,0 +1,138 @@
+import os, shutil, subprocess, sys, tempfile, unittest
+
+import const_fix, distrib, shardmerge, spanedit, synthcode
+
+_here = os.path.dirname(os.path.abspath(__file__))
+
+_runner = '''
+import os, sys
+sys.path.insert(0, %(here)r)
+import benchmark, const_fix
+root = sys.argv[1]
+os.makedirs(root + '-logs')
+benchmark.configure_const_fix(root, %(html)r, root + '-logs')
+const_fix.metrics_file = None
+const_fix.shard = const_fix.parse_shard(sys.argv[2])
+const_fix.fix_prototypes(root)
+'''
+
+class ShardTest(unittest.TestCase):
+    def tearDown(self):
+        const_fix.shard = None
+    def test_every_function_in_exactly_one_shard(self):
+        funcs = ['MSynMod%d%d()' % (m, i) for m in range(5) for i in range(20)]
+        counts = []
+        for i in range(1, 4):
+            const_fix.shard = (i, 3)
+            counts.append(len([func for func in funcs if const_fix.in_shard(func)]))
+        self.assertEqual(sum(counts), len(funcs))
+        self.assertTrue(min(counts) > 0)
+    def test_stable(self):
+        const_fix.shard = (2, 4)
+        self.assertEqual([const_fix.in_shard(f) for f in ('MJobStart()', 'MRsvCreate()')],
+            [const_fix.in_shard(f) for f in ('MJobStart()', 'MRsvCreate()')])
+    def test_parse(self):
+        self.assertEqual(const_fix.parse_shard('2/4'), (2, 4))
+        for bad in ('0/4', '5/4', '2', 'a/b'):
+            self.assertRaises(Exception, const_fix.parse_shard, bad)
+
+class SplitPatchLogTest(unittest.TestCase):
+    def test_split(self):
+        log = ('# MFoo()\n--- a/x.h\n+++ b/x.h\n@@ -1 +1 @@\n-# define X\n+int MFoo(char const *);\n'
+            '# param names\n--- a/y.h\n+++ b/y.h\n')
+        self.assertEqual(shardmerge.split_patch_log(log), [
+            ('MFoo()', '--- a/x.h\n+++ b/x.h\n@@ -1 +1 @@\n-# define X\n+int MFoo(char const *);\n'),
+            ('param names', '--- a/y.h\n+++ b/y.h\n')])
+
+_header = ('#ifdef MOAB_OLD\nint MFoo(char *s);\n#else\nint MBar(void);\n#endif\n'
+    '/* current */\nint MFoo(char *s);\nint MBaz(char *t);\n/* end */\n')
+
+class ApplyChangeTest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.fpath = os.path.join(self.root, 'x.h')
+        self._write(_header)
+        _git(self.root, 'init', '-q')
+        self.diff = spanedit.unified_diff(_header, _header.replace('char *s);\nint MBaz', 'char const *s);\nint MBaz'), 'x.h')
+    def tearDown(self):
+        shutil.rmtree(self.root)
+    def _write(self, txt):
+        with open(self.fpath, 'w') as f:
+            f.write(txt)
+    def _lines(self):
+        with open(self.fpath) as f:
+            return f.read().splitlines()
+    def test_neighbor_changed(self):
+        self._write(_header.replace('char *t', 'char const *t'))
+        self.assertFalse(distrib.apply_patch(self.root, self.diff))
+        self.assertTrue(shardmerge.apply_change(self.root, self.diff))
+        lines = self._lines()
+        self.assertEqual(lines[1], 'int MFoo(char *s);')
+        self.assertEqual(lines[6:8], ['int MFoo(char const *s);', 'int MBaz(char const *t);'])
+    def test_not_where_recorded(self):
+        # Another shard changed the declaration this change was made to; an
+        # identical one is still there, further up.
+        changed = _header.replace('char *s);\nint MBaz(char *t', 'mjob_t *J);\nint MBaz(char const *t')
+        self._write(changed)
+        self.assertFalse(shardmerge.apply_change(self.root, self.diff))
+        self.assertEqual(self._lines(), changed.splitlines())
+    def test_hunks(self):
+        self.assertEqual(list(shardmerge._hunks(self.diff)),
+            [('x.h', 7, ['int MFoo(char *s);'], ['int MFoo(char const *s);'])])
+
+def _git(root, *args):
+    subprocess.check_call(['git', '-c', 'user.name=test', '-c', 'user.email=test@localhost'] + list(args),
+        cwd=root, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+class ShardAndMergeTest(unittest.TestCase):
+    def setUp(self):
+        self.scratch = tempfile.mkdtemp()
+        self.html = os.path.join(self.scratch, 'html')
+        base = os.path.join(self.scratch, 'base')
+        self.funcs = synthcode.generate(base, modules=2, funcs_per_module=5, html_folder=self.html)
+        with open(os.path.join(base, '.gitignore'), 'w') as f:
+            f.write('build/\n')
+        _git(base, 'init', '-q')
+        _git(base, 'add', '-A')
+        _git(base, 'commit', '-qm', 'synthetic tree')
+        for name in ('s1', 's2', 'merged'):
+            _git(self.scratch, 'clone', '-q', base, name)
+        self.runner = os.path.join(self.scratch, 'run.py')
+        with open(self.runner, 'w') as f:
+            f.write(_runner % {'here': _here, 'html': self.html})
+        self.env = dict(os.environ, FAKECC_TU_SECS='0', FAKECC_TEST_SECS='0')
+    def tearDown(self):
+        shutil.rmtree(self.scratch)
+    def test_two_shards(self):
+        roots = [os.path.join(self.scratch, name) for name in ('s1', 's2')]
+        with open(os.devnull, 'w') as devnull:
+            for i, root in enumerate(roots):
+                self.assertEqual(subprocess.call([sys.executable, self.runner, root, '%d/2' % (i + 1)],
+                    stdout=devnull, stderr=devnull, env=self.env), 0)
+        merged = os.path.join(self.scratch, 'merged')
+        with open(os.devnull, 'w') as devnull:
+            saved = sys.stdout
+            sys.stdout = devnull
+            try:
+                exitcode = shardmerge.main([merged] + roots + ['--apply'])
+            finally:
+                sys.stdout = saved
+        self.assertEqual(exitcode, 0)
+        with open(os.path.join(merged, const_fix.outcomes_log)) as f:
+            outcomes = f.read()
+        for func in self.funcs:
+            self.assertTrue(func.name + '()' in outcomes, func.name)
+        # Each shard only recorded its own functions.
+        for i, root in enumerate(roots):
+            with open(os.path.join(root, const_fix.outcomes_log)) as f:
+                names = [line.split('\t')[0] for line in f]
+            const_fix.shard = (i + 1, 2)
+            self.assertTrue(names and all([const_fix.in_shard(name) for name in names]))
+        const_fix.shard = None
+        diff = subprocess.check_output(['git', 'diff'], cwd=merged)
+        self.assertTrue(b'const' in diff)
+        self.assertEqual(subprocess.call([sys.executable, os.path.join(_here, 'fakecc.py'), 'compile', merged],
+            stdout=subprocess.PIPE, env=self.env), 0)
+
+if __name__ == '__main__':
+    unittest.main()
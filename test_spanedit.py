@@ -0,0 +1,42 @@
+import unittest
+
+import spanedit
+
+class EditListTest(unittest.TestCase):
+    def test_apply_any_order(self):
+        edits = spanedit.EditList('int MFoo(char *s, mjob_t *J)')
+        edits.replace(18, 24, 'mjob_t const')
+        edits.replace(9, 13, 'char const')
+        self.assertEqual(edits.apply(), 'int MFoo(char const *s, mjob_t const *J)')
+    def test_inverse_restores(self):
+        txt = 'abc def ghi'
+        edits = spanedit.EditList(txt)
+        edits.replace(0, 3, 'A')
+        edits.replace(4, 7, 'DEFDEF')
+        edits.replace(11, 11, '!')
+        new = edits.apply()
+        self.assertEqual(new, 'A DEFDEF ghi!')
+        undo = spanedit.EditList(new)
+        for begin, end, old in edits.inverse:
+            undo.replace(begin, end, old)
+        self.assertEqual(undo.apply(), txt)
+    def test_no_ops_skipped(self):
+        edits = spanedit.EditList('abc')
+        edits.replace(0, 3, 'abc')
+        self.assertEqual(len(edits), 0)
+    def test_overlap(self):
+        edits = spanedit.EditList('abcdef')
+        edits.replace(0, 3, 'x')
+        edits.replace(2, 4, 'y')
+        self.assertRaises(ValueError, edits.apply)
+
+class RenameTest(unittest.TestCase):
+    def test_whole_words_not_members(self):
+        body = '{ R->Index = R2; x.R = R; MRsvShow(R); }'
+        self.assertEqual(spanedit.rename_identifiers(body, {'R': 'Rsv'}),
+            '{ Rsv->Index = R2; x.R = Rsv; MRsvShow(Rsv); }')
+    def test_simultaneous(self):
+        self.assertEqual(spanedit.rename_identifiers('a = b;', {'a': 'b', 'b': 'a'}), 'b = a;')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,34 @@
+import unittest
+
+import typecanon
+
+class NormalizeTest(unittest.TestCase):
+    def test_spellings_of_one_type(self):
+        for spelling in ('const char*', 'const char *', 'char const *', 'char  const*'):
+            self.assertEqual(typecanon.normalize(spelling), 'char const *')
+        self.assertEqual(typecanon.normalize('mjob_t  &'), 'mjob_t &')
+        self.assertEqual(typecanon.normalize('char**'), 'char **')
+    def test_interned(self):
+        self.assertTrue(typecanon.intern('const char*') is typecanon.intern('char const *'))
+        self.assertFalse(typecanon.intern('char *') is typecanon.intern('char const *'))
+    def test_structure(self):
+        ctype = typecanon.intern('const mjob_t * &')
+        self.assertEqual((ctype.base, ctype.qualifiers, ctype.pointers, ctype.reference),
+            ('mjob_t', ('const',), 1, True))
+        ctype = typecanon.intern('int')
+        self.assertEqual((ctype.pointers, ctype.reference, ctype.pivot), (0, False, None))
+
+class ToggleTest(unittest.TestCase):
+    def test_round_trip(self):
+        ctype = typecanon.intern('mjob_t *')
+        self.assertEqual(ctype.with_const().text, 'mjob_t const *')
+        self.assertTrue(ctype.with_const().without_const() is ctype)
+    def test_keeps_pointer_spelling(self):
+        self.assertEqual(typecanon.intern('double **').with_const().text, 'double const **')
+        self.assertEqual(typecanon.intern('mrsv_t &').with_const().text, 'mrsv_t const &')
+    def test_cached(self):
+        ctype = typecanon.intern('mnode_t *')
+        self.assertTrue(ctype.with_const() is ctype.with_const())
+
+if __name__ == '__main__':
+    unittest.main()
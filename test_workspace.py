@@ -0,0 +1,165 @@
+import os, shutil, subprocess, sys, tempfile, unittest
+
+import benchmark, const_fix, events, safechange, spanedit, synthcode, workspace
+
+_here = os.path.dirname(os.path.abspath(__file__))
+
+class WorkspaceTest(unittest.TestCase):
+    def setUp(self):
+        self.scratch = tempfile.mkdtemp()
+        self.root = os.path.join(self.scratch, 'tree')
+        self.html = os.path.join(self.scratch, 'html')
+        synthcode.generate(self.root, modules=2, funcs_per_module=5, html_folder=self.html)
+        self.env = dict(os.environ, FAKECC_TU_SECS='0', FAKECC_TEST_SECS='0')
+        subprocess.check_call([sys.executable, os.path.join(_here, 'fakecc.py'), 'compile', self.root],
+            stdout=subprocess.PIPE, env=self.env)
+        self.saved = dict([(name, getattr(const_fix, name)) for name in
+            workspace._kept_in_checkout + ['compile_log', 'test_log']])
+        self.saved_stdout = sys.stdout
+        sys.stdout = open(os.devnull, 'w')
+        # Same filesystem as the tree, so sources get linked.
+        self.ws = workspace.Workspace(self.root, self.scratch)
+        self.ws.mirror()
+    def tearDown(self):
+        self.ws.close()
+        sys.stdout.close()
+        sys.stdout = self.saved_stdout
+        for name, value in self.saved.items():
+            setattr(const_fix, name, value)
+        safechange._journal.clear()
+        shutil.rmtree(self.scratch)
+    def _path(self, *parts):
+        return os.path.join(self.root, *parts), os.path.join(self.ws.tree, *parts)
+    def _read(self, fpath):
+        with open(fpath) as f:
+            return f.read()
+    def test_mirror(self):
+        real, copy = self._path('src', 'msyn_mod0.c')
+        self.assertTrue(os.path.samefile(real, copy))
+        real, copy = self._path('build', 'msyn_mod0.o')
+        self.assertFalse(os.path.samefile(real, copy))
+        self.assertEqual(int(os.path.getmtime(real)), int(os.path.getmtime(copy)))
+        self.assertFalse(os.path.exists(os.path.join(self.ws.tree, const_fix.state_folder)))
+    def test_edits_stay_in_scratch_until_synced(self):
+        real, copy = self._path('include', 'msyn_mod0.h')
+        before = self._read(real)
+        spanedit.write_atomically(copy, before + '/* accepted */\n')
+        self.assertEqual(self._read(real), before)
+        self.assertEqual(self.ws.sync_back(), [os.path.join('include', 'msyn_mod0.h')])
+        self.assertEqual(self._read(real), before + '/* accepted */\n')
+        self.assertEqual(self.ws.sync_back(), [])
+    def test_in_flight_not_synced(self):
+        real, copy = self._path('include', 'msyn_mod0.h')
+        before = self._read(real)
+        spanedit.write_atomically(copy, before + '/* experiment */\n')
+        safechange._journal[copy] = None
+        self.assertEqual(self.ws.sync_back(), [])
+        self.assertEqual(self._read(real), before)
+    def test_hand_edit_in_checkout_wins(self):
+        real, copy = self._path('include', 'msyn_mod1.h')
+        spanedit.write_atomically(copy, self._read(copy) + '/* accepted */\n')
+        with open(real, 'a') as f:
+            f.write('/* by hand */\n')
+        os.utime(real, (1, 1))
+        self.assertEqual(self.ws.sync_back(), [])
+        self.assertTrue(self._read(real).endswith('/* by hand */\n'))
+    def test_run(self):
+        benchmark.configure_const_fix(self.ws.tree, self.html, self.scratch)
+        self.ws.redirect()
+        const_fix.metrics_file = const_fix.trace_file = None
+        objects = dict([(f, os.path.getmtime(os.path.join(self.root, 'build', f)))
+            for f in os.listdir(os.path.join(self.root, 'build'))])
+        saved_env = os.environ.copy()
+        os.environ.update(FAKECC_TU_SECS='0', FAKECC_TEST_SECS='0')
+        events.subscribe(self.ws.on_event)
+        try:
+            const_fix.fix_prototypes(self.ws.tree)
+        finally:
+            events.unsubscribe(self.ws.on_event)
+            os.environ.clear()
+            os.environ.update(saved_env)
+            const_fix._const_facts = const_fix._scheduler = None
+        for module in ('mod0', 'mod1'):
+            for parts in (('include', 'msyn_%s.h' % module), ('src', 'msyn_%s.c' % module)):
+                real, copy = self._path(*parts)
+                self.assertEqual(self._read(real), self._read(copy))
+        self.assertTrue(os.path.isfile(os.path.join(self.root, const_fix.accepted_patch_log)))
+        self.assertTrue(os.path.isfile(os.path.join(self.root, 'const-outcomes.txt')))
+        self.assertTrue(os.path.isfile(os.path.join(self.ws.logs, 'make.log')))
+        # Builds happened in scratch only.
+        for f, mtime in objects.items():
+            self.assertEqual(os.path.getmtime(os.path.join(self.root, 'build', f)), mtime)
+        # The checkout still builds.
+        self.assertEqual(subprocess.call([sys.executable, os.path.join(_here, 'fakecc.py'), 'compile', self.root],
+            stdout=subprocess.PIPE, env=self.env), 0)
+
+_runner = '''
+import runpy, sys
+sys.path.insert(0, %(here)r)
+import callgraph
+callgraph.doxy_output_folder = %(html)r
+sys.argv = ['const_fix.py'] + sys.argv[1:]
+runpy.run_path(%(script)r, run_name='__main__')
+'''
+
+# Stand-ins for make and scons, so const_fix.py runs with its own settings.
+_make = '''#!/bin/sh
+if [ "$1" = clean ]; then exec %(fake)s clean "$PWD"; fi
+exec %(fake)s compile "$PWD"
+'''
+_scons = '''#!/bin/sh
+case "$1" in
+  -c) exit 0;;
+  -f) exec %(fake)s compile-tests "$(dirname "$PWD")";;
+esac
+shift
+exec %(fake)s test "$(dirname "$PWD")" "$@"
+'''
+
+class ScriptTest(unittest.TestCase):
+    '''Run const_fix.py --scratch the way a user would.'''
+    def setUp(self):
+        self.scratch = tempfile.mkdtemp()
+        self.root = os.path.join(self.scratch, 'tree')
+        html = os.path.join(self.scratch, 'html')
+        synthcode.generate(self.root, modules=2, funcs_per_module=5, html_folder=html)
+        self.base = os.path.join(self.scratch, 'base')
+        os.makedirs(self.base)
+        bin_folder = os.path.join(self.scratch, 'bin')
+        os.makedirs(bin_folder)
+        fake = '%s %s' % (sys.executable, os.path.join(_here, 'fakecc.py'))
+        for name, txt in (('make', _make), ('scons', _scons)):
+            fpath = os.path.join(bin_folder, name)
+            with open(fpath, 'w') as f:
+                f.write(txt % {'fake': fake})
+            os.chmod(fpath, 0o755)
+        self.runner = os.path.join(self.scratch, 'run.py')
+        with open(self.runner, 'w') as f:
+            f.write(_runner % {'here': _here, 'html': html, 'script': os.path.join(_here, 'const_fix.py')})
+        self.env = dict(os.environ, FAKECC_TU_SECS='0', FAKECC_TEST_SECS='0',
+            PATH=bin_folder + os.pathsep + os.environ.get('PATH', ''))
+    def tearDown(self):
+        shutil.rmtree(self.scratch)
+    def _run(self):
+        p = subprocess.Popen([sys.executable, self.runner, '--scratch', self.base, self.root],
+            stdout=subprocess.PIPE, stderr=subprocess.STDOUT, env=self.env)
+        out = p.communicate()[0].decode('utf-8', 'replace')
+        self.assertEqual(p.returncode, 0, out)
+        return out
+    def test_state_kept_in_checkout(self):
+        with open(os.path.join(self.root, 'include', 'msyn_mod0.h')) as f:
+            before = f.read()
+        out = self._run()
+        for name in (const_fix.outcomes_log, const_fix.outcomes_db, const_fix.experiments_log,
+                const_fix.accepted_patch_log, const_fix.metrics_file, const_fix.trace_file):
+            self.assertTrue(os.path.isfile(os.path.join(self.root, name)), name)
+        self.assertTrue(os.path.isdir(os.path.join(self.root, const_fix.state_folder, 'artifacts')))
+        self.assertEqual(os.listdir(self.base), [])
+        with open(os.path.join(self.root, 'include', 'msyn_mod0.h')) as f:
+            self.assertNotEqual(f.read(), before)
+        self.assertTrue('Copied' in out and 'build artifacts back' in out, out)
+        # The checkout's build is current, and the next run knows it.
+        self.assertTrue('skipping verification' in self._run())
+
+if __name__ == '__main__':
+    unittest.main()
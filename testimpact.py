@@ -0,0 +1,75 @@
+import os, re
+
+from prototype import test_proto_pats
+
+_call_pat = re.compile(r'([_a-zA-Z][_a-zA-Z0-9]*)\s*\(')
+_any_func_name = r'(?P<mocked>[_a-zA-Z][_a-zA-Z0-9]*)'
+_mock_pats = [re.compile(pat % _any_func_name, re.DOTALL | re.MULTILINE) for pat in test_proto_pats]
+test_src_exts = ('.c', '.cpp', '.h')
+
+def bare_name(func):
+    '''
+    Convert a call graph key into the identifier that appears in code:
+
+      MJobFoo() --> MJobFoo
+      msnl_t::SetCount() --> SetCount
+    '''
+    i = func.find('(')
+    if i > -1:
+        func = func[:i]
+    i = func.rfind('::')
+    if i > -1:
+        func = func[i + 2:]
+    return func
+
+class TestIndex:
+    '''
+    Remember which functions each test target calls or mocks, so we can
+    tell which targets a change might affect without rescanning the test
+    folder every time.
+
+    A target is the folder (relative to the test root) that holds a test's
+    sources; scons accepts folders as targets, and builds and runs everything
+    beneath them. Mocked functions are found with the same patterns that
+    find_prototypes_in_file uses, because a test that mocks a function
+    doesn't call it, but still gets its mock prototype rewritten.
+    '''
+    def __init__(self, test_root):
+        self.test_root = test_root
+        self.by_name = {}
+        self.targets = set()
+        self._scan()
+    def _scan(self):
+        for root, dirs, files in os.walk(self.test_root):
+            skip = [d for d in dirs if d.startswith('.')]
+            for d in skip:
+                dirs.remove(d)
+            target = os.path.relpath(root, self.test_root)
+            for f in files:
+                if f.startswith('.') or not f.endswith(test_src_exts):
+                    continue
+                with open(os.path.join(root, f), 'r') as fh:
+                    txt = fh.read()
+                self.targets.add(target)
+                names = set(_call_pat.findall(txt))
+                for pat in _mock_pats:
+                    for m in pat.finditer(txt):
+                        names.add(m.group('mocked'))
+                for name in names:
+                    if name not in self.by_name:
+                        self.by_name[name] = set()
+                    self.by_name[name].add(target)
+    def impacted_targets(self, funcs):
+        '''
+        Return a sorted list of targets that reference any of funcs, or None
+        if one of them is referenced from the top of the test folder, which
+        means the whole suite has to run anyway.
+        '''
+        targets = set()
+        for func in funcs:
+            name = bare_name(func)
+            if name in self.by_name:
+                targets.update(self.by_name[name])
+        if '.' in targets:
+            return None
+        return sorted(targets)
@@ -0,0 +1,87 @@
+import json, os, time
+from contextlib import contextmanager
+from functools import wraps
+
+# Every completed phase: (name, start, end, func, param)
+_events = []
+# The function and param that phases are currently attributed to.
+_context = {'func': None, 'param': None}
+
+@contextmanager
+def phase(name):
+    '''Time a phase of the pipeline, such as compile or test.'''
+    start = time.time()
+    try:
+        yield
+    finally:
+        _events.append((name, start, time.time(), _context['func'], _context['param']))
+
+def timed(name):
+    '''Decorator version of phase().'''
+    def decorate(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            with phase(name):
+                return f(*args, **kwargs)
+        return wrapper
+    return decorate
+
+@contextmanager
+def attributed(func=None, param=None):
+    '''Charge phases inside this block to a function, and optionally a param.'''
+    saved = dict(_context)
+    if func is not None:
+        _context['func'] = func
+    _context['param'] = param
+    try:
+        yield
+    finally:
+        _context.update(saved)
+
+def export_trace(fpath):
+    '''
+    Write every phase as a Chrome trace-event file, which chrome://tracing
+    and Perfetto can load.
+    '''
+    pid = os.getpid()
+    events = []
+    for name, start, end, func, param in _events:
+        args = {}
+        if func:
+            args['func'] = func
+        if param is not None:
+            args['param'] = param + 1
+        events.append({'name': name, 'cat': 'const_fix', 'ph': 'X', 'pid': pid, 'tid': 1,
+            'ts': int(start * 1e6), 'dur': int((end - start) * 1e6), 'args': args})
+    tmp = fpath + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+    os.rename(tmp, fpath)
+
+def summarize(top=10):
+    '''
+    Return a printable table of total time per phase, followed by the
+    functions that cost the most. Nested phases are counted in both their own
+    row and their parent's.
+    '''
+    if not _events:
+        return 'No phases were timed.'
+    wall = max([e[2] for e in _events]) - min([e[1] for e in _events])
+    by_phase = {}
+    by_func = {}
+    for name, start, end, func, param in _events:
+        secs = end - start
+        count, total = by_phase.get(name, (0, 0.0))
+        by_phase[name] = (count + 1, total + secs)
+        if func and name in ('compile', 'test'):
+            by_func[func] = by_func.get(func, 0.0) + secs
+    lines = ['%-16s %8s %12s %10s %7s' % ('phase', 'count', 'total secs', 'avg secs', '% wall')]
+    for name, (count, total) in sorted(by_phase.items(), key=lambda item: -item[1][1]):
+        pct = 100.0 * total / wall if wall else 0
+        lines.append('%-16s %8d %12.1f %10.2f %6.1f%%' % (name, count, total, total / count, pct))
+    if by_func:
+        lines.append('')
+        lines.append('Most expensive functions (compile + test):')
+        for func, total in sorted(by_func.items(), key=lambda item: -item[1])[:top]:
+            lines.append('  %10.1f  %s' % (total, func))
+    return '\n'.join(lines)
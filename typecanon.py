@@ -0,0 +1,90 @@
+'''
+Canonical, interned C/C++ types.
+
+Every type string we parse is normalized once and mapped to a single CType
+object, so two params have the same type exactly when their CTypes are the
+same object, and toggling const is a cached lookup rather than a round of
+string surgery.
+'''
+import re
+
+_const_prefix_pat = re.compile('^const ([a-zA-Z0-9_]+)(.*)$')
+_space_pat = re.compile(r'\s{2,}')
+_qualifiers = ('const', 'volatile')
+
+def squeeze(txt):
+    '''Replace all runs of whitepace with a single space, and trim front and back.'''
+    return _space_pat.sub(' ', txt).strip()
+
+def _normalize(typ):
+    typ = squeeze(typ.replace('*', ' * ').replace('&', ' & ')).replace('* *', '**')
+    m = _const_prefix_pat.match(typ)
+    if m:
+        typ = '%s const%s' % (m.group(1), m.group(2))
+    return typ
+
+class CType(object):
+    '''
+    One normalized type. text is the normalized spelling (char const *);
+    base, qualifiers, pointers and reference are its structural pieces.
+    Don't construct these directly; use intern().
+    '''
+    __slots__ = ('text', 'base', 'qualifiers', 'pointers', 'reference', 'pivot', '_with_const', '_without_const')
+    def __init__(self, text):
+        self.text = text
+        i = text.find('*')
+        j = text.find('&')
+        if i > -1 and j > -1:
+            self.pivot = min(i, j)
+        elif i > -1:
+            self.pivot = i
+        elif j > -1:
+            self.pivot = j
+        else:
+            self.pivot = None
+        words = text[:self.pivot].split()
+        self.qualifiers = tuple([w for w in words if w in _qualifiers])
+        self.base = ' '.join([w for w in words if w not in _qualifiers])
+        self.pointers = text.count('*')
+        self.reference = j > -1
+        self._with_const = None
+        self._without_const = None
+    def with_const(self):
+        '''Return the type with const inserted just before the first * or &.'''
+        if self._with_const is None:
+            i = self.pivot
+            self._with_const = _intern_text(squeeze(self.text[:i].rstrip() + ' const ' + self.text[i:]))
+        return self._with_const
+    def without_const(self):
+        '''Return the type with every const removed.'''
+        if self._without_const is None:
+            self._without_const = _intern_text(squeeze(self.text.replace('const', '')))
+        return self._without_const
+    def __str__(self):
+        return self.text
+    def __repr__(self):
+        return 'CType(%r)' % self.text
+
+# normalized text --> CType
+_by_text = {}
+# any spelling we've been asked about --> CType
+_by_raw = {}
+
+def _intern_text(text):
+    # Toggling const produces its own spelling, which is kept as-is.
+    ctype = _by_text.get(text)
+    if ctype is None:
+        ctype = CType(text)
+        _by_text[text] = ctype
+    return ctype
+
+def intern(typ):
+    '''Return the one CType for typ, parsing and normalizing it only the first time.'''
+    ctype = _by_raw.get(typ)
+    if ctype is None:
+        ctype = _intern_text(_normalize(typ))
+        _by_raw[typ] = ctype
+    return ctype
+
+def normalize(typ):
+    return intern(typ).text
@@ -0,0 +1,194 @@
+'''
+Run experiments in a RAM-backed copy of the tree.
+
+Every experiment rewrites sources, rebuilds objects and writes logs; on
+slow storage that I/O is a good part of each build. With --scratch,
+const_fix mirrors the checkout into a scratch folder (/dev/shm by
+default) and does all of that there:
+
+- Sources are hardlinked where the scratch folder is on the same
+  filesystem, and copied otherwise. Rewrites always replace a file by
+  rename, so the checkout's copy is never written through a link.
+- Everything else, build artifacts included, is copied with its mtime, so
+  the first build in scratch is as incremental as it would have been in
+  the checkout. Compilers write objects in place, so these can't be
+  linked.
+- Build and test logs stay in scratch.
+- Run state that must outlive the scratch folder (outcomes, the accepted
+  patch log, the experiment cache, metrics, the trace, and the state
+  folder with the undo journal and stashed artifacts) is written to the
+  checkout as usual.
+
+Each time a function is finished, no experiment is in flight, so every
+source that differs from the checkout is an accepted change. Those, and
+only those, are copied back to the checkout, each by atomic rename. A
+checkout file that was edited by hand since it was mirrored is left alone,
+with a warning. At the end, if the scratch tree is a proven-clean build,
+its build artifacts are copied back too, so the checkout's build is
+current and the next run can skip verifying it.
+'''
+import errno, os, shutil, tempfile
+
+import buildcache, const_fix, events, safechange, spanedit
+from prototype import _iter_source_files
+
+default_base = '/dev/shm'
+# const_fix settings that name run state to keep in the checkout.
+_kept_in_checkout = ['outcomes_log', 'outcomes_db', 'experiments_log', 'accepted_patch_log', 'metrics_file', 'trace_file',
+    'state_folder']
+_vcs_folders = ['.git', '.hg', '.svn']
+
+def _stat(fpath):
+    info = os.stat(fpath)
+    return info.st_mtime, info.st_size
+
+class Workspace:
+    '''
+    settings is the const_fix module to redirect; pass the running script's
+    own module when const_fix is __main__, since importing const_fix then
+    gives a separate copy.
+    '''
+    def __init__(self, root, base=None, settings=None):
+        self.settings = settings or const_fix
+        self.root = os.path.normpath(os.path.abspath(root))
+        if base is None:
+            base = default_base if os.path.isdir(default_base) else None
+        self.folder = tempfile.mkdtemp(prefix='const_fix-', dir=base)
+        self.tree = os.path.join(self.folder, 'tree')
+        self.logs = os.path.join(self.folder, 'logs')
+        # relative path --> (stat in checkout, stat in scratch) when last in sync
+        self.sources = {}
+        self.artifacts = {}
+        # Sources edited in the checkout during the run.
+        self.conflicts = set()
+        self.linked = 0
+        self.copied = 0
+    def mirror(self):
+        os.makedirs(self.logs)
+        skip = set(_vcs_folders + [self.settings.state_folder])
+        for folder, dirs, files in os.walk(self.root):
+            rel_folder = os.path.relpath(folder, self.root)
+            if rel_folder == '.':
+                dirs[:] = [d for d in dirs if d not in skip]
+            os.makedirs(os.path.normpath(os.path.join(self.tree, rel_folder)))
+            for d in list(dirs):
+                if os.path.islink(os.path.join(folder, d)):
+                    dirs.remove(d)
+                    files.append(d)
+            for fname in files:
+                src = os.path.join(folder, fname)
+                dst = os.path.normpath(os.path.join(self.tree, rel_folder, fname))
+                if os.path.islink(src):
+                    os.symlink(os.readlink(src), dst)
+                else:
+                    shutil.copy2(src, dst)
+                    self.copied += 1
+        # Sources were copied above with everything else; link them instead where we can.
+        for fpath in _iter_source_files(self.tree):
+            rel = os.path.relpath(fpath, self.tree)
+            src = os.path.join(self.root, rel)
+            if os.path.islink(src):
+                continue
+            if self._link(src, fpath):
+                self.linked += 1
+                self.copied -= 1
+            self.sources[rel] = (_stat(src), _stat(fpath))
+        for fpath in buildcache.iter_artifacts(self.tree):
+            rel = os.path.relpath(fpath, self.tree)
+            self.artifacts[rel] = (_stat(os.path.join(self.root, rel)), _stat(fpath))
+        print('Mirrored %s into %s (%d linked, %d copied).' % (self.root, self.tree, self.linked, self.copied))
+    def _link(self, src, dst):
+        tmp = dst + '.link'
+        try:
+            os.link(src, tmp)
+        except OSError as e:
+            if e.errno in (errno.EXDEV, errno.EPERM, errno.EMLINK):
+                return False
+            raise
+        os.rename(tmp, dst)
+        return True
+    def redirect(self):
+        '''Point const_fix's logs at scratch, and its run state at the checkout.'''
+        settings = self.settings
+        for name in _kept_in_checkout:
+            value = getattr(settings, name)
+            if value:
+                setattr(settings, name, os.path.join(self.root, value))
+        settings.compile_log = os.path.join(self.logs, os.path.basename(settings.compile_log))
+        settings.test_log = os.path.join(self.logs, os.path.basename(settings.test_log))
+    def on_event(self, event):
+        if isinstance(event, events.FunctionFinished):
+            self.sync_back()
+    def sync_back(self):
+        '''
+        Copy accepted changes back to the checkout. Files with an experiment
+        in flight are left for the next checkpoint. Return the files copied.
+        '''
+        in_flight = set(safechange._journal)
+        synced = []
+        for rel in sorted(self.sources):
+            was_real, was_scratch = self.sources[rel]
+            fpath = os.path.join(self.tree, rel)
+            real = os.path.join(self.root, rel)
+            if fpath in in_flight or not os.path.isfile(fpath) or _stat(fpath) == was_scratch:
+                continue
+            if os.path.isfile(real) and os.path.samefile(real, fpath):
+                continue
+            with open(fpath, 'r') as f:
+                txt = f.read()
+            now_real = _stat(real) if os.path.isfile(real) else None
+            if now_real != was_real:
+                print('  %s was edited in the checkout during the run; not copying back its changes from %s.' % (rel, fpath))
+                self.sources[rel] = (now_real, _stat(fpath))
+                self.conflicts.add(rel)
+                continue
+            with open(real, 'r') as f:
+                if f.read() == txt:
+                    # Only the mtime changed, e.g. by a rollback.
+                    self.sources[rel] = (now_real, _stat(fpath))
+                    continue
+            spanedit.write_atomically(real, txt)
+            # Keep scratch's mtime, so the build copied back by sync_artifacts is newer.
+            info = os.stat(fpath)
+            os.utime(real, (info.st_atime, info.st_mtime))
+            self.sources[rel] = (_stat(real), _stat(fpath))
+            synced.append(rel)
+        if synced:
+            print('  Copied %d accepted %s back to %s.' % (len(synced), self.settings._pluralize('change', len(synced)), self.root))
+        return synced
+    def sync_artifacts(self):
+        '''
+        Copy scratch's build artifacts back to the checkout, but only if
+        scratch is exactly as it was when last proven clean and its sources
+        all match the checkout's. Call this after the last sync_back.
+        Return the artifacts copied.
+        '''
+        settings = self.settings
+        if self.conflicts or safechange._journal or not settings._run_store or \
+                settings._run_store.get_meta('clean_fingerprint') != buildcache.tree_fingerprint(self.tree, settings._toolchain):
+            print("Scratch isn't a proven-clean build of the checkout's sources; leaving the checkout's build alone.")
+            return []
+        copied = []
+        for fpath in buildcache.iter_artifacts(self.tree):
+            rel = os.path.relpath(fpath, self.tree)
+            real = os.path.join(self.root, rel)
+            was_real, was_scratch = self.artifacts.get(rel, (None, None))
+            if _stat(fpath) == was_scratch:
+                continue
+            if (_stat(real) if os.path.isfile(real) else None) != was_real:
+                print('  %s was rebuilt in the checkout during the run; not copying it back.' % rel)
+                continue
+            if not os.path.isdir(os.path.dirname(real)):
+                os.makedirs(os.path.dirname(real))
+            tmp = os.path.join(os.path.dirname(real), '.%s.tmp' % os.path.basename(real))
+            shutil.copy2(fpath, tmp)
+            os.rename(tmp, real)
+            copied.append(rel)
+        if copied:
+            print('Copied %d build %s back to %s.' % (len(copied), settings._pluralize('artifact', len(copied)), self.root))
+        return copied
+    def close(self, keep=False):
+        if keep:
+            print('Left scratch copy in %s.' % self.folder)
+        else:
+            shutil.rmtree(self.folder, ignore_errors=True)